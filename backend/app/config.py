@@ -53,4 +53,152 @@ except Exception as e:
 # Generation settings
 NUM_INFERENCE_STEPS = 30  # More steps for better quality
 GUIDANCE_SCALE = 8.5  # Higher to better follow text description
+INPAINT_CONDITIONING_SCALE = 1.2  # Stronger ControlNet guidance for inpainting
 
+# Prompting
+PROMPT_SUFFIX = "preserve original colors and texture, enhance existing pattern only, no new content"
+NEGATIVE_PROMPT = (
+    "blurry, distorted, low quality, artifacts, new content, generated, "
+    "artificial, completely new image, different colors"
+)
+
+
+# Job queue
+# Enhancement runs on a worker pool so the event loop stays responsive
+JOB_WORKERS = int(os.getenv("DREAMY_JOB_WORKERS", "1"))  # Concurrent diffusion runs
+JOB_QUEUE_SIZE = int(os.getenv("DREAMY_JOB_QUEUE_SIZE", "16"))  # Waiting jobs before 429
+JOB_TIMEOUT = float(os.getenv("DREAMY_JOB_TIMEOUT", "300"))  # Seconds per job
+JOB_RESULT_TTL = float(os.getenv("DREAMY_JOB_RESULT_TTL", "600"))  # Keep finished jobs this long
+
+# Micro-batching
+# Concurrent requests with the same steps/guidance/strength share one pipeline call.
+# Batches can only form from concurrent workers, so keep JOB_WORKERS >= BATCH_MAX_SIZE.
+BATCH_MAX_SIZE = int(os.getenv("DREAMY_BATCH_MAX_SIZE", "1"))  # 1 disables batching
+BATCH_MAX_WAIT_MS = float(os.getenv("DREAMY_BATCH_MAX_WAIT_MS", "50"))  # How long to wait for company
+
+# Result cache
+# Identical requests (same pixels, description and settings) reuse the earlier result
+RESULT_CACHE_MEMORY_MB = int(os.getenv("DREAMY_RESULT_CACHE_MEMORY_MB", "128"))  # 0 disables
+RESULT_CACHE_DIR = os.getenv("DREAMY_RESULT_CACHE_DIR")  # Unset = memory only
+RESULT_CACHE_DISK_MB = int(os.getenv("DREAMY_RESULT_CACHE_DISK_MB", "1024"))
+
+# LLM response cache
+LLM_CACHE_TTL = float(os.getenv("DREAMY_LLM_CACHE_TTL", "86400"))  # Seconds
+LLM_CACHE_ENTRIES = int(os.getenv("DREAMY_LLM_CACHE_ENTRIES", "1024"))
+LLM_CACHE_PATH = os.getenv("DREAMY_LLM_CACHE_PATH")  # JSON file to persist across restarts
+
+# LLM client
+# "service" uses get_llm_service and its prompts; "pooled" talks to Ollama
+# through one async connection pool with a concurrency limit, timeouts and
+# retries, using the prompts in app/services/ollama.py
+LLM_CLIENT = os.getenv("DREAMY_LLM_CLIENT", "service")
+OLLAMA_URL = os.getenv("DREAMY_OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("DREAMY_OLLAMA_MODEL", "mistral")
+LLM_MAX_CONCURRENCY = int(os.getenv("DREAMY_LLM_MAX_CONCURRENCY", "4"))  # Generations in flight
+LLM_TIMEOUT = float(os.getenv("DREAMY_LLM_TIMEOUT", "60"))  # Seconds (per chunk when streaming)
+LLM_CONNECT_TIMEOUT = float(os.getenv("DREAMY_LLM_CONNECT_TIMEOUT", "5"))
+LLM_RETRIES = int(os.getenv("DREAMY_LLM_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.getenv("DREAMY_LLM_RETRY_BACKOFF", "0.5"))  # Seconds, doubled per attempt (with jitter)
+
+# Startup
+# Load pipelines and LLM in the background as soon as the server starts,
+# instead of on the first /enhance request. Check GET /ready for progress.
+PRELOAD_MODELS = os.getenv("DREAMY_PRELOAD_MODELS", "1") == "1"
+
+# Decoding
+# Reject uploads over this many pixels before decoding them (decompression bombs)
+MAX_IMAGE_PIXELS = int(os.getenv("DREAMY_MAX_IMAGE_PIXELS", str(50_000_000)))
+# Decode large JPEGs at reduced resolution (DCT scaling) near MAX_IMAGE_SIZE
+DECODE_DRAFT = os.getenv("DREAMY_DECODE_DRAFT", "1") == "1"
+
+# Worker processes (CPU deployments)
+# Fork this many diffusion workers after loading the weights once; they share
+# the weight pages and each gets its own slice of cores. 0 = run in-process.
+# Keep JOB_WORKERS >= WORKER_PROCESSES so every worker has something to do.
+WORKER_PROCESSES = int(os.getenv("DREAMY_WORKER_PROCESSES", "0"))
+WORKER_THREADS = int(os.getenv("DREAMY_WORKER_THREADS", "0"))  # Cores per worker, 0 = even split
+
+# Step planning
+# Requests may ask for a quality tier (fast / balanced / best) or a latency
+# budget; the planner picks scheduler, steps and resolution from measured
+# step costs. Until the first run is measured, these per-device priors
+# (one 512x512 image with ControlNet and guidance) are used.
+DEFAULT_QUALITY = os.getenv("DREAMY_DEFAULT_QUALITY")  # Unset = use num_inference_steps as given
+PLAN_PRIOR_STEP_SECONDS = {"cuda": 0.05, "mps": 0.5, "cpu": 3.0}
+PLAN_PRIOR_OVERHEAD_SECONDS = {"cuda": 0.3, "mps": 1.5, "cpu": 4.0}
+
+# Region-of-interest mode
+# "roi" diffuses only a tile around the user's drawing and blends it back into
+# the original, so compute follows the drawing's size instead of the canvas.
+ENHANCE_MODE = os.getenv("DREAMY_ENHANCE_MODE", "full")  # Default when a request doesn't say
+ROI_MAX_SIZE = int(os.getenv("DREAMY_ROI_MAX_SIZE", "2048"))  # Working resolution of the original (roi and tiled)
+ROI_MIN_SIZE = 256  # Smaller tiles are upscaled to this before diffusion
+ROI_PADDING = 32    # Context pixels around the drawing
+ROI_FEATHER = 16    # Blend radius when pasting the tile back
+
+# Tiled mode
+# "tiled" splits the original into overlapping TARGET_SIZE tiles at native
+# resolution and enhances only the tiles the drawing touches
+TILE_OVERLAP = int(os.getenv("DREAMY_TILE_OVERLAP", "64"))  # Pixels blended across each seam
+TILE_BATCH_SIZE = int(os.getenv("DREAMY_TILE_BATCH_SIZE", "4"))  # Tiles per pipeline call (bounds memory)
+
+# Inference precision (CPU)
+# fp32, bf16 (autocast; needs AVX512-BF16 or AMX) or int8 (dynamic quantization
+# of UNet and ControlNet Linear layers). Unsupported modes fall back to fp32.
+PRECISION = os.getenv("DREAMY_PRECISION", "fp32")
+CHANNELS_LAST = os.getenv("DREAMY_CHANNELS_LAST", "0") == "1"
+
+# Graph compilation
+# none, compile (torch.compile) or trace (TorchScript per input shape) for the
+# UNet, ControlNet and VAE decoder. Artifacts are cached under MODELS_DIR/compiled
+# so restarts skip the compile; failures fall back to eager.
+COMPILE_MODE = os.getenv("DREAMY_COMPILE", "none")
+
+# Pipeline registry
+# Components are loaded once and shared by the img2img, inpaint and plain
+# img2img pipelines, which are built on first use. 0 restores ImageEnhancer's
+# own loading. With a memory limit, the ControlNet (and the variants built on
+# it) is unloaded while the variant in use doesn't need it.
+PIPELINE_REGISTRY = os.getenv("DREAMY_PIPELINE_REGISTRY", "1") == "1"
+PIPELINE_MEMORY_LIMIT_MB = int(os.getenv("DREAMY_PIPELINE_MEMORY_LIMIT_MB", "0"))  # 0 = no limit
+USE_INPAINTING = os.getenv("DREAMY_USE_INPAINTING", "1") == "1"  # Default variant: inpaint, else img2img
+
+# Prompt embedding cache
+# Text encoder outputs per prompt, so repeated descriptions and the negative
+# prompt aren't re-encoded on every run
+PROMPT_EMBEDDING_CACHE_MB = int(os.getenv("DREAMY_PROMPT_EMBEDDING_CACHE_MB", "64"))  # 0 disables
+
+# Original image cache
+# Preprocessed originals and their VAE latents by content hash, so iterating
+# on one photo skips resizing and the VAE encoder
+ORIGINAL_CACHE_MB = int(os.getenv("DREAMY_ORIGINAL_CACHE_MB", "256"))  # 0 disables
+
+# Image store
+# POST /images keeps decoded uploads by content hash; enhance requests can then
+# send image_id / drawing_id instead of the base64 payloads
+IMAGE_STORE_MEMORY_MB = int(os.getenv("DREAMY_IMAGE_STORE_MEMORY_MB", "256"))
+IMAGE_STORE_DIR = os.getenv("DREAMY_IMAGE_STORE_DIR")  # Unset = memory only
+IMAGE_STORE_DISK_MB = int(os.getenv("DREAMY_IMAGE_STORE_DISK_MB", "1024"))
+IMAGE_STORE_TTL = float(os.getenv("DREAMY_IMAGE_STORE_TTL", "3600"))  # Seconds since last use
+IMAGE_STORE_INLINE_MB = int(os.getenv("DREAMY_IMAGE_STORE_INLINE_MB", "64"))  # Originals kept from inline requests
+
+# Batch enhancement
+# POST /enhance/batch runs up to this many drawing/description variants of
+# one original, sharing its decode, preprocessing and VAE latents
+ENHANCE_BATCH_MAX_VARIANTS = int(os.getenv("DREAMY_ENHANCE_BATCH_MAX_VARIANTS", "8"))
+
+# Metrics
+# GET /metrics serves per-stage latency histograms in Prometheus format. A
+# Server-Timing header with the request's own stage breakdown is added when
+# the request sends "X-Trace: 1", or always with this set
+SERVER_TIMING = os.getenv("DREAMY_SERVER_TIMING", "0") == "1"
+
+# Output encoding
+# Server defaults for results; requests may override each one. PNG stays
+# lossless at any level: 1 is several times faster than Pillow's default 6
+# for somewhat larger files.
+OUTPUT_FORMAT = os.getenv("DREAMY_OUTPUT_FORMAT", "png")  # png, webp or jpeg
+PNG_COMPRESS_LEVEL = int(os.getenv("DREAMY_PNG_COMPRESS_LEVEL", "1"))  # 0-9
+WEBP_QUALITY = int(os.getenv("DREAMY_WEBP_QUALITY", "90"))
+WEBP_LOSSLESS = os.getenv("DREAMY_WEBP_LOSSLESS", "0") == "1"
+JPEG_QUALITY = int(os.getenv("DREAMY_JPEG_QUALITY", "90"))
@@ -3,16 +3,55 @@ Dreamy Vision - FastAPI Backend
 Main application entry point
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List
-import base64
-import io
+from typing import Optional, List, Callable, Any, Dict
+import asyncio
+import json
 from PIL import Image
 
 from app.models.enhancer import ImageEnhancer
 from app.models.llm_service import get_llm_service
+from app.config import (
+    JOB_WORKERS, JOB_QUEUE_SIZE, JOB_TIMEOUT, JOB_RESULT_TTL,
+    BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, NUM_INFERENCE_STEPS, GUIDANCE_SCALE,
+    RESULT_CACHE_MEMORY_MB, RESULT_CACHE_DIR, RESULT_CACHE_DISK_MB,
+    LLM_CACHE_TTL, LLM_CACHE_ENTRIES, LLM_CACHE_PATH, PRELOAD_MODELS,
+    WORKER_PROCESSES, WORKER_THREADS, DEFAULT_QUALITY, ENHANCE_MODE, ROI_MAX_SIZE,
+    PRECISION, CHANNELS_LAST, COMPILE_MODE,
+    IMAGE_STORE_MEMORY_MB, IMAGE_STORE_DIR, IMAGE_STORE_DISK_MB, IMAGE_STORE_TTL, IMAGE_STORE_INLINE_MB,
+    ENHANCE_BATCH_MAX_VARIANTS,
+    SD_MODEL_ID, CONTROLNET_MODEL_ID, DEVICE, NEGATIVE_PROMPT, PIPELINE_REGISTRY, PIPELINE_MEMORY_LIMIT_MB, USE_INPAINTING,
+    SERVER_TIMING, OUTPUT_FORMAT,
+    LLM_CLIENT, OLLAMA_URL, OLLAMA_MODEL, LLM_MAX_CONCURRENCY, LLM_TIMEOUT, LLM_CONNECT_TIMEOUT,
+    LLM_RETRIES, LLM_RETRY_BACKOFF,
+)
+from app.services.jobs import JobQueue, QueueFullError, JobTimeoutError, DONE, FAILED, CANCELLED
+from app.services.run_control import RunCancelled, abort_stats
+from app.services.batching import MicroBatcher
+from app.services.runner import (
+    EnhanceInputs, run_batch, pipeline_for, clamp_strength, prompt_embeddings, original_cache,
+    ENHANCE_MODES, ROI_MODE, TILED_MODE,
+)
+from app.services.result_cache import ResultCache, hash_image, result_key
+from app.services.image_store import ImageStore
+from app.services.llm_cache import CachedLLMService
+from app.services.ollama import OllamaLLMService
+from app.services.model_loader import ModelLoader
+from app.services.worker_pool import WorkerPool
+from app.services.step_planner import plan_steps, step_costs, TIERS
+from app.services.precision import apply_precision, inference_context
+from app.services.compilation import compile_pipelines, warm_up, NONE as NO_COMPILE
+from app.services.pipeline_registry import PipelineRegistry, RegistryEnhancer, VARIANTS, IMG2IMG
+from app.services.metrics import metrics, process_rss_bytes
+from app.utils.image_io import (
+    decode_base64_image, decode_image_bytes, encode_image, encode_image_to_base64,
+    iter_chunks, iter_json_with_base64, json_with_base64_length, OUTPUT_MEDIA_TYPES, ImageTooLargeError, DRAFT_SIZE,
+)
+from app.utils.latent_preview import latents_to_preview, preview_to_base64
 
 app = FastAPI(title="Dreamy Vision API")
 
@@ -25,38 +64,256 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize enhancer and LLM service (lazy loading)
-enhancer = None
-llm_service = None
+# Diffusion runs on worker threads so the event loop keeps serving requests
+job_queue = JobQueue(
+    workers=JOB_WORKERS,
+    max_queued=JOB_QUEUE_SIZE,
+    timeout=JOB_TIMEOUT,
+    result_ttl=JOB_RESULT_TTL,
+)
 
-def get_enhancer(llm_backend: str = "ollama"):
-    global enhancer
-    if enhancer is None:
-        enhancer = ImageEnhancer(llm_backend=llm_backend)
+
+def create_enhancer():
+    if PIPELINE_REGISTRY:
+        # One copy of each component, shared by every pipeline variant
+        registry = PipelineRegistry(
+            SD_MODEL_ID, CONTROLNET_MODEL_ID, DEVICE,
+            memory_limit=PIPELINE_MEMORY_LIMIT_MB * 1024 * 1024,
+        )
+        enhancer = RegistryEnhancer(registry, use_inpainting=USE_INPAINTING)
+    else:
+        enhancer = ImageEnhancer(llm_backend="ollama")
+    # Before any worker processes fork, so they share the converted weights
+    apply_precision(enhancer, PRECISION, channels_last=CHANNELS_LAST)
+    # Builds the registry's img2img variant (loading the components) right away
+    pipeline = pipeline_for(enhancer, IMG2IMG)
+    if pipeline is not None:
+        # The negative prompt never changes: encode it once, up front
+        with inference_context(enhancer):
+            prompt_embeddings.precompute(pipeline, NEGATIVE_PROMPT)
+    if compile_pipelines(enhancer, COMPILE_MODE) != NO_COMPILE:
+        # Compile (or load cached artifacts) now rather than on the first request
+        warm_up(enhancer)
     return enhancer
 
+
+def create_llm():
+    if LLM_CLIENT == "pooled":
+        llm = OllamaLLMService(
+            OLLAMA_URL,
+            OLLAMA_MODEL,
+            max_concurrency=LLM_MAX_CONCURRENCY,
+            timeout=LLM_TIMEOUT,
+            connect_timeout=LLM_CONNECT_TIMEOUT,
+            retries=LLM_RETRIES,
+            backoff=LLM_RETRY_BACKOFF,
+        )
+    else:
+        llm = get_llm_service("ollama")
+    # Repeated descriptions are answered from cache instead of the LLM
+    return CachedLLMService(
+        llm,
+        backend="ollama",
+        ttl=LLM_CACHE_TTL,
+        max_entries=LLM_CACHE_ENTRIES,
+        persist_path=LLM_CACHE_PATH,
+    )
+
+
+# Enhancer and LLM service are built once, in the background at startup
+# when PRELOAD_MODELS is set, otherwise on first use
+model_loader = ModelLoader(create_enhancer, create_llm)
+
+
+def get_enhancer(llm_backend: str = "ollama"):
+    return model_loader.get_enhancer()
+
 def get_llm():
-    global llm_service
-    if llm_service is None:
-        llm_service = get_llm_service("ollama")
-    return llm_service
+    return model_loader.get_llm()
+
+
+# Optional multi-process diffusion sharing one copy of the weights
+worker_pool = WorkerPool(get_enhancer, WORKER_PROCESSES, WORKER_THREADS) if WORKER_PROCESSES > 0 else None
+
+
+def run_enhance_batch(key, items: List[EnhanceInputs]) -> List[Image.Image]:
+    """Run one micro-batch; key is (steps, guidance, strength, scheduler, resolution, mode, variant)"""
+    num_inference_steps, guidance_scale, strength, scheduler, resolution, mode, variant = key
+    if worker_pool is not None:
+        # Stages run in the worker process; the parent only sees the whole run
+        with metrics.timed("worker", *[item.trace for item in items]):
+            return worker_pool.run_batch(key, items, prompt_fn=get_llm().enhance_prompt)
+    return run_batch(
+        get_enhancer(llm_backend="ollama"),
+        items,
+        prompt_fn=get_llm().enhance_prompt,
+        num_inference_steps=num_inference_steps,
+        guidance_scale=guidance_scale,
+        strength=strength,
+        scheduler=scheduler,
+        resolution=resolution,
+        mode=mode,
+        variant=variant,
+    )
+
+
+batcher = MicroBatcher(
+    run_enhance_batch,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait=BATCH_MAX_WAIT_MS / 1000.0,
+)
 
 
-class EnhanceRequest(BaseModel):
-    original_image: str  # base64 encoded
-    user_drawing: str    # base64 encoded
+result_cache = ResultCache(
+    memory_bytes=RESULT_CACHE_MEMORY_MB * 1024 * 1024,
+    disk_dir=RESULT_CACHE_DIR,
+    disk_bytes=RESULT_CACHE_DISK_MB * 1024 * 1024,
+)
+
+
+# Uploaded originals and drawings, referenced by id instead of re-sent
+image_store = ImageStore(
+    memory_bytes=IMAGE_STORE_MEMORY_MB * 1024 * 1024,
+    disk_dir=IMAGE_STORE_DIR,
+    disk_bytes=IMAGE_STORE_DISK_MB * 1024 * 1024,
+    ttl=IMAGE_STORE_TTL,
+    inline_bytes=IMAGE_STORE_INLINE_MB * 1024 * 1024,
+)
+
+
+def cache_hit_rates() -> Dict[str, float]:
+    rates = {
+        "results": result_cache.stats()["hit_rate"],
+        "prompt_embeddings": prompt_embeddings.stats()["hit_rate"],
+        "latents": original_cache.stats()["latent_hit_rate"],
+        "images": image_store.stats()["hit_rate"],
+    }
+    if model_loader.llm is not None:
+        rates["llm"] = model_loader.llm.stats()["hit_rate"]
+    return rates
+
+
+metrics.gauge("queue_depth", "Jobs waiting for a worker", lambda: job_queue.depth)
+metrics.gauge("in_flight", "Jobs running on a worker", lambda: job_queue.running)
+metrics.gauge("cache_hit_rate", "Hit rate per cache since start", cache_hit_rates, label="cache")
+metrics.gauge("resident_memory_bytes", "Process resident set size", process_rss_bytes)
+
+
+class OutputSettings(BaseModel):
+    # Result encoding; unset fields use the server's DREAMY_* defaults
+    output_format: Optional[str] = None  # "png", "webp" or "jpeg"
+    output_quality: Optional[int] = None  # WebP/JPEG quality 1-100
+    png_compress_level: Optional[int] = None  # 0 (fastest, largest) - 9
+    webp_lossless: Optional[bool] = None
+
+
+class EnhanceSettings(OutputSettings):
     description: str
     enhancement_strength: float = 0.3
+    seed: Optional[int] = None
+    num_inference_steps: int = NUM_INFERENCE_STEPS
+    guidance_scale: float = GUIDANCE_SCALE
+    deadline_ms: Optional[int] = None  # Give up after this long (also X-Deadline-Ms header)
+    quality: Optional[str] = None  # "fast", "balanced" or "best" (overrides num_inference_steps)
+    latency_budget_ms: Optional[int] = None  # Pick the best plan predicted to finish in time
+    mode: Optional[str] = None  # "full", "roi" (drawn region) or "tiled" (native resolution)
+    variant: Optional[str] = None  # "img2img", "inpaint" or "plain" (no ControlNet); None = server default
+    image_id: Optional[str] = None    # Stored original (POST /images or an earlier response)
+    drawing_id: Optional[str] = None  # Stored drawing (POST /images)
+
+
+class EnhanceRequest(EnhanceSettings):
+    original_image: Optional[str] = None  # base64 encoded (or image_id)
+    user_drawing: Optional[str] = None    # base64 encoded (or drawing_id)
+
+
+class StreamEnhanceRequest(EnhanceRequest):
+    preview_every: int = 5  # Send a latent preview every N steps (0 = never)
 
 
 class EnhanceResponse(BaseModel):
     enhanced_image: str  # base64 encoded
     processing_time: float
+    plan: Optional[Dict[str, Any]] = None  # Scheduler, steps and resolution used
+    image_id: Optional[str] = None  # Send this instead of original_image next time
+    media_type: str = "image/png"  # Of enhanced_image, for building a data URL
+
+
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    progress: float
+    stage: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    details: Dict[str, Any] = {}
+
+
+class EnhanceVariant(BaseModel):
+    """One interpretation in a batch: its own drawing, description, strength and seed"""
+    description: str
+    user_drawing: Optional[str] = None  # base64 encoded (or drawing_id)
+    drawing_id: Optional[str] = None
+    enhancement_strength: float = 0.3
+    seed: Optional[int] = None
+
+
+class BatchEnhanceRequest(OutputSettings):
+    original_image: Optional[str] = None  # base64 encoded (or image_id)
+    image_id: Optional[str] = None
+    variants: List[EnhanceVariant]
+    # Shared by every variant; same meaning as in EnhanceSettings
+    num_inference_steps: int = NUM_INFERENCE_STEPS
+    guidance_scale: float = GUIDANCE_SCALE
+    deadline_ms: Optional[int] = None
+    quality: Optional[str] = None
+    latency_budget_ms: Optional[int] = None
+    mode: Optional[str] = None
+    variant: Optional[str] = None  # Pipeline variant, not to be confused with `variants`
+    stream: bool = False  # Server-Sent Events, one `result` per variant as it finishes
+
+    def settings_for(self, variant: EnhanceVariant) -> EnhanceSettings:
+        return EnhanceSettings(
+            description=variant.description,
+            enhancement_strength=variant.enhancement_strength,
+            seed=variant.seed,
+            num_inference_steps=self.num_inference_steps,
+            guidance_scale=self.guidance_scale,
+            quality=self.quality,
+            latency_budget_ms=self.latency_budget_ms,
+            mode=self.mode,
+            variant=self.variant,
+            image_id=self.image_id,
+            drawing_id=variant.drawing_id,
+        )
+
+
+class BatchResult(BaseModel):
+    index: int  # Position in the request's variants
+    enhanced_image: str  # base64 encoded
+    plan: Optional[Dict[str, Any]] = None
+
+
+class BatchEnhanceResponse(BaseModel):
+    results: List[BatchResult]
+    processing_time: float
+    image_id: Optional[str] = None
+    media_type: str = "image/png"
+
+
+class ImageUploadResponse(BaseModel):
+    image_id: str
+    width: int
+    height: int
+    expires_in: float  # Seconds the image is kept after its last use
 
 
 class HintRequest(BaseModel):
     description: str
     num_hints: int = 3
+    stream: bool = False  # Server-Sent Events, one `hint` per suggestion as it is generated
 
 
 class HintResponse(BaseModel):
@@ -64,6 +321,27 @@ class HintResponse(BaseModel):
     enhanced_prompt: Optional[str] = None
 
 
+@app.on_event("startup")
+async def start_job_queue():
+    if worker_pool is not None:
+        # Load and fork first, while this process has no other threads (forked
+        # children would inherit any lock one of them held). Blocks startup
+        # until the weights are in memory.
+        worker_pool.start()
+    job_queue.start()
+    if PRELOAD_MODELS:
+        model_loader.preload()
+
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+    if worker_pool is not None:
+        worker_pool.close()
+    if model_loader.llm is not None and hasattr(model_loader.llm, "close"):
+        await run_in_threadpool(model_loader.llm.close)
+
+
 @app.get("/")
 async def root():
     return {"message": "Dreamy Vision API", "status": "running"}
@@ -74,20 +352,52 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: 200 once the img2img pipeline and LLM are loaded, 503 before
+    Reports per-component load state and timings
+    """
+    status = model_loader.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Result, LLM, prompt embedding, original image cache and image store counters"""
+    stats = result_cache.stats()
+    if model_loader.llm is not None:
+        stats["llm"] = model_loader.llm.stats()
+    stats["prompt_embeddings"] = prompt_embeddings.stats()
+    stats["originals"] = original_cache.stats()
+    stats["images"] = image_store.stats()
+    return stats
+
+
 @app.post("/hint", response_model=HintResponse)
 async def generate_hints(request: HintRequest):
     """
     Generate AI hints/suggestions for what the user might see
     Returns multiple alternative interpretations
+    
+    With `stream` set, responds with Server-Sent Events: `hint` (`index`,
+    `hint`) as each one is generated, then `prompt` (`enhanced_prompt`) and
+    `done`, or `error`.
     """
+    if request.stream:
+        return StreamingResponse(
+            hint_events(request),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     try:
-        llm = get_llm()
-        
-        # Generate hints
-        hints = llm.generate_hints(request.description, request.num_hints)
+        llm = await run_in_threadpool(get_llm)
         
-        # Also generate an enhanced prompt
-        enhanced_prompt = llm.enhance_prompt(request.description)
+        # Generate hints and an enhanced prompt concurrently
+        hints, enhanced_prompt = await asyncio.gather(
+            llm.agenerate_hints(request.description, request.num_hints),
+            llm.aenhance_prompt(request.description),
+        )
         
         return HintResponse(
             hints=hints,
@@ -97,80 +407,817 @@ async def generate_hints(request: HintRequest):
         raise HTTPException(status_code=500, detail=f"Hint generation failed: {str(e)}")
 
 
+async def hint_events(request: HintRequest):
+    try:
+        llm = await run_in_threadpool(get_llm)
+        # The prompt is generated alongside the hints
+        prompt = asyncio.ensure_future(llm.aenhance_prompt(request.description))
+        try:
+            index = 0
+            async for hint in llm.stream_hints(request.description, request.num_hints):
+                yield sse_event("hint", {"index": index, "hint": hint})
+                index += 1
+            yield sse_event("prompt", {"enhanced_prompt": await prompt})
+        finally:
+            prompt.cancel()
+        yield sse_event("done", {"hints": index})
+    except Exception as e:
+        yield sse_event("error", {"detail": f"Hint generation failed: {str(e)}"})
+
+
+def check_plan_settings(settings: EnhanceSettings):
+    """Reject unknown quality tiers, modes, variants and empty budgets before queueing"""
+    if settings.quality is not None and settings.quality not in TIERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"quality must be one of: {', '.join(TIERS)}",
+        )
+    if settings.latency_budget_ms is not None and settings.latency_budget_ms <= 0:
+        raise HTTPException(status_code=400, detail="latency_budget_ms must be positive")
+    if settings.mode is not None and settings.mode not in ENHANCE_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"mode must be one of: {', '.join(ENHANCE_MODES)}",
+        )
+    if settings.variant is not None and settings.variant not in VARIANTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"variant must be one of: {', '.join(VARIANTS)}",
+        )
+
+
+def output_options(settings: OutputSettings) -> Dict[str, Any]:
+    """encode_image keyword arguments for a request (400 on bad values)"""
+    output_format = (settings.output_format or OUTPUT_FORMAT).lower()
+    if output_format not in OUTPUT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported output format: {output_format}")
+    if settings.output_quality is not None and not 1 <= settings.output_quality <= 100:
+        raise HTTPException(status_code=400, detail="output_quality must be between 1 and 100")
+    if settings.png_compress_level is not None and not 0 <= settings.png_compress_level <= 9:
+        raise HTTPException(status_code=400, detail="png_compress_level must be between 0 and 9")
+    return dict(
+        output_format=output_format,
+        quality=settings.output_quality,
+        compress_level=settings.png_compress_level,
+        lossless=settings.webp_lossless,
+    )
+
+
+def plan_for(settings: EnhanceSettings, strength: float):
+    """
+    Choose scheduler, steps and resolution for a request
+    
+    An explicit quality tier wins, then an explicit latency budget.
+    Otherwise the server's DREAMY_DEFAULT_QUALITY applies, or
+    num_inference_steps as given. A deadline never changes the plan; it
+    only aborts a run that overruns it.
+    """
+    quality = settings.quality or (DEFAULT_QUALITY if settings.latency_budget_ms is None else None)
+    return plan_steps(
+        strength,
+        quality=quality,
+        budget_ms=settings.latency_budget_ms,
+        num_inference_steps=settings.num_inference_steps,
+    )
+
+
+def draft_size_for(mode: str) -> int:
+    # ROI and tiled modes work on the original at up to ROI_MAX_SIZE, so keep the detail
+    return ROI_MAX_SIZE if mode in (ROI_MODE, TILED_MODE) else DRAFT_SIZE
+
+
+def load_image(data: Any, stored_id: Optional[str], decode: Callable, draft_size: int, keep: bool = False):
+    """
+    A decoded input image and its content hash
+    
+    Stored images (from the image store) are already decoded, and their ids
+    are their content hashes. With `keep`, a decoded image is also kept in
+    memory so the id returned for it works for the next request.
+    """
+    if isinstance(data, Image.Image):
+        return data, stored_id
+    image = decode(data, draft_size=draft_size)
+    if keep:
+        return image, image_store.keep(image, draft_size)
+    return image, hash_image(image)
+
+
+def enhance_cache_key(image_id: str, drawing_hash: str, settings: EnhanceSettings, strength: float, plan, mode: str) -> str:
+    return result_key(
+        image_id,
+        drawing_hash,
+        settings.description,
+        strength,
+        plan.num_inference_steps,
+        settings.guidance_scale,
+        settings.seed,
+        plan.scheduler,
+        plan.resolution,
+        mode,
+        settings.variant or "default",
+    )
+
+
+def enhance_batch_key(settings: EnhanceSettings, strength: float, plan, mode: str) -> tuple:
+    """Runs with equal keys can share a pipeline call (see run_enhance_batch)"""
+    return (
+        plan.num_inference_steps, settings.guidance_scale, strength,
+        plan.scheduler, plan.resolution, mode, settings.variant,
+    )
+
+
+def run_enhance(
+    job,
+    settings: EnhanceSettings,
+    original_data: Any,
+    drawing_data: Any,
+    decode: Callable[[Any], Image.Image] = decode_base64_image,
+) -> Image.Image:
+    """
+    Decode inputs and run the enhancer (executes on a job worker thread)
+    
+    Args:
+        job: Job used for progress reporting
+        settings: Description and generation parameters
+        original_data: Original image payload (base64 str or raw bytes), or
+            the already decoded image stored under `settings.image_id`
+        drawing_data: Drawing payload, or the image stored under `settings.drawing_id`
+        decode: Turns a payload into a PIL Image (takes a draft_size keyword)
+    """
+    mode = settings.mode or ENHANCE_MODE
+    job.report(0.05, "decoding")
+    draft_size = draft_size_for(mode)
+    with metrics.timed("decode", job.trace):
+        original_img, image_id = load_image(original_data, settings.image_id, decode, draft_size, keep=True)
+        drawing_img, drawing_hash = load_image(drawing_data, settings.drawing_id, decode, draft_size)
+    job.details["image_id"] = image_id
+    
+    strength = clamp_strength(settings.enhancement_strength)
+    plan = plan_for(settings, strength)
+    job.details["plan"] = dict(plan.to_dict(), mode=mode, variant=settings.variant)
+    cache_key = enhance_cache_key(image_id, drawing_hash, settings, strength, plan, mode)
+    
+    # Denoising steps drive progress from 0.2 to 0.95
+    job.control.add_listener(
+        lambda step, total, latents: job.report(0.2 + 0.75 * (step + 1) / total, "denoising")
+    )
+    
+    # Requests with matching settings are coalesced into one pipeline call;
+    # an identical request already running is shared (see ResultCache.get_or_compute)
+    def compute(control):
+        job.report(0.2, "enhancing")
+        return batcher.submit(enhance_batch_key(settings, strength, plan, mode), EnhanceInputs(
+            original_image=original_img,
+            user_drawing=drawing_img,
+            description=settings.description,
+            enhancement_strength=settings.enhancement_strength,
+            seed=settings.seed,
+            control=control,
+            image_id=image_id,
+            trace=job.trace,
+        ))
+    
+    enhanced_img = result_cache.get_or_compute(cache_key, compute, control=job.control)
+    job.report(0.95, "encoding")
+    return enhanced_img
+
+
+def run_enhance_variants(
+    job,
+    request: BatchEnhanceRequest,
+    original_data: Any,
+    drawings: List[Any],
+    on_result: Optional[Callable[[int, Image.Image, Dict[str, Any]], None]] = None,
+    decode: Callable[[Any], Image.Image] = decode_base64_image,
+) -> List[Image.Image]:
+    """
+    Enhance several variants of one original (executes on a job worker thread)
+    
+    The original is decoded once. Variants that are already cached are
+    answered straight away. The rest run as one pipeline call per distinct
+    strength (strength decides the schedule), with the original's
+    preprocessing and VAE latents shared through the original cache.
+    
+    Args:
+        job: Job used for progress reporting (and cancellation, for every variant)
+        request: Shared settings plus the variants
+        original_data: Original payload, or the stored image under `request.image_id`
+        drawings: Per variant drawing payload, or its stored image
+        on_result: Called with (index, image, plan dict) as each variant finishes
+        decode: Turns a payload into a PIL Image (takes a draft_size keyword)
+    
+    Returns:
+        One enhanced image per variant, in order
+    """
+    mode = request.mode or ENHANCE_MODE
+    job.report(0.05, "decoding")
+    draft_size = draft_size_for(mode)
+    with metrics.timed("decode", job.trace):
+        original_img, image_id = load_image(original_data, request.image_id, decode, draft_size, keep=True)
+        variants = [
+            (request.settings_for(variant), *load_image(drawing, variant.drawing_id, decode, draft_size))
+            for variant, drawing in zip(request.variants, drawings)
+        ]
+    job.details["image_id"] = image_id
+    
+    groups: Dict[float, List[int]] = {}
+    for index, (settings, _, _) in enumerate(variants):
+        groups.setdefault(clamp_strength(settings.enhancement_strength), []).append(index)
+    
+    # Denoising steps drive progress from 0.2 to 0.95 across all groups
+    finished_groups = [0]
+    job.control.add_listener(lambda step, total, latents: job.report(
+        0.2 + 0.75 * (finished_groups[0] + (step + 1) / total) / len(groups), "denoising"
+    ))
+    
+    results: List[Optional[Image.Image]] = [None] * len(variants)
+    plans: List[Optional[Dict[str, Any]]] = [None] * len(variants)
+    
+    def finish(index: int, image: Image.Image):
+        results[index] = image
+        if on_result is not None:
+            on_result(index, image, plans[index])
+    
+    job.report(0.2, "enhancing")
+    for strength, indices in groups.items():
+        plan = plan_for(request, strength)
+        pending = []
+        for index in indices:
+            settings, drawing_img, drawing_hash = variants[index]
+            plans[index] = dict(plan.to_dict(), mode=mode, variant=request.variant)
+            cache_key = enhance_cache_key(image_id, drawing_hash, settings, strength, plan, mode)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                finish(index, cached)
+            else:
+                pending.append((index, cache_key))
+        if pending:
+            items = [
+                EnhanceInputs(
+                    original_image=original_img,
+                    user_drawing=variants[index][1],
+                    description=variants[index][0].description,
+                    enhancement_strength=variants[index][0].enhancement_strength,
+                    seed=variants[index][0].seed,
+                    control=job.control,
+                    image_id=image_id,
+                    trace=job.trace,
+                )
+                for index, _ in pending
+            ]
+            outputs = run_enhance_batch(enhance_batch_key(variants[pending[0][0]][0], strength, plan, mode), items)
+            for (index, cache_key), output in zip(pending, outputs):
+                if isinstance(output, BaseException):
+                    raise output
+                result_cache.put(cache_key, output)
+                finish(index, output)
+        finished_groups[0] += 1
+    
+    job.details["plans"] = plans
+    job.report(0.95, "encoding")
+    return results
+
+
+def run_enhance_encoded(job, settings: EnhanceSettings, original_data, drawing_data,
+                        decode=decode_base64_image, options: Optional[Dict[str, Any]] = None) -> bytes:
+    """Run enhancement and return the result as encoded image bytes (options: see output_options)"""
+    enhanced_img = run_enhance(job, settings, original_data, drawing_data, decode)
+    with metrics.timed("encode", job.trace):
+        return encode_image(enhanced_img, **(options or {}))
+
+
+def image_payload(inline: Any, image_id: Optional[str], field: str, id_field: str, mode: Optional[str] = None):
+    """
+    An input image: the inline payload if sent, else the decoded image stored under its id
+
+    An original kept from an inline request at a smaller draft size than
+    `mode` decodes at doesn't count, so the run never gets less detail than
+    sending the image would give it.
+    """
+    if inline is not None:
+        return inline
+    if image_id is None:
+        raise HTTPException(status_code=400, detail=f"Send {field} or {id_field}")
+    image = image_store.get(image_id, draft_size=draft_size_for(mode or ENHANCE_MODE))
+    if image is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired {id_field}; upload the image again")
+    return image
+
+
+def request_images(request: EnhanceRequest):
+    """(original, drawing) payloads for run_enhance"""
+    return (
+        image_payload(request.original_image, request.image_id, "original_image", "image_id", request.mode),
+        image_payload(request.user_drawing, request.drawing_id, "user_drawing", "drawing_id", request.mode),
+    )
+
+
+def request_deadline_ms(settings: EnhanceSettings, http_request: Request) -> Optional[int]:
+    """Tightest of the body's deadline_ms and the X-Deadline-Ms header"""
+    budgets = [settings.deadline_ms]
+    header = http_request.headers.get("x-deadline-ms")
+    if header:
+        try:
+            budgets.append(int(header))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Deadline-Ms must be an integer")
+    budgets = [budget for budget in budgets if budget is not None]
+    return min(budgets) if budgets else None
+
+
+async def run_until_done(http_request: Request, settings: EnhanceSettings, fn: Callable, *args):
+    """
+    Run a job for this request and wait for it
+    
+    The request's deadline (counted from now, so queue time included) is
+    handed to the run, and the job is cancelled if the client disconnects,
+    so abandoned requests stop at the next denoising step.
+    
+    Returns:
+        The finished Job (its result in `job.result`); raises the job's error
+    """
+    deadline_ms = request_deadline_ms(settings, http_request)
+    check_plan_settings(settings)
+    job = job_queue.submit(fn, settings, *args)
+    if deadline_ms is not None:
+        job.control.set_timeout(deadline_ms / 1000.0)
+    
+    waiter = asyncio.ensure_future(job.wait())
+    try:
+        while True:
+            done, _ = await asyncio.wait({waiter}, timeout=0.5)
+            if done:
+                waiter.result()
+                return job
+            if not job.cancelled and await http_request.is_disconnected():
+                job.cancel("client disconnected")
+    finally:
+        if not waiter.done():
+            waiter.cancel()
+
+
+def trace_headers(http_request: Request, job, total: float) -> Dict[str, str]:
+    """Server-Timing header with the job's stage breakdown, if asked for"""
+    if not (SERVER_TIMING or http_request.headers.get("x-trace") == "1"):
+        return {}
+    return {"Server-Timing": job.trace.server_timing(total)}
+
+
+def cancelled_status(e: RunCancelled) -> int:
+    # 499: client closed request (nginx convention)
+    return 504 if e.reason == "deadline exceeded" else 499
+
+
+@app.get("/stats")
+async def stats():
+    """Queue depth, batching and aborted-run counters"""
+    registry = getattr(model_loader.enhancer, "registry", None)
+    return {
+        "queue_depth": job_queue.depth,
+        "running": job_queue.running,
+        "batching": batcher.stats(),
+        "aborts": abort_stats.to_dict(),
+        "step_costs": step_costs.to_dict(),
+        "precision": getattr(model_loader.enhancer, "precision", None),
+        "compile_mode": getattr(model_loader.enhancer, "compile_mode", None),
+        "pipelines": registry.stats() if registry is not None else None,
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Per-stage latency histograms, queue, cache and memory gauges (Prometheus text format)"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/images", response_model=ImageUploadResponse)
+async def upload_image(image: UploadFile = File(...)):
+    """
+    Store an original or drawing for later requests
+    
+    The image is decoded once, at the largest working size any mode uses,
+    and kept by content hash. Send the returned id as `image_id` or
+    `drawing_id` instead of the image; the same upload always gets the
+    same id, so re-uploading after a 404 is safe.
+    """
+    data = await image.read()
+    try:
+        decoded = await run_in_threadpool(decode_image_bytes, data, draft_size=ROI_MAX_SIZE)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    image_id = await run_in_threadpool(image_store.put, decoded)
+    return ImageUploadResponse(
+        image_id=image_id,
+        width=decoded.size[0],
+        height=decoded.size[1],
+        expires_in=image_store.ttl,
+    )
+
+
 @app.post("/enhance", response_model=EnhanceResponse)
-async def enhance_image(request: EnhanceRequest):
+async def enhance_image(request: EnhanceRequest, http_request: Request):
     """
     Enhance pattern image using user's drawing as guidance
+    Send "X-Trace: 1" for a Server-Timing header with the stage breakdown
+    
+    The result is encoded per output_format (server default
+    DREAMY_OUTPUT_FORMAT) off the event loop, and streamed into the JSON
+    body as base64 rather than built up as one large string.
     """
+    options = output_options(request)
     try:
         import time
         start_time = time.time()
         
-        # Decode images
-        original_img = decode_base64_image(request.original_image)
-        drawing_img = decode_base64_image(request.user_drawing)
-        
-        # Get enhancer (with LLM backend)
-        enhancer = get_enhancer(llm_backend="ollama")
-        
-        # Enhance image
-        enhanced_img = enhancer.enhance(
-            original_image=original_img,
-            user_drawing=drawing_img,
-            description=request.description,
-            enhancement_strength=request.enhancement_strength
+        # Decode and enhance on a worker thread
+        job = await run_until_done(
+            http_request, request, run_enhance, *request_images(request)
         )
         
         # Encode result
-        enhanced_base64 = encode_image_to_base64(enhanced_img)
+        with metrics.timed("encode", job.trace):
+            image_bytes = await run_in_threadpool(encode_image, job.result, **options)
         
         processing_time = time.time() - start_time
+        fields = EnhanceResponse(
+            enhanced_image="",
+            processing_time=processing_time,
+            plan=job.details.get("plan"),
+            image_id=job.details.get("image_id"),
+            media_type=OUTPUT_MEDIA_TYPES[options["output_format"]],
+        ).dict(exclude={"enhanced_image"})
         
-        return EnhanceResponse(
-            enhanced_image=enhanced_base64,
-            processing_time=processing_time
+        return StreamingResponse(
+            iter_json_with_base64(fields, "enhanced_image", image_bytes),
+            media_type="application/json",
+            headers={
+                "Content-Length": str(json_with_base64_length(fields, "enhanced_image", image_bytes)),
+                **trace_headers(http_request, job, processing_time),
+            },
         )
         
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except JobTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Enhancement failed: {str(e)}")
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except RunCancelled as e:
+        raise HTTPException(status_code=cancelled_status(e), detail=f"Enhancement failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Enhancement failed: {str(e)}")
 
 
-def decode_base64_image(base64_str: str) -> Image.Image:
-    """Decode base64 string to PIL Image"""
+@app.post("/enhance/upload")
+async def enhance_image_upload(
+    http_request: Request,
+    original_image: Optional[UploadFile] = File(None),
+    user_drawing: Optional[UploadFile] = File(None),
+    description: str = Form(...),
+    enhancement_strength: float = Form(0.3),
+    seed: Optional[int] = Form(None),
+    num_inference_steps: int = Form(NUM_INFERENCE_STEPS),
+    guidance_scale: float = Form(GUIDANCE_SCALE),
+    output_format: Optional[str] = Form(None),
+    output_quality: Optional[int] = Form(None),
+    png_compress_level: Optional[int] = Form(None),
+    webp_lossless: Optional[bool] = Form(None),
+    deadline_ms: Optional[int] = Form(None),
+    quality: Optional[str] = Form(None),
+    latency_budget_ms: Optional[int] = Form(None),
+    mode: Optional[str] = Form(None),
+    variant: Optional[str] = Form(None),
+    image_id: Optional[str] = Form(None),
+    drawing_id: Optional[str] = Form(None),
+):
+    """
+    Enhance using multipart/form-data file uploads
+    Returns the enhanced image bytes directly (image/png, image/webp or
+    image/jpeg) instead of base64 in JSON; the step plan is in the
+    X-Step-Plan header and the original's image_id in X-Image-Id
+    """
+    settings = EnhanceSettings(
+        description=description,
+        enhancement_strength=enhancement_strength,
+        seed=seed,
+        num_inference_steps=num_inference_steps,
+        guidance_scale=guidance_scale,
+        deadline_ms=deadline_ms,
+        quality=quality,
+        latency_budget_ms=latency_budget_ms,
+        mode=mode,
+        variant=variant,
+        image_id=image_id,
+        drawing_id=drawing_id,
+        output_format=output_format,
+        output_quality=output_quality,
+        png_compress_level=png_compress_level,
+        webp_lossless=webp_lossless,
+    )
+    options = output_options(settings)
     try:
-        # Remove data URL prefix if present
-        if ',' in base64_str:
-            base64_str = base64_str.split(',')[1]
+        import time
+        start_time = time.time()
         
-        image_data = base64.b64decode(base64_str)
-        image = Image.open(io.BytesIO(image_data))
-        image = image.convert('RGB')
+        original_data = image_payload(
+            await original_image.read() if original_image is not None else None,
+            image_id, "original_image", "image_id", settings.mode,
+        )
+        drawing_data = image_payload(
+            await user_drawing.read() if user_drawing is not None else None,
+            drawing_id, "user_drawing", "drawing_id", settings.mode,
+        )
+        job = await run_until_done(
+            http_request, settings, run_enhance_encoded, original_data, drawing_data,
+            decode_image_bytes, options
+        )
+        image_bytes = job.result
         
-        # Validate and limit size
-        width, height = image.size
-        max_dimension = 2048
+        processing_time = time.time() - start_time
         
-        if width > max_dimension or height > max_dimension:
-            # Resize maintaining aspect ratio
-            if width > height:
-                new_width = max_dimension
-                new_height = int(height * (max_dimension / width))
-            else:
-                new_height = max_dimension
-                new_width = int(width * (max_dimension / height))
-            image = image.resize((new_width, new_height), Image.LANCZOS)
+        return StreamingResponse(
+            iter_chunks(image_bytes),
+            media_type=OUTPUT_MEDIA_TYPES[options["output_format"]],
+            headers={
+                "Content-Length": str(len(image_bytes)),
+                "X-Processing-Time": f"{processing_time:.3f}",
+                "X-Step-Plan": json.dumps(job.details.get("plan"), separators=(",", ":")),
+                "X-Image-Id": job.details.get("image_id") or "",
+                **trace_headers(http_request, job, processing_time),
+            },
+        )
         
-        return image
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except JobTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Enhancement failed: {str(e)}")
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except RunCancelled as e:
+        raise HTTPException(status_code=cancelled_status(e), detail=f"Enhancement failed: {str(e)}")
     except Exception as e:
-        raise ValueError(f"Invalid image data: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Enhancement failed: {str(e)}")
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def job_events(events: asyncio.Queue, waiter: asyncio.Future):
+    """Yield (event, data) pairs posted by a job's worker thread until the job finishes"""
+    while True:
+        getter = asyncio.ensure_future(events.get())
+        done, _ = await asyncio.wait({getter, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        if getter in done:
+            yield getter.result()
+            continue
+        getter.cancel()
+        break
+    while not events.empty():
+        yield events.get_nowait()
+
+
+@app.post("/enhance/stream")
+async def enhance_image_stream(request: StreamEnhanceRequest, http_request: Request):
+    """
+    Enhance with live progress as Server-Sent Events
+    
+    Events: `queued` (job id), `progress` (step/total), `preview` (small
+    approximate JPEG every `preview_every` steps), then `result` or `error`.
+    Closing the connection, or DELETE /jobs/{id}, cancels the run and stops
+    the denoising loop at the next step.
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    
+    deadline_ms = request_deadline_ms(request, http_request)
+    check_plan_settings(request)
+    options = output_options(request)
+    original_data, drawing_data = request_images(request)
+    try:
+        job = job_queue.submit(run_enhance, request, original_data, drawing_data)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    if deadline_ms is not None:
+        job.control.set_timeout(deadline_ms / 1000.0)
+    
+    def on_step(step, total, latents):
+        # Runs on the worker thread; previews are cheap (no VAE)
+        data = {"step": step + 1, "total": total}
+        loop.call_soon_threadsafe(events.put_nowait, ("progress", data))
+        every = request.preview_every
+        if every > 0 and latents is not None and (step + 1) % every == 0:
+            preview = preview_to_base64(latents_to_preview(latents))
+            loop.call_soon_threadsafe(events.put_nowait, ("preview", dict(data, image=preview)))
+    
+    job.control.add_listener(on_step)
+    
+    async def stream():
+        import time
+        start_time = time.time()
+        waiter = asyncio.ensure_future(job.wait())
+        try:
+            yield sse_event("queued", {"job_id": job.id})
+            async for event, data in job_events(events, waiter):
+                yield sse_event(event, data)
+            try:
+                enhanced_img = waiter.result()
+            except Exception as e:
+                yield sse_event("error", {"detail": f"Enhancement failed: {str(e)}"})
+                return
+            enhanced_base64 = await run_in_threadpool(encode_image_to_base64, enhanced_img, **options)
+            yield sse_event("result", {
+                "enhanced_image": enhanced_base64,
+                "processing_time": time.time() - start_time,
+                "plan": job.details.get("plan"),
+                "image_id": job.details.get("image_id"),
+                "media_type": OUTPUT_MEDIA_TYPES[options["output_format"]],
+            })
+        finally:
+            # Client went away (or we finished): make sure no work is orphaned
+            if not job.finished:
+                job.cancel("client disconnected")
+            waiter.cancel()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/enhance/batch", response_model=BatchEnhanceResponse)
+async def enhance_image_batch(request: BatchEnhanceRequest, http_request: Request, response: Response):
+    """
+    Enhance several variants (drawing, description, strength, seed) of one original
+    
+    The original is sent, decoded and VAE-encoded once; variants sharing a
+    strength run as one batched pipeline call. Returns all results in
+    variant order, or with `stream` set, Server-Sent Events: `queued`,
+    `progress`, one `result` per variant (with its `index`) as it finishes,
+    then `done` or `error`.
+    """
+    import time
+    start_time = time.time()
+    if not request.variants:
+        raise HTTPException(status_code=400, detail="variants must not be empty")
+    if len(request.variants) > ENHANCE_BATCH_MAX_VARIANTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {ENHANCE_BATCH_MAX_VARIANTS} variants per batch",
+        )
+    options = output_options(request)
+    media_type = OUTPUT_MEDIA_TYPES[options["output_format"]]
+    original_data = image_payload(request.original_image, request.image_id, "original_image", "image_id", request.mode)
+    drawings = [
+        image_payload(variant.user_drawing, variant.drawing_id, "user_drawing", "drawing_id", request.mode)
+        for variant in request.variants
+    ]
+    
+    def encode_result(index, image, plan):
+        return BatchResult(index=index, enhanced_image=encode_image_to_base64(image, **options), plan=plan)
+    
+    if not request.stream:
+        try:
+            job = await run_until_done(http_request, request, run_enhance_variants, original_data, drawings)
+            plans = job.details.get("plans", [])
+            with metrics.timed("encode", job.trace):
+                results = await run_in_threadpool(
+                    lambda: [encode_result(index, image, plans[index]) for index, image in enumerate(job.result)]
+                )
+            processing_time = time.time() - start_time
+            response.headers.update(trace_headers(http_request, job, processing_time))
+            return BatchEnhanceResponse(
+                results=results,
+                processing_time=processing_time,
+                image_id=job.details.get("image_id"),
+                media_type=media_type,
+            )
+        except HTTPException:
+            raise
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+        except JobTimeoutError as e:
+            raise HTTPException(status_code=504, detail=f"Enhancement failed: {str(e)}")
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except RunCancelled as e:
+            raise HTTPException(status_code=cancelled_status(e), detail=f"Enhancement failed: {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Enhancement failed: {str(e)}")
+    
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    
+    def on_result(index, image, plan):
+        # Runs on the worker thread, so encoding stays off the event loop
+        result = encode_result(index, image, plan)
+        loop.call_soon_threadsafe(events.put_nowait, ("result", result.dict()))
+    
+    deadline_ms = request_deadline_ms(request, http_request)
+    check_plan_settings(request)
+    try:
+        job = job_queue.submit(run_enhance_variants, request, original_data, drawings, on_result)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    if deadline_ms is not None:
+        job.control.set_timeout(deadline_ms / 1000.0)
+    job.control.add_listener(lambda step, total, latents: loop.call_soon_threadsafe(
+        events.put_nowait, ("progress", {"step": step + 1, "total": total})
+    ))
+    
+    async def stream():
+        waiter = asyncio.ensure_future(job.wait())
+        try:
+            yield sse_event("queued", {"job_id": job.id})
+            async for event, data in job_events(events, waiter):
+                yield sse_event(event, data)
+            try:
+                waiter.result()
+            except Exception as e:
+                yield sse_event("error", {"detail": f"Enhancement failed: {str(e)}"})
+                return
+            yield sse_event("done", {
+                "processing_time": time.time() - start_time,
+                "image_id": job.details.get("image_id"),
+                "media_type": media_type,
+            })
+        finally:
+            # Client went away (or we finished): make sure no work is orphaned
+            if not job.finished:
+                job.cancel("client disconnected")
+            waiter.cancel()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/jobs/enhance", response_model=JobResponse, status_code=202)
+async def submit_enhance_job(request: EnhanceRequest, http_request: Request):
+    """
+    Queue an enhancement and return its job id immediately
+    Poll GET /jobs/{id} for progress, then fetch GET /jobs/{id}/result
+    """
+    deadline_ms = request_deadline_ms(request, http_request)
+    check_plan_settings(request)
+    options = output_options(request)
+    original_data, drawing_data = request_images(request)
+    try:
+        job = job_queue.submit(
+            run_enhance_encoded, request, original_data, drawing_data, decode_base64_image, options
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    if deadline_ms is not None:
+        job.control.set_timeout(deadline_ms / 1000.0)
+    job.details["media_type"] = OUTPUT_MEDIA_TYPES[options["output_format"]]
+    return JobResponse(**job.to_dict())
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Report job status: queued, running, done or failed"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job.to_dict())
+
+
+@app.delete("/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; a running one stops at the next denoising step"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job.finished:
+        job.cancel()
+    return JobResponse(**job.to_dict())
 
 
-def encode_image_to_base64(image: Image.Image) -> str:
-    """Encode PIL Image to base64 string"""
-    buffer = io.BytesIO()
-    image.save(buffer, format='PNG')
-    image_data = buffer.getvalue()
-    return base64.b64encode(image_data).decode('utf-8')
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Return the enhanced image (PNG unless the job asked otherwise) once it is done; 499 if it was cancelled"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == CANCELLED:
+        # Same statuses as the synchronous endpoints: 499 cancelled, 504 past its deadline
+        error = job.error if isinstance(job.error, RunCancelled) else RunCancelled()
+        raise HTTPException(status_code=cancelled_status(error), detail=f"Enhancement failed: {str(error)}")
+    if job.status == FAILED:
+        raise HTTPException(status_code=500, detail=f"Enhancement failed: {str(job.error)}")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return Response(content=job.result, media_type=job.details.get("media_type", "image/png"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+"""
+Dreamy Vision - Micro-batching
+Coalesces concurrent enhancement requests into one pipeline call
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class _Batch:
+    def __init__(self):
+        self.items: List[Any] = []
+        self.results: Optional[List[Any]] = None
+        self.error: Optional[BaseException] = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Leader/follower batcher for worker threads
+
+    The first thread to submit under a key becomes the leader: it waits up to
+    `max_wait` seconds for compatible requests (same key), then runs the whole
+    batch and hands each follower its result. A batch that reaches
+    `max_batch_size` runs immediately.
+
+    Args:
+        run_fn: Called as `run_fn(key, items)`; must return one result per item
+            (an exception instance in place of a result is raised to that caller only)
+        max_batch_size: Largest batch to form
+        max_wait: Seconds the leader waits for more requests
+    """
+
+    def __init__(self, run_fn: Callable[[Hashable, List[Any]], List[Any]], max_batch_size: int = 4, max_wait: float = 0.05):
+        self.run_fn = run_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._open: Dict[Hashable, _Batch] = {}
+        self.batches = 0
+        self.items = 0
+        self.size_counts: Dict[int, int] = {}
+
+    def submit(self, key: Hashable, item: Any) -> Any:
+        """Add an item to the open batch for `key` and block until its result is ready"""
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._open[key] = batch
+            index = len(batch.items)
+            batch.items.append(item)
+            if len(batch.items) >= self.max_batch_size:
+                del self._open[key]
+                batch.full.set()
+
+        if not leader:
+            batch.done.wait()
+        else:
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+                self.batches += 1
+                self.items += len(batch.items)
+                self.size_counts[len(batch.items)] = self.size_counts.get(len(batch.items), 0) + 1
+            try:
+                batch.results = self.run_fn(key, batch.items)
+            except Exception as e:
+                batch.error = e
+            batch.done.set()
+
+        if batch.error is not None:
+            raise batch.error
+        result = batch.results[index]
+        if isinstance(result, BaseException):
+            # Per-item failure (e.g. this request was cancelled)
+            raise result
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.size_counts.items())),
+        }
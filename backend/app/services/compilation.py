@@ -0,0 +1,351 @@
+"""
+Dreamy Vision - Graph Compilation
+Opt-in torch.compile (UNet, ControlNet, VAE decoder) or TorchScript (UNet,
+VAE decoder), with compiled artifacts cached on disk and eager fallback
+"""
+
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import MODELS_DIR
+
+
+NONE = "none"
+COMPILE = "compile"  # torch.compile (inductor, CPU C++ kernels)
+TRACE = "trace"      # TorchScript trace per input shape, frozen
+COMPILE_MODES = (NONE, COMPILE, TRACE)
+
+COMPILE_CACHE_DIR = MODELS_DIR / "compiled"
+
+_KINDS = ("unet", "controlnet", "vae")
+_PREPARER = "compile"  # Key of the PipelineRegistry preparer
+
+
+def _model_id(module) -> str:
+    config = getattr(module, "config", None)
+    name = getattr(config, "_name_or_path", None) if config is not None else None
+    return name or type(module).__name__
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "model"
+
+
+def _module_dtype(module) -> str:
+    return str(getattr(module, "dtype", "unknown")).replace("torch.", "")
+
+
+class CompiledModule:
+    """
+    Stands in for a pipeline module and runs its compiled form
+
+    Attribute access (config, dtype, device...) falls through to the eager
+    module, so the pipeline can't tell the difference. The first failure of
+    the compiled path switches this module back to eager for good.
+    """
+
+    def __init__(self, eager, compiled: Callable, name: str):
+        self.eager = eager
+        self.compiled = compiled
+        self.name = name
+        self.failed = False
+
+    def __getattr__(self, name):
+        if name == "eager":  # Not set yet (e.g. during copy); don't recurse
+            raise AttributeError(name)
+        return getattr(self.eager, name)
+
+    def _run(self, compiled: Callable, eager: Callable, *args, **kwargs):
+        if not self.failed:
+            try:
+                return compiled(*args, **kwargs)
+            except Exception as e:
+                print(f"Warning: Compiled {self.name} failed, falling back to eager: {e}")
+                self.failed = True
+        return eager(*args, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        return self._run(self.compiled, self.eager, *args, **kwargs)
+
+
+class CompiledVAE(CompiledModule):
+    """VAE stand-in: only `decode` is compiled; encoding samples a distribution and stays eager"""
+
+    def decode(self, *args, **kwargs):
+        return self._run(self.compiled, self.eager.decode, *args, **kwargs)
+
+
+class ShapeTracer:
+    """
+    TorchScript-traces a module once per input signature, caching traces on disk
+
+    Args:
+        module: Eager module to trace
+        kind: "unet" or "vae"
+        cache_dir: Where traced files live
+    """
+
+    def __init__(self, module, kind: str, cache_dir: Path):
+        self.module = module
+        self.kind = kind
+        self.cache_dir = cache_dir
+        self._traced: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, inputs: Tuple, static: Tuple) -> str:
+        import torch
+        parts = [
+            _model_id(self.module),
+            _module_dtype(self.module),
+            torch.__version__,
+            str(torch.is_autocast_cpu_enabled()),
+            repr(static),
+        ] + [f"{tuple(t.shape)}:{t.dtype}" for t in inputs]
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+    def get(self, inputs: Tuple, static: Tuple, build: Callable[[], Any]):
+        """The trace for these inputs: from memory, from disk, or traced now"""
+        import torch
+        key = self._key(inputs, static)
+        traced = self._traced.get(key)
+        if traced is not None:
+            return traced
+        with self._lock:
+            traced = self._traced.get(key)
+            if traced is not None:
+                return traced
+            path = self.cache_dir / f"{self.kind}-{key}.pt"
+            if path.exists():
+                try:
+                    traced = torch.jit.load(str(path))
+                except Exception as e:
+                    print(f"Warning: Discarding unreadable trace {path}: {e}")
+            if traced is None:
+                print(f"Tracing {self.kind} for {[tuple(t.shape) for t in inputs]} (cached at {path})")
+                with torch.no_grad():
+                    traced = torch.jit.freeze(torch.jit.trace(build().eval(), inputs, check_trace=False))
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                # Write then rename, so a crash never leaves a half-written trace behind
+                tmp_path = path.with_suffix(".tmp")
+                torch.jit.save(traced, str(tmp_path))
+                os.replace(tmp_path, path)
+            self._traced[key] = traced
+            return traced
+
+
+def _timestep_tensor(timestep, like):
+    import torch
+    if not torch.is_tensor(timestep):
+        timestep = torch.tensor(timestep)
+    return timestep.to(device=like.device)
+
+
+def _traced_unet(unet, cache_dir: Path) -> Callable:
+    import torch
+
+    class Wrapper(torch.nn.Module):
+        def __init__(self, unet):
+            super().__init__()
+            self.unet = unet
+
+        def forward(self, sample, timestep, encoder_hidden_states, *residuals):
+            down, mid = (list(residuals[:-1]), residuals[-1]) if residuals else (None, None)
+            return self.unet(
+                sample, timestep, encoder_hidden_states=encoder_hidden_states,
+                down_block_additional_residuals=down, mid_block_additional_residual=mid,
+                return_dict=False,
+            )[0]
+
+    tracer = ShapeTracer(unet, "unet", cache_dir)
+
+    def run(sample, timestep, encoder_hidden_states=None, down_block_additional_residuals=None,
+            mid_block_additional_residual=None, return_dict=True, **extra):
+        if any(value is not None for value in extra.values()):
+            raise ValueError(f"Unsupported arguments for traced UNet: {sorted(extra)}")
+        residuals = list(down_block_additional_residuals or [])
+        if mid_block_additional_residual is not None:
+            residuals.append(mid_block_additional_residual)
+        inputs = (sample, _timestep_tensor(timestep, sample), encoder_hidden_states, *residuals)
+        traced = tracer.get(inputs, (len(residuals),), lambda: Wrapper(unet))
+        output = traced(*inputs)
+        return (output,) if not return_dict else SimpleNamespace(sample=output)
+
+    return run
+
+
+def _traced_vae_decode(vae, cache_dir: Path) -> Callable:
+    import torch
+
+    class Wrapper(torch.nn.Module):
+        def __init__(self, vae):
+            super().__init__()
+            self.vae = vae
+
+        def forward(self, latents):
+            return self.vae.decode(latents, return_dict=False)[0]
+
+    tracer = ShapeTracer(vae, "vae", cache_dir)
+
+    def run(latents, return_dict=True, generator=None):
+        traced = tracer.get((latents,), (), lambda: Wrapper(vae))
+        output = traced(latents)
+        return (output,) if not return_dict else SimpleNamespace(sample=output)
+
+    return run
+
+
+def _compiled(module, kind: str, mode: str):
+    import torch
+    if mode == COMPILE:
+        if kind == "vae":
+            return CompiledVAE(module, torch.compile(module.decode), kind)
+        if kind == "controlnet":
+            # The ControlNet pipelines reject anything but ControlNetModel,
+            # MultiControlNetModel or torch's OptimizedModule (outside any
+            # fallback of ours), so this one gets torch.compile's own wrapper
+            return torch.compile(module)
+        return CompiledModule(module, torch.compile(module), kind)
+
+    cache_dir = COMPILE_CACHE_DIR / TRACE / _safe(_model_id(module)) / _module_dtype(module)
+    if kind == "unet":
+        return CompiledModule(module, _traced_unet(module, cache_dir), kind)
+    return CompiledVAE(module, _traced_vae_decode(module, cache_dir), kind)
+
+
+def _is_compiled(module) -> bool:
+    return isinstance(module, CompiledModule) or hasattr(module, "_orig_mod")
+
+
+def _eager(module):
+    """The eager module behind a compiled stand-in (or the module itself)"""
+    if isinstance(module, CompiledModule):
+        return module.eager
+    return getattr(module, "_orig_mod", module)
+
+
+def _prepare(kind: str, module, mode: str):
+    """`module`'s compiled stand-in, or the module itself if it stays eager"""
+    # Traced ControlNet stand-ins aren't accepted by the ControlNet pipelines,
+    # so with tracing it stays eager
+    if kind not in _KINDS or (kind == "controlnet" and mode != COMPILE) or _is_compiled(module):
+        return module
+    try:
+        return _compiled(module, kind, mode)
+    except Exception as e:
+        print(f"Warning: Could not compile {kind}, keeping eager: {e}")
+        return module
+
+
+def _pipelines(enhancer) -> List:
+    return [p for p in (getattr(enhancer, "pipeline", None), getattr(enhancer, "inpaint_pipeline", None)) if p is not None]
+
+
+def compile_pipelines(enhancer, mode: str = NONE) -> str:
+    """
+    Swap the enhancer's UNet, ControlNet and VAE for compiled stand-ins
+
+    Compilation itself happens lazily on the first call with each input
+    shape (see `warm_up`). torch.compile keeps inductor's graph and kernel
+    caches under MODELS_DIR/compiled/inductor; traces are stored under
+    MODELS_DIR/compiled/trace/<model id>/<dtype>/, keyed on input shapes.
+    Any failure leaves (or puts) that module back on eager. With a
+    PipelineRegistry, components it loads later are compiled as well.
+
+    Args:
+        enhancer: Loaded ImageEnhancer
+        mode: NONE, COMPILE or TRACE
+
+    Returns:
+        The mode in effect (also stored as `enhancer.compile_mode`)
+    """
+    if mode not in COMPILE_MODES:
+        raise ValueError(f"Unknown compile mode: {mode} (expected one of {', '.join(COMPILE_MODES)})")
+    registry = getattr(enhancer, "registry", None)
+    pipelines = _pipelines(enhancer) if registry is None else []
+    if mode == NONE or (registry is None and (not pipelines or not all(hasattr(p, "unet") for p in pipelines))):
+        enhancer.compile_mode = NONE
+        return NONE
+
+    try:
+        if mode == COMPILE:
+            os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(COMPILE_CACHE_DIR / "inductor"))
+            import torch._inductor.config as inductor_config
+            if hasattr(inductor_config, "fx_graph_cache"):
+                inductor_config.fx_graph_cache = True
+            # The ControlNet runs as a plain OptimizedModule without CompiledModule's
+            # fallback; let dynamo fall back to eager when a graph fails to compile
+            import torch._dynamo.config as dynamo_config
+            dynamo_config.suppress_errors = True
+    except Exception as e:
+        print(f"Warning: {mode} unavailable, staying on eager: {e}")
+        enhancer.compile_mode = NONE
+        return NONE
+
+    if registry is not None:
+        # Covers the registry's components now and anything it loads again later
+        registry.set_preparer(_PREPARER, lambda kind, module: _prepare(kind, module, mode))
+        enhancer.compile_mode = mode
+        return mode
+
+    # img2img and inpaint may share modules: compile each one once
+    replacements: List[Tuple[Any, Any]] = []
+    for pipeline in pipelines:
+        for kind in _KINDS:
+            module = getattr(pipeline, kind, None)
+            if module is None:
+                continue
+            compiled = next((c for m, c in replacements if m is module), None)
+            if compiled is None:
+                compiled = _prepare(kind, module, mode)
+                replacements.append((module, compiled))
+            setattr(pipeline, kind, compiled)
+
+    enhancer.compile_mode = mode
+    return mode
+
+
+def restore_eager(enhancer):
+    """Put the eager modules back in place of any compiled stand-ins"""
+    registry = getattr(enhancer, "registry", None)
+    if registry is not None:
+        registry.set_preparer(_PREPARER, None)
+        for module in list(registry.components.values()):
+            if _is_compiled(module):
+                registry.replace(module, _eager(module))
+    for pipeline in _pipelines(enhancer):
+        for kind in _KINDS:
+            module = getattr(pipeline, kind, None)
+            if module is not None and _is_compiled(module):
+                setattr(pipeline, kind, _eager(module))
+    enhancer.compile_mode = NONE
+
+
+def warm_up(enhancer, resolution: Optional[int] = None) -> bool:
+    """
+    Run one small enhancement so compilation happens before the first request
+
+    This is a real pipeline call with the stand-ins in place, so it also
+    checks that the pipelines accept them. Failures that the stand-ins
+    can't fall back from themselves put every module back on eager.
+
+    Returns:
+        False if the run failed and compilation was turned off
+    """
+    from PIL import Image
+    from app.config import TARGET_SIZE
+    from app.services.runner import EnhanceInputs, run_batch
+
+    size = (resolution or TARGET_SIZE,) * 2
+    item = EnhanceInputs(Image.new('RGB', size, (128, 128, 128)), Image.new('RGB', size), "warm-up", 0.15, seed=0)
+    try:
+        run_batch(enhancer, [item], prompt_fn=str)
+    except Exception as e:
+        print(f"Warning: Compile warm-up failed, switching back to eager: {e}")
+        restore_eager(enhancer)
+        return False
+    return True
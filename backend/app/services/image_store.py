@@ -0,0 +1,196 @@
+"""
+Dreamy Vision - Image Store
+Decoded uploads kept by content hash, so clients send an image once and
+refer to it by id afterwards
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+from app.services.result_cache import hash_image
+from app.utils.caching import LRUCache
+
+
+def _image_nbytes(image: Image.Image) -> int:
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+
+def _covers(image: Image.Image, kept_draft: Optional[int], draft_size: Optional[int]) -> bool:
+    """True if an image decoded with `kept_draft` has the detail a `draft_size` decode would"""
+    if kept_draft is None:
+        return True
+    if draft_size is not None and kept_draft >= draft_size:
+        return True
+    # Draft decoding stops at or above the draft size: smaller means it wasn't reduced
+    return max(image.size) < kept_draft
+
+
+class ImageStore:
+    """
+    Two-tier store of decoded images keyed by `hash_image`
+
+    Memory tier: LRU bounded by decoded size. Disk tier (optional): PNG
+    files in `disk_dir`, oldest-accessed evicted past `disk_bytes`. Entries
+    in both expire `ttl` seconds after they were last stored or read.
+
+    Originals kept in passing from inline requests (`keep`) have an LRU of
+    their own, so they never push uploads out. They are remembered with the
+    draft size they were decoded at, and aren't handed to a request that
+    needs more detail than that.
+
+    Args:
+        memory_bytes: Memory tier budget in bytes
+        disk_dir: Directory for the disk tier (None disables it)
+        disk_bytes: Disk tier budget in bytes
+        ttl: Seconds an unused image is kept
+        inline_bytes: Budget in bytes for images kept from inline requests
+    """
+
+    def __init__(self, memory_bytes: int = 256 * 1024 * 1024, disk_dir: Optional[str] = None,
+                 disk_bytes: int = 1024 * 1024 * 1024, ttl: float = 3600, inline_bytes: int = 64 * 1024 * 1024):
+        self.memory = LRUCache(max_bytes=memory_bytes, ttl=ttl, sizeof=_image_nbytes)
+        self.inline = LRUCache(max_bytes=inline_bytes, ttl=ttl, sizeof=lambda entry: _image_nbytes(entry[0]))
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self._disk_lock = threading.Lock()
+        self._disk_usage = 0
+        self.stored = 0
+        self.kept = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_usage = sum(path.stat().st_size for path in self.disk_dir.glob("*.png"))
+
+    def put(self, image: Image.Image) -> str:
+        """Store an uploaded image (decoded at the largest working size) and return its id"""
+        image_id = hash_image(image)
+        self.memory.put(image_id, image)
+        self.stored += 1
+        self._disk_put(image_id, image)
+        return image_id
+
+    def keep(self, image: Image.Image, draft_size: Optional[int]) -> str:
+        """
+        Keep an image decoded for an inline request (memory only) and return its id
+
+        Args:
+            image: Decoded image
+            draft_size: The draft size it was decoded with (None = full size)
+        """
+        image_id = hash_image(image)
+        self.inline.put(image_id, (image, draft_size))
+        self.kept += 1
+        return image_id
+
+    def get(self, image_id: str, draft_size: Optional[int] = None) -> Optional[Image.Image]:
+        """
+        The image stored under `image_id`, or None
+
+        Args:
+            image_id: Id from `put` or `keep`
+            draft_size: Draft size the caller would decode at; images kept at
+                a smaller one don't count
+        """
+        image = self.memory.get(image_id, count=False)
+        if image is not None:
+            self.hits += 1
+            # Reading an image keeps it alive for another ttl
+            self.memory.put(image_id, image)
+            return image
+        entry = self.inline.get(image_id, count=False)
+        if entry is not None and _covers(entry[0], entry[1], draft_size):
+            self.hits += 1
+            self.inline.put(image_id, entry)
+            return entry[0]
+        image = self._disk_get(image_id)
+        if image is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        self.memory.put(image_id, image)
+        return image
+
+    def _disk_path(self, image_id: str) -> Optional[Path]:
+        # Ids come from clients: only plain hex digests name a file
+        if self.disk_dir is None or not image_id.isalnum():
+            return None
+        return self.disk_dir / f"{image_id}.png"
+
+    def _disk_get(self, image_id: str) -> Optional[Image.Image]:
+        path = self._disk_path(image_id)
+        if path is None:
+            return None
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                with self._disk_lock:
+                    self._disk_usage -= path.stat().st_size
+                    path.unlink(missing_ok=True)
+                return None
+            with Image.open(path) as image:
+                image.load()
+                result = image.copy()
+            os.utime(path)  # Mark as recently used for eviction and ttl
+            return result
+        except (FileNotFoundError, OSError):
+            return None
+
+    def _disk_put(self, image_id: str, image: Image.Image):
+        path = self._disk_path(image_id)
+        if path is None:
+            return
+        if path.exists():
+            os.utime(path)
+            return
+        tmp_path = path.with_suffix(".tmp")
+        with self._disk_lock:
+            # Fast compression: these are read back soon and expire anyway
+            image.save(tmp_path, format='PNG', compress_level=1)
+            os.replace(tmp_path, path)
+            self._disk_usage += path.stat().st_size
+            if self._disk_usage > self.disk_bytes:
+                self._disk_evict()
+
+    def _disk_evict(self):
+        entries = []
+        now = time.time()
+        for path in self.disk_dir.glob("*.png"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        self._disk_usage = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._disk_usage <= self.disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self._disk_usage -= size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "stored": self.stored,
+            "kept": self.kept,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.nbytes,
+            "memory_evictions": self.memory.evictions,
+            "inline_entries": len(self.inline),
+            "inline_bytes": self.inline.nbytes,
+            "disk_bytes": self._disk_usage if self.disk_dir is not None else None,
+        }
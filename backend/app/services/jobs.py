@@ -0,0 +1,224 @@
+"""
+Dreamy Vision - Job Queue
+Runs enhancement work off the event loop on a bounded worker pool
+"""
+
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.services.run_control import RunControl, RunCancelled, abort_stats
+from app.services.metrics import Trace, metrics
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more work"""
+
+
+class JobTimeoutError(Exception):
+    """Raised when a job exceeds its time limit"""
+
+
+class Job:
+    """
+    A single unit of work tracked by the queue
+
+    The work function receives the job and can call `report()` to publish
+    progress. `control` is handed to the pipeline runner so cancellation
+    stops the denoising loop at the next step; `trace` collects its stage
+    timings.
+    """
+
+    def __init__(self, fn: Callable, args: tuple, timeout: float):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.args = args
+        self.timeout = timeout
+        self.status = QUEUED
+        self.progress = 0.0
+        self.stage: Optional[str] = None
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.details: Dict[str, Any] = {}  # Extra facts the work function wants reported
+        self.control = RunControl()
+        self.trace = Trace()
+        self._done = asyncio.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.control.cancelled
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def report(self, progress: float, stage: Optional[str] = None):
+        """Publish progress (0-1); safe to call from worker threads"""
+        self.progress = max(self.progress, min(1.0, progress))
+        if stage is not None:
+            self.stage = stage
+
+    def cancel(self, reason: str = "cancelled"):
+        """Ask the work function to stop at its next checkpoint"""
+        self.control.cancel(reason)
+
+    async def wait(self) -> Any:
+        """Wait for the job to finish and return its result (or raise its error)"""
+        await self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "stage": self.stage,
+            "error": str(self.error) if self.error is not None else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "details": dict(self.details),
+        }
+
+
+class JobQueue:
+    """
+    Bounded queue feeding a fixed pool of worker threads
+
+    Args:
+        workers: Number of jobs that may run at once
+        max_queued: Number of jobs that may wait; beyond this `submit` raises QueueFullError
+        timeout: Default per-job time limit in seconds
+        result_ttl: Seconds to keep finished jobs around for polling
+    """
+
+    def __init__(self, workers: int = 1, max_queued: int = 16, timeout: float = 300, result_ttl: float = 600):
+        self.workers = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="enhance")
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self.running = 0
+
+    def start(self):
+        """Start worker tasks on the running event loop"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self.executor.shutdown(wait=False)
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, fn: Callable, *args, timeout: Optional[float] = None) -> Job:
+        """
+        Queue `fn(job, *args)` to run on a worker thread
+
+        Returns:
+            The queued Job
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        self.start()
+        self._prune()
+        job = Job(fn, args, timeout if timeout is not None else self.timeout)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.max_queued} waiting)")
+        self._jobs[job.id] = job
+        return job
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """Submit a job and wait for its result"""
+        job = self.submit(fn, *args, timeout=timeout)
+        return await job.wait()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._execute(loop, job)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, loop: asyncio.AbstractEventLoop, job: Job):
+        if job.cancelled:
+            abort_stats.record(job.control.cancel_reason)
+            job.error = RunCancelled(job.control.cancel_reason)
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            job._done.set()
+            return
+
+        job.status = RUNNING
+        job.started_at = time.time()
+        metrics.observe("queue", job.started_at - job.created_at, [job.trace])
+        self.running += 1
+        future = loop.run_in_executor(self.executor, job.fn, job, *job.args)
+        try:
+            job.result = await asyncio.wait_for(asyncio.shield(future), timeout=job.timeout)
+            job.progress = 1.0
+            job.status = DONE
+        except asyncio.TimeoutError:
+            job.error = JobTimeoutError(f"Job exceeded {job.timeout:.0f}s time limit")
+            job.status = FAILED
+            job.cancel("timed out")
+        except RunCancelled as e:
+            job.error = e
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+        job.finished_at = time.time()
+        job._done.set()
+
+        # A timed-out thread keeps its worker slot until it actually returns,
+        # otherwise abandoned runs would pile up past the pool size
+        if not future.done():
+            try:
+                await future
+            except Exception:
+                pass
+        self.running -= 1
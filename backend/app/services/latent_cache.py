@@ -0,0 +1,130 @@
+"""
+Dreamy Vision - Original Image Cache
+Preprocessed originals and their VAE latents keyed by content hash, so
+iterating drawings against one photo skips resizing and the VAE encoder
+"""
+
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+from PIL import Image
+
+from app.services.prompt_embeddings import module_name
+from app.utils.caching import LRUCache
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, Image.Image):
+        return value.size[0] * value.size[1] * len(value.getbands())
+    return value.numel() * value.element_size()
+
+
+def supports_latents(pipeline) -> bool:
+    """True for pipelines with a VAE and image processor (not stand-ins)"""
+    return getattr(pipeline, "vae", None) is not None and getattr(pipeline, "image_processor", None) is not None
+
+
+def decode_latents(pipeline, latents) -> List[Image.Image]:
+    """What the pipeline does for output_type="pil": VAE decode, then denormalize"""
+    import torch
+    vae = pipeline.vae
+    with torch.no_grad():
+        pixels = vae.decode(latents / vae.config.scaling_factor, return_dict=False)[0]
+    return pipeline.image_processor.postprocess(pixels, output_type="pil", do_denormalize=[True] * len(pixels))
+
+
+class OriginalCache:
+    """
+    LRU cache of everything derived from one original image, bounded by bytes
+
+    Entries are keyed by `image_id`, the content hash of the decoded
+    original (see `hash_image`; the image store uses the same ids):
+    - the original resized and padded for a target size
+    - its VAE latents per run size, VAE and dtype
+
+    Latents come from the mean of the VAE posterior rather than a sample, so
+    they don't depend on the request's generator and can be shared by every
+    seed.
+
+    Args:
+        max_bytes: Budget for all entries (0 disables the cache)
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.cache = LRUCache(max_bytes=max_bytes, sizeof=_nbytes)
+        self.enabled = max_bytes > 0
+        self._lock = threading.Lock()
+        self.latent_hits = 0
+        self.latent_misses = 0
+        self.encode_seconds = 0.0
+
+    def preprocessed(self, image_id: Optional[str], target_size: int) -> Optional[Image.Image]:
+        if image_id is None:
+            return None
+        return self.cache.get(("image", image_id, target_size), count=False)
+
+    def store_preprocessed(self, image_id: Optional[str], target_size: int, image: Image.Image):
+        if image_id is not None and self.enabled:
+            self.cache.put(("image", image_id, target_size), image)
+
+    def _latent_key(self, pipeline, image_id: str, image: Image.Image) -> Hashable:
+        import torch
+        vae = pipeline.vae
+        return (
+            "latents", image_id, image.size,
+            module_name(vae), str(getattr(vae, "dtype", "")), torch.is_autocast_cpu_enabled(),
+        )
+
+    def _encode(self, pipeline, images: List[Image.Image]):
+        import torch
+        vae = pipeline.vae
+        device = getattr(pipeline, "_execution_device", None) or vae.device
+        pixels = pipeline.image_processor.preprocess(images).to(device=device, dtype=vae.dtype)
+        with torch.no_grad():
+            latents = vae.encode(pixels).latent_dist.mode()
+        return latents * vae.config.scaling_factor
+
+    def latents(self, pipeline, image_ids: List[str], images: List[Image.Image]):
+        """
+        Scaled VAE latents for `images` (batch, 4, h/8, w/8), in order
+
+        Img2img pipelines take these in place of the image and skip their own
+        VAE encode. Distinct misses are encoded in one call and cached.
+        """
+        import torch
+        keys = [self._latent_key(pipeline, image_id, image) for image_id, image in zip(image_ids, images)]
+        found = [self.cache.get(key, count=False) for key in keys]
+        # Several items may share an original (batch variants): encode it once
+        missing: Dict[Hashable, int] = {}
+        for index, (key, latents) in enumerate(zip(keys, found)):
+            if latents is None:
+                missing.setdefault(key, index)
+        if missing:
+            start = time.perf_counter()
+            encoded = self._encode(pipeline, [images[index] for index in missing.values()])
+            elapsed = time.perf_counter() - start
+            rows = {key: row.unsqueeze(0) for key, row in zip(missing, encoded)}
+            for key, row in rows.items():
+                if self.enabled:
+                    self.cache.put(key, row)
+            found = [latents if latents is not None else rows[key] for key, latents in zip(keys, found)]
+        with self._lock:
+            self.latent_hits += len(keys) - len(missing)
+            self.latent_misses += len(missing)
+            if missing:
+                self.encode_seconds += elapsed
+        return torch.cat(found)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.latent_hits + self.latent_misses
+        mean_encode = self.encode_seconds / self.latent_misses if self.latent_misses else 0.0
+        return {
+            "entries": len(self.cache),
+            "bytes": self.cache.nbytes,
+            "evictions": self.cache.evictions,
+            "latent_hits": self.latent_hits,
+            "latent_misses": self.latent_misses,
+            "latent_hit_rate": round(self.latent_hits / lookups, 3) if lookups else 0.0,
+            "seconds_saved": round(self.latent_hits * mean_encode, 3),
+        }
@@ -0,0 +1,285 @@
+"""
+Dreamy Vision - LLM Response Cache
+Memoizes prompt enhancement and hint generation, since the same short
+descriptions ("dinosaur", "dragon") come up over and over
+"""
+
+import asyncio
+import functools
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.ollama import OllamaError
+from app.utils.caching import LRUCache, SingleFlight
+
+
+def normalize_description(description: str) -> str:
+    """Case- and whitespace-insensitive form used for cache keys"""
+    return re.sub(r"\s+", " ", description).strip().lower()
+
+
+class _SharedStream:
+    """One LLM stream, read as it arrives by every caller that asked for it"""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def pump(self, source: AsyncIterator[Any]) -> List[Any]:
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except BaseException as e:
+            self.error = e
+            raise
+        finally:
+            self.done = True
+            self._notify()
+        return list(self.items)
+
+    async def __aiter__(self):
+        index = 0
+        while True:
+            # Taken before looking, so an item added meanwhile still wakes us
+            changed = self._changed
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class CachedLLMService:
+    """
+    Wraps an LLM service (as returned by `get_llm_service`) with a TTL + LRU cache
+
+    Keys combine the method, normalized description, backend and model, so
+    switching models never serves stale answers. Identical concurrent calls
+    share one LLM round trip. Only answers are cached: when the LLM can't
+    be reached, prompt enhancement falls back to the description uncached.
+    Other attributes pass through to the wrapped service.
+
+    The `a`-prefixed coroutines and `stream_hints` serve the event loop:
+    they use the service's own async methods when it has them, and a worker
+    thread otherwise. Identical calls in flight on the loop share one task
+    (and `stream_hints` callers one stream), with the same keys as the
+    blocking methods.
+
+    New answers are written to `persist_path` at most once per `save_delay`
+    seconds, on a timer thread, and on `close()`.
+
+    Args:
+        llm: Service providing enhance_prompt / generate_hints / understand_description
+        backend: Backend name ("ollama", "openai", ...)
+        ttl: Seconds before a cached answer expires
+        max_entries: LRU capacity
+        persist_path: Optional JSON file to keep the cache across restarts
+        save_delay: Seconds to gather new answers before writing the file
+    """
+
+    def __init__(self, llm, backend: str, ttl: float = 86400, max_entries: int = 1024,
+                 persist_path: Optional[str] = None, save_delay: float = 5.0):
+        self.llm = llm
+        self.backend = backend
+        self.model = getattr(llm, "model", None) or getattr(llm, "model_name", None) or ""
+        self.cache = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.save_delay = save_delay
+        self._inflight = SingleFlight()
+        self._ainflight: Dict[str, Tuple[asyncio.Future, Optional[_SharedStream]]] = {}
+        self._acoalesced = 0
+        self._persist_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._timer_lock = threading.Lock()
+        self._load()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+    def enhance_prompt(self, description: str) -> str:
+        try:
+            return self._call("enhance_prompt", description, (), lambda: self.llm.enhance_prompt(description))
+        except OllamaError as e:
+            return self._fallback_prompt(description, e)
+
+    def generate_hints(self, description: str, num_hints: int = 3) -> List[str]:
+        hints = self._call(
+            "generate_hints", description, (num_hints,),
+            lambda: self.llm.generate_hints(description, num_hints),
+        )
+        return list(hints)
+
+    def understand_description(self, description: str) -> Any:
+        return self._call(
+            "understand_description", description, (),
+            lambda: self.llm.understand_description(description),
+        )
+
+    async def aenhance_prompt(self, description: str) -> str:
+        try:
+            return await self._acall("enhance_prompt", description, ())
+        except OllamaError as e:
+            return self._fallback_prompt(description, e)
+
+    @staticmethod
+    def _fallback_prompt(description: str, error: Exception) -> str:
+        # The description alone still makes a usable prompt. Not cached, so
+        # the next request asks the LLM again.
+        print(f"Warning: Prompt enhancement failed, using the description: {error}")
+        return description
+
+    async def agenerate_hints(self, description: str, num_hints: int = 3) -> List[str]:
+        return list(await self._acall("generate_hints", description, (num_hints,)))
+
+    async def aunderstand_description(self, description: str) -> Any:
+        return await self._acall("understand_description", description, ())
+
+    async def stream_hints(self, description: str, num_hints: int = 3) -> AsyncIterator[str]:
+        """Hints one by one: all at once from cache, else as the LLM writes them"""
+        key = self._key("generate_hints", description, (num_hints,))
+        hints = self.cache.get(key)
+        if hints is None:
+            if hasattr(self.llm, "stream_hints"):
+                stream = _SharedStream()
+                fetch = lambda: stream.pump(self.llm.stream_hints(description, num_hints))
+            else:
+                stream, fetch = None, lambda: self._llm_call("generate_hints", description, (num_hints,))
+            # An identical call in flight may be a stream (read along) or a plain call (wait for it)
+            task, stream = self._join(key, fetch, stream)
+            if stream is not None:
+                async for hint in stream:
+                    yield hint
+                return
+            hints = await asyncio.shield(task)
+        for hint in hints:
+            yield hint
+
+    def _key(self, method: str, description: str, extra: tuple) -> str:
+        return "|".join([method, self.backend, self.model, normalize_description(description), *map(str, extra)])
+
+    async def _acall(self, method: str, description: str, extra: tuple) -> Any:
+        key = self._key(method, description, extra)
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        task, _ = self._join(key, lambda: self._llm_call(method, description, extra))
+        # Shielded: a caller that goes away doesn't cancel the call others wait on
+        return await asyncio.shield(task)
+
+    async def _llm_call(self, method: str, description: str, extra: tuple) -> Any:
+        async_method = getattr(self.llm, f"a{method}", None)
+        if async_method is not None:
+            return await async_method(description, *extra)
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(getattr(self.llm, method), description, *extra)
+        )
+
+    def _join(self, key: str, fetch: Callable[[], Awaitable[Any]], stream: Optional[_SharedStream] = None):
+        """The (task, stream) fetching `key` on the loop: the one in flight, or a new one"""
+        flight = self._ainflight.get(key)
+        if flight is not None:
+            self._acoalesced += 1
+            return flight
+        task = asyncio.ensure_future(self._afetch(key, fetch))
+        self._ainflight[key] = (task, stream)
+        task.add_done_callback(lambda done: self._land(key, done))
+        return task, stream
+
+    async def _afetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        self.cache.put(key, value)
+        self._save_soon()
+        return value
+
+    def _land(self, key: str, task: asyncio.Future):
+        self._ainflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Retrieved, so no warning when every caller had gone
+
+    def _call(self, method: str, description: str, extra: tuple, fn) -> Any:
+        key = self._key(method, description, extra)
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+
+        def run():
+            result = fn()
+            self.cache.put(key, result)
+            self._save_soon()
+            return result
+
+        return self._inflight.do(key, run)
+
+    def _load(self):
+        if self.persist_path is None or not self.persist_path.exists():
+            return
+        try:
+            entries = json.loads(self.persist_path.read_text())
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not load LLM cache from {self.persist_path}: {e}")
+            return
+        now = time.time()
+        for key, value, created_at in entries:
+            if self.cache.ttl is None or now - created_at <= self.cache.ttl:
+                self.cache.put(key, value, created_at=created_at)
+
+    def _save_soon(self):
+        """Write the file within save_delay seconds; answers arriving meanwhile share the write"""
+        if self.persist_path is None:
+            return
+        with self._timer_lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self._flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _flush(self):
+        with self._timer_lock:
+            self._save_timer = None
+        self._save()
+
+    def close(self):
+        """Write any unsaved answers, then close the wrapped service"""
+        with self._timer_lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self._save()
+        if hasattr(self.llm, "close"):
+            self.llm.close()
+
+    def _save(self):
+        if self.persist_path is None:
+            return
+        entries = [[key, value, created_at] for key, value, created_at in self.cache.items()]
+        with self._persist_lock:
+            try:
+                self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.persist_path.with_suffix(".tmp")
+                tmp_path.write_text(json.dumps(entries))
+                os.replace(tmp_path, self.persist_path)
+            except (OSError, TypeError) as e:
+                print(f"Warning: Could not save LLM cache to {self.persist_path}: {e}")
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats["coalesced"] = self._inflight.coalesced + self._acoalesced
+        if hasattr(self.llm, "stats"):
+            stats["client"] = self.llm.stats()
+        return stats
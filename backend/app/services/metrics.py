@@ -0,0 +1,155 @@
+"""
+Dreamy Vision - Metrics
+Per-stage latency histograms, gauges in Prometheus text format, and
+per-request stage traces for the Server-Timing header
+"""
+
+import contextlib
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+
+# Seconds; wide enough for a 1ms decode and a multi-minute CPU run
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed durations"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+
+
+class Trace:
+    """
+    Stage durations for one request
+
+    Stages that run more than once (e.g. per tile batch) add up. Rendered as
+    a Server-Timing header, which browser dev tools show as a breakdown.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        with self._lock:
+            stages = list(self.stages.items())
+        if total is not None:
+            stages.append(("total", total))
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages)
+
+
+def process_rss_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # No procfs (macOS): peak RSS is the best available
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+GaugeValue = Union[float, Dict[str, float]]
+
+
+class Metrics:
+    """
+    Stage histograms plus gauges read at scrape time
+
+    Args:
+        prefix: Metric name prefix
+    """
+
+    def __init__(self, prefix: str = "dreamy"):
+        self.prefix = prefix
+        self._stages: Dict[str, Histogram] = {}
+        self._gauges: List[Tuple[str, str, str, Callable[[], GaugeValue]]] = []
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, traces: Iterable[Optional[Trace]] = ()):
+        """Record one stage duration, and add it to each request trace given"""
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+        histogram.observe(seconds)
+        for trace in traces:
+            if trace is not None:
+                trace.add(stage, seconds)
+
+    @contextlib.contextmanager
+    def timed(self, stage: str, *traces: Optional[Trace]):
+        """Time the block as `stage` (recorded even if it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, traces)
+
+    def gauge(self, name: str, help: str, fn: Callable[[], GaugeValue], label: str = ""):
+        """
+        Register a gauge read on every scrape
+
+        `fn` returns a number, or a dict of label value -> number when
+        `label` names the label.
+        """
+        self._gauges.append((name, help, label, fn))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        name = f"{self.prefix}_stage_seconds"
+        lines.append(f"# HELP {name} Time spent per pipeline stage")
+        lines.append(f"# TYPE {name} histogram")
+        with self._lock:
+            stages = sorted(self._stages.items())
+        for stage, histogram in stages:
+            with histogram._lock:
+                counts, count, total = list(histogram.counts), histogram.count, histogram.sum
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {bucket_count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        for gauge_name, help, label, fn in self._gauges:
+            try:
+                value = fn()
+            except Exception as e:
+                print(f"Warning: Metric {gauge_name} failed: {e}")
+                continue
+            full_name = f"{self.prefix}_{gauge_name}"
+            lines.append(f"# HELP {full_name} {help}")
+            lines.append(f"# TYPE {full_name} gauge")
+            if isinstance(value, dict):
+                for label_value, number in sorted(value.items()):
+                    lines.append(f'{full_name}{{{label}="{label_value}"}} {float(number):g}')
+            else:
+                lines.append(f"{full_name} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry
+metrics = Metrics()
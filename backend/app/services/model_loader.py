@@ -0,0 +1,166 @@
+"""
+Dreamy Vision - Model Loader
+Loads the diffusion pipelines and LLM once, optionally in the background
+at startup, and reports per-component readiness
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+DISABLED = "disabled"
+
+
+class ComponentState:
+    """Load state and timing for one component"""
+
+    def __init__(self):
+        self.status = PENDING
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def start(self):
+        self.status = LOADING
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.finished_at = time.time()
+        self.error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        seconds = None
+        if self.started_at is not None:
+            seconds = round((self.finished_at or time.time()) - self.started_at, 2)
+        return {"status": self.status, "seconds": seconds, "error": self.error}
+
+
+class ModelLoader:
+    """
+    Single point of access to the enhancer and LLM service
+
+    Each resource is built at most once: callers that arrive while a load is
+    in progress wait for it instead of starting a second one.
+
+    Args:
+        enhancer_factory: Builds the ImageEnhancer (loads img2img and inpaint pipelines)
+        llm_factory: Builds the LLM service
+    """
+
+    def __init__(self, enhancer_factory: Callable[[], Any], llm_factory: Callable[[], Any]):
+        self.enhancer_factory = enhancer_factory
+        self.llm_factory = llm_factory
+        self.enhancer = None
+        self.llm = None
+        self.components = {
+            "img2img": ComponentState(),
+            "inpaint": ComponentState(),
+            "llm": ComponentState(),
+        }
+        self._enhancer_lock = threading.Lock()
+        self._llm_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """True once everything needed to serve /enhance is loaded"""
+        return self.components["img2img"].status == READY and self.components["llm"].status == READY
+
+    def get_enhancer(self):
+        if self.enhancer is None:
+            with self._enhancer_lock:
+                if self.enhancer is None:
+                    self._load_enhancer()
+        return self.enhancer
+
+    def get_llm(self):
+        if self.llm is None:
+            with self._llm_lock:
+                if self.llm is None:
+                    self._load_llm()
+        return self.llm
+
+    def provide(self, enhancer: Any = None, llm: Any = None):
+        """Install already-built instances (benchmarks, custom setups)"""
+        if enhancer is not None:
+            self.enhancer = enhancer
+            self._record_pipelines(enhancer)
+        if llm is not None:
+            self.llm = llm
+            self.components["llm"].start()
+            self.components["llm"].finish(READY)
+
+    def preload(self) -> threading.Thread:
+        """Start loading everything on background threads; returns immediately"""
+        threads = [
+            threading.Thread(target=self._preload_one, args=(self.get_llm,), name="preload-llm", daemon=True),
+            threading.Thread(target=self._preload_one, args=(self.get_enhancer,), name="preload-enhancer", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        return threads[-1]
+
+    def _preload_one(self, load: Callable[[], Any]):
+        try:
+            load()
+        except Exception as e:
+            # Already recorded in the component state; requests will retry the load
+            print(f"Warning: Background model load failed: {e}")
+
+    def _load_enhancer(self):
+        img2img, inpaint = self.components["img2img"], self.components["inpaint"]
+        # Both pipelines are built inside the ImageEnhancer constructor
+        img2img.start()
+        inpaint.start()
+        try:
+            enhancer = self.enhancer_factory()
+        except Exception as e:
+            img2img.finish(FAILED, str(e))
+            inpaint.finish(FAILED, str(e))
+            raise
+        self._record_pipelines(enhancer)
+        self.enhancer = enhancer
+
+    def _record_pipelines(self, enhancer):
+        img2img, inpaint = self.components["img2img"], self.components["inpaint"]
+        if img2img.started_at is None:
+            img2img.start()
+            inpaint.start()
+        if hasattr(enhancer, "get_pipeline"):
+            # Registry-backed: the components are loaded and variants are built on first use
+            img2img.finish(READY)
+            inpaint.finish(READY if enhancer.use_inpainting else DISABLED)
+            return
+        if getattr(enhancer, "pipeline", None) is not None:
+            img2img.finish(READY)
+        else:
+            img2img.finish(FAILED, "Img2Img pipeline not loaded")
+        if getattr(enhancer, "inpaint_pipeline", None) is not None:
+            inpaint.finish(READY)
+        elif getattr(enhancer, "use_inpainting", False):
+            inpaint.finish(FAILED, "Inpaint pipeline not loaded")
+        else:
+            inpaint.finish(DISABLED)
+
+    def _load_llm(self):
+        state = self.components["llm"]
+        state.start()
+        try:
+            self.llm = self.llm_factory()
+        except Exception as e:
+            state.finish(FAILED, str(e))
+            raise
+        state.finish(READY)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "components": {name: state.to_dict() for name, state in self.components.items()},
+        }
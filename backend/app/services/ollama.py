@@ -0,0 +1,311 @@
+"""
+Dreamy Vision - Ollama Client
+Async Ollama client on one pooled HTTP connection, with a concurrency
+limit, timeouts, retries and streamed generation
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.services.metrics import metrics
+
+
+# Ollama answers 503 while a model is loading and 429 when overloaded
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+ENHANCE_SYSTEM = (
+    "You turn a short description of what someone sees in a pattern into a "
+    "Stable Diffusion prompt. Reply with the prompt only: one line of "
+    "comma-separated visual details, at most 40 words."
+)
+HINTS_SYSTEM = (
+    "You suggest what people might see in abstract patterns like clouds, "
+    "wood grain or stains. Reply with one suggestion per line, a few words "
+    "each, with no numbering and nothing else."
+)
+UNDERSTAND_SYSTEM = (
+    "You parse a description of what someone sees in a pattern. Reply with a "
+    'JSON object with keys "subject", "attributes" (list), "setting" and "mood".'
+)
+
+_LIST_MARKER = re.compile(r"^\s*(?:\d+[.):]|[-*•])\s*")
+
+
+class OllamaError(RuntimeError):
+    """Raised when Ollama can't be reached or keeps failing"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def clean_line(line: str) -> str:
+    """A generated line without list markers or wrapping quotes"""
+    return _LIST_MARKER.sub("", line).strip().strip('"').strip()
+
+
+class OllamaClient:
+    """
+    Minimal async client for Ollama's /api/generate
+
+    All requests share one httpx connection pool, so calls reuse
+    keep-alive connections instead of opening one each. At most
+    `max_concurrency` generations run at once; the rest wait their turn.
+    Connection errors and retryable statuses are retried with full-jitter
+    exponential backoff (streams only until their first chunk arrives).
+
+    Must be used from a single event loop.
+
+    Args:
+        base_url: Ollama server, e.g. http://localhost:11434
+        model: Model name
+        max_concurrency: Generations in flight at once (also the pool size)
+        timeout: Seconds to wait for a response (per chunk when streaming)
+        connect_timeout: Seconds to wait for a connection
+        retries: Extra attempts after a failed one
+        backoff: Base delay in seconds; attempt n waits up to backoff * 2**n
+        transport: httpx transport to use instead of the network (tests)
+    """
+
+    def __init__(self, base_url: str, model: str, max_concurrency: int = 4, timeout: float = 60.0,
+                 connect_timeout: float = 5.0, retries: int = 2, backoff: float = 0.5, transport=None):
+        import httpx
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            transport=transport,
+        )
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created on first use, inside the loop that uses it
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _payload(self, prompt: str, system: Optional[str], stream: bool, json_format: bool,
+                 options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        payload = {"model": self.model, "prompt": prompt, "stream": stream}
+        if system:
+            payload["system"] = system
+        if json_format:
+            payload["format"] = "json"
+        if options:
+            payload["options"] = options
+        return payload
+
+    async def _retrying(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        import httpx
+        for number in range(self.retries + 1):
+            try:
+                return await attempt()
+            except (httpx.TransportError, OllamaError) as e:
+                retryable = isinstance(e, httpx.TransportError) or e.retryable
+                if not retryable or number == self.retries:
+                    self.failed += 1
+                    if isinstance(e, OllamaError):
+                        raise
+                    raise OllamaError(f"Ollama request failed: {e!r}") from e
+                self.retried += 1
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** number))
+
+    @staticmethod
+    def _check(response):
+        if response.status_code != 200:
+            raise OllamaError(
+                f"Ollama returned {response.status_code}",
+                retryable=response.status_code in RETRY_STATUSES,
+            )
+
+    async def generate(self, prompt: str, system: Optional[str] = None, json_format: bool = False,
+                       options: Optional[Dict[str, Any]] = None) -> str:
+        """The whole response text for `prompt`"""
+        payload = self._payload(prompt, system, False, json_format, options)
+
+        async def attempt():
+            response = await self.http.post("/api/generate", json=payload)
+            self._check(response)
+            return response.json().get("response", "")
+
+        async with self.semaphore:
+            self.requests += 1
+            with metrics.timed("ollama"):
+                return await self._retrying(attempt)
+
+    async def stream(self, prompt: str, system: Optional[str] = None,
+                     options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Response text chunks for `prompt` as Ollama produces them"""
+        payload = self._payload(prompt, system, True, False, options)
+        async with self.semaphore:
+            self.requests += 1
+            start = time.perf_counter()
+
+            async def attempt():
+                response = await self.http.send(
+                    self.http.build_request("POST", "/api/generate", json=payload), stream=True,
+                )
+                if response.status_code != 200:
+                    await response.aclose()
+                    self._check(response)
+                return response
+
+            response = await self._retrying(attempt)
+            try:
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise OllamaError(f"Ollama error: {chunk['error']}")
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+            finally:
+                await response.aclose()
+                metrics.observe("ollama", time.perf_counter() - start)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "retried": self.retried, "failed": self.failed}
+
+
+class OllamaLLMService:
+    """
+    LLM service (enhance_prompt / generate_hints / understand_description)
+    backed by OllamaClient
+
+    The client lives on its own event loop thread, so the blocking methods
+    work from job worker threads and the `a`-prefixed coroutines from the
+    server's event loop, all sharing one connection pool.
+    `stream_hints` yields hints one by one as the model writes them.
+    Failures raise OllamaError; falling back is up to the caller, so a
+    fallback answer is never cached as if the model had given it.
+
+    Args:
+        base_url: Ollama server
+        model: Model name
+        **client_options: Passed to OllamaClient
+    """
+
+    def __init__(self, base_url: str, model: str, **client_options):
+        self.model = model
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ollama-client", daemon=True)
+        self._thread.start()
+        self.client = OllamaClient(base_url, model, **client_options)
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _on_client_loop(self, coro):
+        return await asyncio.wrap_future(self._submit(coro))
+
+    async def _enhance_prompt(self, description: str) -> str:
+        text = await self.client.generate(description, system=ENHANCE_SYSTEM)
+        lines = [clean_line(line) for line in text.splitlines()]
+        return next((line for line in lines if line), description)
+
+    async def _stream_hints(self, description: str, num_hints: int) -> AsyncIterator[str]:
+        prompt = f'List {num_hints} different things someone might see in a pattern described as "{description}".'
+        buffer, count = "", 0
+        stream = self.client.stream(prompt, system=HINTS_SYSTEM)
+        try:
+            async for chunk in stream:
+                buffer += chunk
+                *lines, buffer = buffer.split("\n")
+                for line in lines:
+                    hint = clean_line(line)
+                    if hint:
+                        yield hint
+                        count += 1
+                        if count == num_hints:
+                            return
+        finally:
+            # Stop the generation (and free its slot) once we have enough
+            await stream.aclose()
+        hint = clean_line(buffer)
+        if hint and count < num_hints:
+            yield hint
+
+    async def _generate_hints(self, description: str, num_hints: int) -> List[str]:
+        return [hint async for hint in self._stream_hints(description, num_hints)]
+
+    async def _understand_description(self, description: str) -> Dict[str, Any]:
+        text = await self.client.generate(description, system=UNDERSTAND_SYSTEM, json_format=True)
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            parsed = None
+        return parsed if isinstance(parsed, dict) else {"subject": description}
+
+    # Blocking interface (job worker threads)
+
+    def enhance_prompt(self, description: str) -> str:
+        return self._submit(self._enhance_prompt(description)).result()
+
+    def generate_hints(self, description: str, num_hints: int = 3) -> List[str]:
+        return self._submit(self._generate_hints(description, num_hints)).result()
+
+    def understand_description(self, description: str) -> Dict[str, Any]:
+        return self._submit(self._understand_description(description)).result()
+
+    # Async interface (the server's event loop)
+
+    async def aenhance_prompt(self, description: str) -> str:
+        return await self._on_client_loop(self._enhance_prompt(description))
+
+    async def agenerate_hints(self, description: str, num_hints: int = 3) -> List[str]:
+        return await self._on_client_loop(self._generate_hints(description, num_hints))
+
+    async def aunderstand_description(self, description: str) -> Dict[str, Any]:
+        return await self._on_client_loop(self._understand_description(description))
+
+    async def stream_hints(self, description: str, num_hints: int = 3) -> AsyncIterator[str]:
+        """Hints as they are generated; stops generating if the caller stops reading"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            try:
+                async for hint in self._stream_hints(description, num_hints):
+                    loop.call_soon_threadsafe(queue.put_nowait, (hint, None))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, (None, e))
+            else:
+                loop.call_soon_threadsafe(queue.put_nowait, (None, None))
+
+        future = self._submit(produce())
+        try:
+            while True:
+                hint, error = await queue.get()
+                if error is not None:
+                    raise error
+                if hint is None:
+                    return
+                yield hint
+        finally:
+            future.cancel()
+
+    def close(self):
+        self._submit(self.client.aclose()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.client.stats()
@@ -0,0 +1,243 @@
+"""
+Dreamy Vision - Pipeline Registry
+Loads each model component once and builds every pipeline variant from the
+shared modules, so img2img and inpaint don't hold duplicate weights
+"""
+
+import gc
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+IMG2IMG = "img2img"   # ControlNet img2img (global enhancement)
+INPAINT = "inpaint"   # ControlNet inpaint (only where the user drew)
+PLAIN = "plain"       # img2img without ControlNet (description only)
+VARIANTS = (IMG2IMG, INPAINT, PLAIN)
+
+_USES_CONTROLNET = {IMG2IMG, INPAINT}
+
+
+def module_bytes(module) -> int:
+    """Parameter and buffer bytes of a torch module (0 for anything else)"""
+    module = getattr(module, "eager", module)  # Compiled stand-ins
+    if not hasattr(module, "parameters"):
+        return 0
+    total = sum(p.numel() * p.element_size() for p in module.parameters())
+    return total + sum(b.numel() * b.element_size() for b in module.buffers())
+
+
+class PipelineRegistry:
+    """
+    Shared components plus lazily built pipeline variants
+
+    The VAE, text encoder, tokenizer and UNet are loaded once; the ControlNet
+    is loaded the first time a variant needs it. Variants are thin wrappers
+    over the same modules (each with its own scheduler, since schedulers
+    keep per-run state), so building or switching one costs next to nothing.
+    Since variants share everything else, the ControlNet is the only
+    component a memory limit can free: when over the limit, the ControlNet
+    variants are dropped along with it unless the variant in use needs it.
+    Preparers (precision, compilation) are re-run on anything loaded again.
+
+    Args:
+        sd_model_id: Stable Diffusion model
+        controlnet_model_id: ControlNet model
+        device: torch device string
+        memory_limit: Resident component bytes to stay under (0 = no limit)
+    """
+
+    def __init__(self, sd_model_id: str, controlnet_model_id: str, device: str = "cpu", memory_limit: int = 0):
+        self.sd_model_id = sd_model_id
+        self.controlnet_model_id = controlnet_model_id
+        self.device = device
+        self.memory_limit = memory_limit
+        self.components: Dict[str, Any] = {}
+        self._variants: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._last_variant: Optional[str] = None
+        self._preparers: "OrderedDict[str, Callable[[str, Any], Any]]" = OrderedDict()
+        self.builds = 0
+        self.switches = 0
+        self.unloads = 0
+
+    @property
+    def dtype(self):
+        import torch
+        # fp16 only where it's fast; CPU and MPS stay fp32
+        return torch.float16 if self.device == "cuda" else torch.float32
+
+    def _load_base(self):
+        from diffusers import StableDiffusionImg2ImgPipeline
+        base = StableDiffusionImg2ImgPipeline.from_pretrained(
+            self.sd_model_id,
+            torch_dtype=self.dtype,
+            safety_checker=None,
+            requires_safety_checker=False,
+        ).to(self.device)
+        base.set_progress_bar_config(disable=True)
+        self.components.update(base.components)
+        # The plain img2img variant is the base pipeline itself
+        self._variants[PLAIN] = base
+        for name in base.components:
+            self._prepare(name, self._preparers.values())
+
+    def _load_controlnet(self):
+        from diffusers import ControlNetModel
+        self.components["controlnet"] = ControlNetModel.from_pretrained(
+            self.controlnet_model_id, torch_dtype=self.dtype
+        ).to(self.device)
+        self._prepare("controlnet", self._preparers.values())
+
+    def _prepare(self, name: str, preparers):
+        module = self.components.get(name)
+        if module is None:
+            return
+        for prepare in list(preparers):
+            prepared = prepare(name, module)
+            if prepared is not module:
+                self.replace(module, prepared)
+                module = prepared
+
+    def set_preparer(self, key: str, prepare: Optional[Callable[[str, Any], Any]]):
+        """
+        Run `prepare(name, module)` on every loaded component, and on each one
+        loaded later (e.g. the ControlNet after an unload)
+
+        It converts the module in place or returns a stand-in to use instead.
+        Preparers run in the order they were set; None removes `key`'s.
+        """
+        with self._lock:
+            self._preparers.pop(key, None)
+            if prepare is None:
+                return
+            self._preparers[key] = prepare
+            for name in list(self.components):
+                self._prepare(name, [prepare])
+
+    def _build(self, variant: str):
+        if "unet" not in self.components:
+            self._load_base()
+            if variant == PLAIN:
+                return self._variants[PLAIN]
+        if variant == PLAIN:
+            # Dropped under the memory limit earlier: rebuild from the shared modules
+            from diffusers import StableDiffusionImg2ImgPipeline as cls
+        else:
+            if "controlnet" not in self.components:
+                self._load_controlnet()
+            if variant == INPAINT:
+                from diffusers import StableDiffusionControlNetInpaintPipeline as cls
+            else:
+                from diffusers import StableDiffusionControlNetImg2ImgPipeline as cls
+
+        base_scheduler = self.components["scheduler"]
+        kwargs = dict(
+            vae=self.components["vae"],
+            text_encoder=self.components["text_encoder"],
+            tokenizer=self.components["tokenizer"],
+            unet=self.components["unet"],
+            scheduler=type(base_scheduler).from_config(base_scheduler.config),
+            safety_checker=None,
+            feature_extractor=self.components.get("feature_extractor"),
+            requires_safety_checker=False,
+        )
+        if variant in _USES_CONTROLNET:
+            kwargs["controlnet"] = self.components["controlnet"]
+        pipeline = cls(**kwargs)
+        pipeline.set_progress_bar_config(disable=True)
+        return pipeline
+
+    def get(self, variant: str):
+        """The pipeline for `variant`, building it (and loading components) on first use"""
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown pipeline variant: {variant} (expected one of {', '.join(VARIANTS)})")
+        with self._lock:
+            pipeline = self._variants.get(variant)
+            if pipeline is None:
+                pipeline = self._build(variant)
+                self._variants[variant] = pipeline
+                self.builds += 1
+            self._variants.move_to_end(variant)
+            if self._last_variant is not None and variant != self._last_variant:
+                self.switches += 1
+            self._last_variant = variant
+            self._enforce_limit(keep=variant)
+            return pipeline
+
+    def peek(self, variant: str):
+        """The pipeline for `variant` if it is built, else None (never builds or counts a use)"""
+        return self._variants.get(variant)
+
+    def loaded(self, variant: str) -> bool:
+        return variant in self._variants
+
+    def replace(self, old, new):
+        """Swap a shared module everywhere (e.g. for a compiled stand-in)"""
+        with self._lock:
+            for name, module in list(self.components.items()):
+                if module is old:
+                    self.components[name] = new
+            for pipeline in self._variants.values():
+                for name in ("unet", "controlnet", "vae"):
+                    if getattr(pipeline, name, None) is old:
+                        setattr(pipeline, name, new)
+
+    @property
+    def resident_bytes(self) -> int:
+        seen, total = [], 0
+        for module in self.components.values():
+            if all(module is not other for other in seen):
+                seen.append(module)
+                total += module_bytes(module)
+        return total
+
+    def _enforce_limit(self, keep: str):
+        if not self.memory_limit or self.resident_bytes <= self.memory_limit:
+            return
+        # Dropping any other variant frees nothing: they all share the same modules
+        if keep in _USES_CONTROLNET or "controlnet" not in self.components:
+            return
+        for name in [name for name in self._variants if name in _USES_CONTROLNET]:
+            del self._variants[name]
+            self.unloads += 1
+        del self.components["controlnet"]
+        gc.collect()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "variants": list(self._variants),
+            "components": sorted(self.components),
+            "resident_mb": round(self.resident_bytes / (1024 * 1024), 1),
+            "memory_limit_mb": round(self.memory_limit / (1024 * 1024), 1) if self.memory_limit else None,
+            "builds": self.builds,
+            "switches": self.switches,
+            "unloads": self.unloads,
+        }
+
+
+class RegistryEnhancer:
+    """
+    ImageEnhancer stand-in backed by a PipelineRegistry
+
+    Exposes the attributes the runner uses (`pipeline`, `inpaint_pipeline`,
+    `use_inpainting`) plus `get_pipeline(variant)` for per-request variants.
+    `pipeline` and `inpaint_pipeline` only look: they are None until the
+    variant is built, and reading them counts no use or switch. The runner
+    never falls back to `enhance()`, so there isn't one.
+    """
+
+    def __init__(self, registry: PipelineRegistry, use_inpainting: bool = True):
+        self.registry = registry
+        self.use_inpainting = use_inpainting
+
+    @property
+    def pipeline(self):
+        return self.registry.peek(IMG2IMG)
+
+    @property
+    def inpaint_pipeline(self):
+        return self.registry.peek(INPAINT) if self.use_inpainting else None
+
+    def get_pipeline(self, variant: str):
+        return self.registry.get(variant)
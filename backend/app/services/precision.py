@@ -0,0 +1,114 @@
+"""
+Dreamy Vision - Inference Precision
+Reduced-precision and quantized execution for the diffusion pipelines on CPU
+"""
+
+import contextlib
+from typing import List
+
+from app.config import DEVICE
+
+
+FP32 = "fp32"
+BF16 = "bf16"    # bfloat16 autocast (CPUs with AVX512-BF16 / AMX)
+INT8 = "int8"    # Dynamic int8 quantization of UNet and ControlNet Linear layers
+PRECISIONS = (FP32, BF16, INT8)
+
+
+def cpu_supports_bf16() -> bool:
+    """True if this CPU has native bfloat16 matmuls (otherwise bf16 is emulated and slower)"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def _pipelines(enhancer) -> List:
+    pipelines = []
+    for name in ("pipeline", "inpaint_pipeline"):
+        pipeline = getattr(enhancer, name, None)
+        if pipeline is not None and all(pipeline is not other for other in pipelines):
+            pipelines.append(pipeline)
+    return pipelines
+
+
+def _modules(pipelines, names) -> List:
+    """Distinct submodules across pipelines (img2img and inpaint may share them)"""
+    modules = []
+    for pipeline in pipelines:
+        for name in names:
+            module = getattr(pipeline, name, None)
+            if module is not None and all(module is not other for other in modules):
+                modules.append(module)
+    return modules
+
+
+def _convert(name: str, module, precision: str, channels_last: bool):
+    """Convert one pipeline module in place for `precision` (and channels-last)"""
+    import torch
+    if precision == INT8 and name in ("unet", "controlnet"):
+        # In place, so pipelines sharing the module see it and fp32 copies don't linger
+        torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    if channels_last and name in ("unet", "controlnet", "vae"):
+        module.to(memory_format=torch.channels_last)
+    return module
+
+
+def apply_precision(enhancer, precision: str = FP32, channels_last: bool = False) -> str:
+    """
+    Convert a loaded enhancer's pipelines for the requested precision
+
+    On CPU, fp16 weights (as downloaded for GPUs) are first widened to fp32,
+    since fp16 matmuls there are slow or unsupported. Modes that the device
+    can't run well fall back to fp32 with a warning.
+
+    Args:
+        enhancer: Loaded ImageEnhancer
+        precision: FP32, BF16 or INT8
+        channels_last: Also switch UNet, ControlNet and VAE to channels-last memory format
+
+    Returns:
+        The precision actually in effect (also stored as `enhancer.precision`)
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+    registry = getattr(enhancer, "registry", None)
+    pipelines = _pipelines(enhancer) if registry is None else []
+    if registry is None and (not pipelines or not all(hasattr(pipeline, "unet") for pipeline in pipelines)):
+        enhancer.precision = FP32
+        return FP32
+
+    import torch
+
+    if DEVICE == "cpu":
+        for pipeline in pipelines:
+            if pipeline.unet.dtype == torch.float16:
+                pipeline.to(torch_dtype=torch.float32)
+
+    if precision == BF16 and (DEVICE != "cpu" or not cpu_supports_bf16()):
+        print("Warning: bf16 autocast needs a CPU with AVX512-BF16 or AMX, using fp32")
+        precision = FP32
+    if precision == INT8 and DEVICE != "cpu":
+        print(f"Warning: Dynamic int8 quantization only runs on CPU, not {DEVICE}; using fp32")
+        precision = FP32
+
+    if registry is not None:
+        # Also converts components the registry loads again later (e.g. the ControlNet)
+        registry.set_preparer("precision", lambda name, module: _convert(name, module, precision, channels_last))
+    else:
+        for name in ("unet", "controlnet", "vae"):
+            for module in _modules(pipelines, (name,)):
+                _convert(name, module, precision, channels_last)
+
+    enhancer.precision = precision
+    return precision
+
+
+def inference_context(enhancer):
+    """Context manager to run the enhancer's pipelines under (bf16 autocast when enabled)"""
+    if getattr(enhancer, "precision", FP32) != BF16:
+        return contextlib.nullcontext()
+    import torch
+    return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
@@ -0,0 +1,148 @@
+"""
+Dreamy Vision - Prompt Embedding Cache
+CLIP text embeddings cached by prompt, so repeated descriptions and the
+constant negative prompt skip the text encoder
+"""
+
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+from app.utils.caching import LRUCache
+
+
+def _tensor_nbytes(tensor) -> int:
+    return tensor.numel() * tensor.element_size()
+
+
+def module_name(module) -> str:
+    # Tokenizers keep it on the object, models on their config
+    name = getattr(module, "name_or_path", None)
+    if not name:
+        config = getattr(module, "config", None)
+        name = getattr(config, "_name_or_path", None) if config is not None else None
+    return name or type(module).__name__
+
+
+def supports_embeddings(pipeline) -> bool:
+    """True for pipelines with a CLIP tokenizer and text encoder (not stand-ins)"""
+    return getattr(pipeline, "tokenizer", None) is not None and getattr(pipeline, "text_encoder", None) is not None
+
+
+class PromptEmbeddings:
+    """
+    LRU cache of per-prompt text encoder outputs, bounded by tensor bytes
+
+    Keys cover the prompt, the tokenizer and text encoder ids, their dtype
+    and whether bf16 autocast is on, so a different model or precision never
+    sees stale embeddings. Pinned prompts (the negative prompt) are kept
+    outside the LRU and never evicted.
+
+    Args:
+        max_bytes: Budget for cached embeddings (0 disables caching; pinned
+            prompts are still kept)
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.cache = LRUCache(max_bytes=max_bytes, sizeof=_tensor_nbytes)
+        self.enabled = max_bytes > 0
+        self._pinned: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def _key(self, pipeline, prompt: str) -> Hashable:
+        import torch
+        text_encoder = pipeline.text_encoder
+        return (
+            module_name(pipeline.tokenizer),
+            module_name(text_encoder),
+            str(getattr(text_encoder, "dtype", "")),
+            torch.is_autocast_cpu_enabled(),
+            prompt,
+        )
+
+    def _encode(self, pipeline, prompts: List[str]):
+        """The same text encoding diffusers does for prompts and negative prompts"""
+        import torch
+        tokenizer, text_encoder = pipeline.tokenizer, pipeline.text_encoder
+        device = getattr(pipeline, "_execution_device", None) or text_encoder.device
+        inputs = tokenizer(
+            prompts,
+            padding="max_length",
+            max_length=tokenizer.model_max_length,
+            truncation=True,
+            return_tensors="pt",
+        )
+        attention_mask = None
+        if getattr(text_encoder.config, "use_attention_mask", False):
+            attention_mask = inputs.attention_mask.to(device)
+        with torch.no_grad():
+            embeds = text_encoder(inputs.input_ids.to(device), attention_mask=attention_mask)[0]
+        return embeds.to(dtype=text_encoder.dtype, device=device)
+
+    def _mean_encode_seconds(self) -> float:
+        return self.encode_seconds / self.misses if self.misses else 0.0
+
+    def embed(self, pipeline, prompts: List[str]):
+        """
+        Embeddings for `prompts`, stacked in order (batch, tokens, dim)
+
+        Misses are encoded together in one text encoder call and cached.
+        """
+        import torch
+        keys = [self._key(pipeline, prompt) for prompt in prompts]
+        found: List[Optional[Any]] = []
+        for key in keys:
+            embeds = self._pinned.get(key)
+            if embeds is None and self.enabled:
+                embeds = self.cache.get(key, count=False)
+            found.append(embeds)
+
+        missing = sorted({prompt for prompt, embeds in zip(prompts, found) if embeds is None})
+        encoded = {}
+        if missing:
+            start = time.perf_counter()
+            embeds = self._encode(pipeline, missing)
+            elapsed = time.perf_counter() - start
+            for prompt, row in zip(missing, embeds):
+                encoded[prompt] = row.unsqueeze(0)
+                if self.enabled:
+                    self.cache.put(self._key(pipeline, prompt), encoded[prompt])
+
+        with self._lock:
+            if missing:
+                self.misses += len(missing)
+                self.encode_seconds += elapsed
+            hits = sum(1 for embeds in found if embeds is not None)
+            self.hits += hits
+            self.saved_seconds += hits * self._mean_encode_seconds()
+
+        return torch.cat([
+            embeds if embeds is not None else encoded[prompt]
+            for prompt, embeds in zip(prompts, found)
+        ])
+
+    def precompute(self, pipeline, prompt: str):
+        """Encode `prompt` now and keep it for good (e.g. the constant negative prompt)"""
+        if not supports_embeddings(pipeline):
+            return
+        key = self._key(pipeline, prompt)
+        if key not in self._pinned:
+            self._pinned[key] = self._encode(pipeline, [prompt])
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self.cache),
+            "bytes": self.cache.nbytes,
+            "evictions": self.cache.evictions,
+            "pinned": len(self._pinned),
+            "mean_encode_ms": round(self._mean_encode_seconds() * 1000, 2),
+            "seconds_saved": round(self.saved_seconds, 3),
+        }
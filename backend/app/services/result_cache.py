@@ -0,0 +1,213 @@
+"""
+Dreamy Vision - Result Cache
+Content-addressed cache of enhanced images, so repeat submissions
+(retries, shared example images) skip diffusion entirely
+"""
+
+import hashlib
+import io
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from PIL import Image
+
+from app.config import SD_MODEL_ID, CONTROLNET_MODEL_ID
+from app.services.run_control import RunControl, RunCancelled, SharedControl
+from app.utils.caching import LRUCache, SingleFlight
+
+
+def hash_image(image: Image.Image) -> str:
+    """Hash decoded pixels, so re-encoded copies of the same image match"""
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def result_key(
+    original_hash: str,
+    drawing_hash: str,
+    description: str,
+    enhancement_strength: float,
+    num_inference_steps: int,
+    guidance_scale: float,
+    seed: Optional[int],
+    scheduler: str = "default",
+    resolution: int = 512,
+    mode: str = "full",
+    variant: str = "default",
+) -> str:
+    """Build the cache key for one enhancement"""
+    parts = [
+        original_hash,
+        drawing_hash,
+        description.strip(),
+        f"{enhancement_strength:.4f}",
+        SD_MODEL_ID,
+        CONTROLNET_MODEL_ID,
+        str(num_inference_steps),
+        f"{guidance_scale:.4f}",
+        str(seed),
+        scheduler,
+        str(resolution),
+        mode,
+        variant,
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+def _image_nbytes(image: Image.Image) -> int:
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+
+class ResultCache:
+    """
+    Two-tier cache of enhanced images
+
+    Memory tier: LRU of PIL Images bounded by decoded size.
+    Disk tier (optional): PNG files in `disk_dir`, oldest-accessed evicted
+    once the directory exceeds `disk_bytes`.
+    Identical requests that arrive while the first is still running wait
+    for it instead of starting their own run (see get_or_compute).
+
+    Args:
+        memory_bytes: Memory tier budget in bytes (0 disables it)
+        disk_dir: Directory for the disk tier (None disables it)
+        disk_bytes: Disk tier budget in bytes
+    """
+
+    def __init__(self, memory_bytes: int = 128 * 1024 * 1024, disk_dir: Optional[str] = None, disk_bytes: int = 1024 * 1024 * 1024):
+        self.memory = LRUCache(max_bytes=memory_bytes, sizeof=_image_nbytes)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_bytes = disk_bytes
+        self._disk_lock = threading.Lock()
+        self._disk_usage = 0
+        self._inflight = SingleFlight()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_usage = sum(path.stat().st_size for path in self.disk_dir.glob("*.png"))
+
+    def get(self, key: str) -> Optional[Image.Image]:
+        image = self.memory.get(key, count=False)
+        if image is not None:
+            self.hits += 1
+            return image
+        image = self._disk_get(key)
+        if image is not None:
+            self.disk_hits += 1
+            self.memory.put(key, image)
+        return image
+
+    def put(self, key: str, image: Image.Image):
+        self.memory.put(key, image)
+        self._disk_put(key, image)
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[Optional[RunControl]], Image.Image],
+        control: Optional[RunControl] = None,
+    ) -> Image.Image:
+        """
+        Return the cached result for `key`, computing it at most once at a time
+
+        `compute` is called with the control to run under. With `control`,
+        identical requests share one SharedControl: each of them sees the
+        run's steps and can stop waiting on its own deadline or cancel, and
+        the run itself stops only once all of them have. If the run is
+        abandoned by the others, a caller that is still live runs it again.
+        Without `control`, `compute` gets None.
+        """
+        image = self.get(key)
+        if image is not None:
+            return image
+
+        def run(shared: Optional[RunControl]):
+            # Another caller may have filled the cache while we waited for the lock
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            self.misses += 1
+            result = compute(shared)
+            self.put(key, result)
+            return result
+
+        if control is None:
+            return self._inflight.do(key, lambda: run(None))
+        while True:
+            try:
+                return self._inflight.do(
+                    key,
+                    run,
+                    join=lambda shared: (shared or SharedControl()).join(control),
+                    check=control.check,
+                )
+            except RunCancelled:
+                control.check()
+                # Everyone else gave up on that run before it finished; ours is still wanted
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.png"
+
+    def _disk_get(self, key: str) -> Optional[Image.Image]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with Image.open(path) as image:
+                image.load()
+                result = image.copy()
+            os.utime(path)  # Mark as recently used for eviction
+            return result
+        except (FileNotFoundError, OSError):
+            return None
+
+    def _disk_put(self, key: str, image: Image.Image):
+        if self.disk_dir is None:
+            return
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        data = buffer.getvalue()
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(".tmp")
+        with self._disk_lock:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+            self._disk_usage += len(data)
+            if self._disk_usage > self.disk_bytes:
+                self._disk_evict()
+
+    def _disk_evict(self):
+        entries = []
+        for path in self.disk_dir.glob("*.png"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        self._disk_usage = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._disk_usage <= self.disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self._disk_usage -= size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self._inflight.coalesced,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.nbytes,
+            "memory_evictions": self.memory.evictions,
+            "disk_bytes": self._disk_usage if self.disk_dir is not None else None,
+        }
@@ -0,0 +1,172 @@
+"""
+Dreamy Vision - Run Control
+Per-request cancellation and step progress, hooked into the diffusion
+pipeline's step callback
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class RunCancelled(Exception):
+    """Raised inside the denoising loop to stop a cancelled run"""
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(f"Run {reason}")
+        self.reason = reason
+
+    def __reduce__(self):
+        # Survive pickling across worker processes with the reason intact
+        return (RunCancelled, (self.reason,))
+
+
+class RunControl:
+    """
+    Control handle for one request's diffusion run
+
+    Listeners receive `(step, total_steps, latents)` after each denoising
+    step, where `latents` holds just this request's slice of the batch.
+    Setting `cancel()`, or passing the deadline, makes the runner abort at
+    the next step boundary (once every request sharing the batch has
+    cancelled).
+
+    Args:
+        deadline: Absolute `time.monotonic()` after which the run is abandoned
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.cancel_event = threading.Event()
+        self.cancel_reason = "cancelled"
+        self.deadline = deadline
+        self.steps_done = 0
+        self._listeners: List[Callable[[int, int, Any], None]] = []
+
+    def set_timeout(self, seconds: float):
+        """Abandon the run `seconds` from now (keeps any earlier deadline)"""
+        deadline = time.monotonic() + seconds
+        if self.deadline is None or deadline < self.deadline:
+            self.deadline = deadline
+
+    @property
+    def cancelled(self) -> bool:
+        if (
+            not self.cancel_event.is_set()
+            and self.deadline is not None
+            and time.monotonic() > self.deadline
+        ):
+            self.cancel("deadline exceeded")
+        return self.cancel_event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self.cancel_event.is_set():
+            self.cancel_reason = reason
+            self.cancel_event.set()
+
+    def add_listener(self, listener: Callable[[int, int, Any], None]):
+        self._listeners.append(listener)
+
+    def check(self):
+        """Raise RunCancelled if this run should stop"""
+        if self.cancelled:
+            raise RunCancelled(self.cancel_reason)
+
+    def on_step(self, step: int, total_steps: int, latents: Any):
+        self.steps_done = step + 1
+        for listener in self._listeners:
+            try:
+                listener(step, total_steps, latents)
+            except Exception as e:
+                # A broken listener (e.g. preview) must not kill the run
+                print(f"Warning: step listener failed: {e}")
+
+
+class SharedControl(RunControl):
+    """
+    Control for one run made on behalf of several identical requests
+
+    Each member request keeps its own RunControl. Steps are passed on to
+    every member still waiting, and the run counts as cancelled only once
+    all members are, so one client leaving (or timing out) doesn't fail
+    the others. Members may join while the run is in progress.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.members: List[RunControl] = []
+        self._members_lock = threading.Lock()
+
+    def join(self, control: RunControl) -> "SharedControl":
+        with self._members_lock:
+            self.members.append(control)
+        return self
+
+    def _snapshot(self) -> List[RunControl]:
+        with self._members_lock:
+            return list(self.members)
+
+    @property
+    def deadline(self) -> Optional[float]:
+        # The latest member deadline; None while any member has none
+        deadlines = [member.deadline for member in self._snapshot()]
+        if not deadlines or any(deadline is None for deadline in deadlines):
+            return None
+        return max(deadlines)
+
+    @deadline.setter
+    def deadline(self, value: Optional[float]):
+        pass  # Deadlines belong to the members
+
+    @property
+    def cancelled(self) -> bool:
+        members = self._snapshot()
+        if members and all(member.cancelled for member in members):
+            self.cancel_reason = members[0].cancel_reason
+            return True
+        return False
+
+    def on_step(self, step: int, total_steps: int, latents: Any):
+        super().on_step(step, total_steps, latents)
+        for member in self._snapshot():
+            if not member.cancelled:
+                member.on_step(step, total_steps, latents)
+
+
+class AbortStats:
+    """
+    Counts abandoned runs and the compute they gave back
+
+    Reclaimed time is estimated from the steps a run skipped multiplied by
+    a moving average of measured step time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.aborted: Dict[str, int] = {}
+        self.reclaimed_seconds = 0.0
+        self.step_seconds: Optional[float] = None
+
+    def observe_step(self, seconds: float):
+        with self._lock:
+            if self.step_seconds is None:
+                self.step_seconds = seconds
+            else:
+                self.step_seconds = 0.9 * self.step_seconds + 0.1 * seconds
+
+    def record(self, reason: str, remaining_steps: Optional[int] = None):
+        with self._lock:
+            self.aborted[reason] = self.aborted.get(reason, 0) + 1
+            if remaining_steps and self.step_seconds is not None:
+                self.reclaimed_seconds += remaining_steps * self.step_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "aborted": dict(self.aborted),
+            "aborted_total": sum(self.aborted.values()),
+            "reclaimed_seconds": round(self.reclaimed_seconds, 2),
+            "step_seconds": round(self.step_seconds, 4) if self.step_seconds is not None else None,
+        }
+
+
+# Process-wide counters
+abort_stats = AbortStats()
@@ -0,0 +1,494 @@
+"""
+Dreamy Vision - Pipeline Runner
+Drives the enhancer's loaded diffusion pipelines directly, so several
+requests can share a single batched forward pass
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from app.config import (
+    TARGET_SIZE, MAX_IMAGE_SIZE,
+    MIN_DENOISING_STRENGTH, MAX_DENOISING_STRENGTH,
+    NUM_INFERENCE_STEPS, GUIDANCE_SCALE,
+    PROMPT_SUFFIX, NEGATIVE_PROMPT, INPAINT_CONDITIONING_SCALE,
+    ROI_MAX_SIZE, ROI_MIN_SIZE, ROI_PADDING, ROI_FEATHER, TILE_OVERLAP, TILE_BATCH_SIZE,
+    PROMPT_EMBEDDING_CACHE_MB, ORIGINAL_CACHE_MB,
+)
+from app.utils.image_processing import (
+    prepare_inputs, prepare_region, blend_region, prepare_tiles, build_tile, blend_tile,
+)
+from app.services.run_control import RunControl, RunCancelled, abort_stats
+from app.services.step_planner import DEFAULT_SCHEDULER, SCHEDULERS, step_costs
+from app.services.precision import inference_context
+from app.services.pipeline_registry import IMG2IMG, INPAINT, PLAIN
+from app.services.prompt_embeddings import PromptEmbeddings, supports_embeddings
+from app.services.latent_cache import OriginalCache, supports_latents, decode_latents
+from app.services.metrics import Trace, metrics
+
+
+# Enhancement modes: the whole frame, just the region the user drew on, or
+# the touched tiles of the original at native resolution
+FULL_MODE = "full"
+ROI_MODE = "roi"
+TILED_MODE = "tiled"
+ENHANCE_MODES = (FULL_MODE, ROI_MODE, TILED_MODE)
+
+
+@dataclass
+class EnhanceInputs:
+    """One caller's share of a pipeline run"""
+    original_image: Image.Image
+    user_drawing: Image.Image
+    description: str
+    enhancement_strength: float
+    seed: Optional[int] = None
+    control: Optional[RunControl] = None
+    image_id: Optional[str] = None  # Content hash of the original (enables its cached latents)
+    trace: Optional[Trace] = None  # Collects this request's stage timings
+
+
+# Text encoder outputs shared by every pipeline (they share the text encoder)
+prompt_embeddings = PromptEmbeddings(max_bytes=PROMPT_EMBEDDING_CACHE_MB * 1024 * 1024)
+
+# Decoded, preprocessed and VAE-encoded originals by content hash
+original_cache = OriginalCache(max_bytes=ORIGINAL_CACHE_MB * 1024 * 1024)
+
+
+# Diffusers pipelines keep scheduler state, so one call at a time per pipeline.
+# The lock and scheduler instances are kept on the pipeline itself, so they go
+# away with it (e.g. a variant the registry unloads) and never outlive it.
+_locks_guard = threading.Lock()
+
+
+def pipeline_lock(pipeline) -> threading.Lock:
+    with _locks_guard:
+        lock = getattr(pipeline, "_dreamy_lock", None)
+        if lock is None:
+            lock = threading.Lock()
+            pipeline._dreamy_lock = lock
+        return lock
+
+
+def use_scheduler(pipeline, name: str):
+    """
+    Switch a pipeline to the named scheduler (call under its pipeline lock)
+
+    Schedulers are built once from the loaded scheduler's config and reused.
+    Unknown names, or a diffusers without the class, fall back to the default.
+    """
+    if not hasattr(pipeline, "scheduler"):
+        return
+    with _locks_guard:
+        # Per name; "default" is the one the pipeline was loaded with
+        schedulers = getattr(pipeline, "_dreamy_schedulers", None)
+        if schedulers is None:
+            schedulers = {DEFAULT_SCHEDULER: pipeline.scheduler}
+            pipeline._dreamy_schedulers = schedulers
+        if name not in schedulers:
+            default = schedulers[DEFAULT_SCHEDULER]
+            scheduler = default
+            if name in SCHEDULERS:
+                try:
+                    import diffusers
+                    scheduler = getattr(diffusers, SCHEDULERS[name]).from_config(default.config)
+                except (ImportError, AttributeError) as e:
+                    print(f"Warning: Scheduler {name} unavailable, using default: {e}")
+            schedulers[name] = scheduler
+    pipeline.scheduler = schedulers[name]
+
+
+def clamp_strength(strength: float) -> float:
+    """Keep strength inside the configured subtle-enhancement range"""
+    return min(MAX_DENOISING_STRENGTH, max(MIN_DENOISING_STRENGTH, strength))
+
+
+def uses_inpainting(enhancer) -> bool:
+    if hasattr(enhancer, "get_pipeline"):
+        # Registry-backed: don't build the inpaint pipeline just to ask
+        return bool(enhancer.use_inpainting)
+    return bool(getattr(enhancer, "use_inpainting", False) and getattr(enhancer, "inpaint_pipeline", None))
+
+
+def resolve_variant(enhancer, variant: Optional[str] = None) -> str:
+    """
+    The pipeline variant a run will actually use
+
+    None means the enhancer's default (inpaint when enabled). Enhancers
+    without a registry only have img2img and maybe inpaint, so anything
+    else falls back to img2img.
+    """
+    if variant is None:
+        variant = INPAINT if uses_inpainting(enhancer) else IMG2IMG
+    if hasattr(enhancer, "get_pipeline"):
+        return variant
+    if variant == INPAINT and getattr(enhancer, "inpaint_pipeline", None) is not None:
+        return INPAINT
+    return IMG2IMG
+
+
+def pipeline_for(enhancer, variant: str):
+    if hasattr(enhancer, "get_pipeline"):
+        return enhancer.get_pipeline(variant)
+    return enhancer.inpaint_pipeline if variant == INPAINT else enhancer.pipeline
+
+
+def _traces(items: List[EnhanceInputs]) -> List[Trace]:
+    return [item.trace for item in items if item.trace is not None]
+
+
+def build_prompt(enhanced_description: str) -> str:
+    return f"{enhanced_description}, {PROMPT_SUFFIX}"
+
+
+def _generators(seeds: List[Optional[int]]):
+    """One generator per item so each caller gets the same image it would alone"""
+    if all(seed is None for seed in seeds):
+        return None
+    import torch
+    generators = []
+    for seed in seeds:
+        generator = torch.Generator(device="cpu")
+        if seed is None:
+            generator.seed()
+        else:
+            generator.manual_seed(seed)
+        generators.append(generator)
+    return generators
+
+
+def denoising_steps(num_inference_steps: int, strength: float) -> int:
+    """Steps img2img actually runs: the schedule is truncated by strength"""
+    return max(1, min(int(num_inference_steps * strength), num_inference_steps))
+
+
+def _step_callback(items: List[EnhanceInputs], total_steps: int, step_times: List[float]):
+    """
+    Build the pipeline step callback for a batch
+
+    Each request's control sees its own slice of the latents. The loop is
+    aborted only once every request in the batch has been cancelled, so one
+    closed tab doesn't take its batch-mates down with it. Step durations
+    are appended to `step_times`.
+    """
+    controls = [item.control for item in items]
+    last_step = [time.perf_counter()]
+
+    def callback(step, timestep, latents):
+        now = time.perf_counter()
+        if step > 0:  # The first interval also covers prompt and VAE encoding
+            abort_stats.observe_step(now - last_step[0])
+            step_times.append(now - last_step[0])
+        last_step[0] = now
+        for index, control in enumerate(controls):
+            if control is not None and not control.cancelled:
+                control.on_step(step, total_steps, latents[index:index + 1] if latents is not None else None)
+        if all(control is not None and control.cancelled for control in controls):
+            abort_stats.record(controls[0].cancel_reason, total_steps - (step + 1))
+            raise RunCancelled(controls[0].cancel_reason)
+
+    return callback
+
+
+def run_batch(
+    enhancer,
+    items: List[EnhanceInputs],
+    prompt_fn: Callable[[str], str],
+    num_inference_steps: int = NUM_INFERENCE_STEPS,
+    guidance_scale: float = GUIDANCE_SCALE,
+    strength: Optional[float] = None,
+    scheduler: str = DEFAULT_SCHEDULER,
+    resolution: int = TARGET_SIZE,
+    mode: str = FULL_MODE,
+    variant: Optional[str] = None,
+) -> List[Image.Image]:
+    """
+    Enhance several inputs with one pipeline call
+
+    All items must share the run settings (the batcher groups them).
+
+    Args:
+        enhancer: Loaded ImageEnhancer (provides `pipeline` / `inpaint_pipeline`)
+        items: Inputs to enhance together
+        prompt_fn: Turns a user description into a diffusion prompt (LLM enhancement)
+        num_inference_steps: Denoising steps
+        guidance_scale: Classifier-free guidance scale
+        strength: Denoising strength; defaults to the first item's
+        scheduler: Scheduler name from the step plan
+        resolution: Square size to run diffusion at; outputs are scaled
+            back to TARGET_SIZE. In ROI mode, the tile's longest side limit
+        mode: FULL_MODE diffuses the whole padded frame; ROI_MODE only a tile
+            around the drawing, and TILED_MODE every grid tile the drawing
+            touches. Both return the original at working resolution (its
+            own aspect ratio, no padding) with the enhanced area blended in
+        variant: Pipeline variant (IMG2IMG, INPAINT or PLAIN); None uses the
+            enhancer's default
+
+    Returns:
+        One enhanced PIL Image per item, in order
+    """
+    if not hasattr(enhancer, "get_pipeline") and getattr(enhancer, "pipeline", None) is None:
+        # Pipelines failed to load - let the enhancer handle it one by one
+        return [
+            enhancer.enhance(
+                original_image=item.original_image,
+                user_drawing=item.user_drawing,
+                description=item.description,
+                enhancement_strength=item.enhancement_strength,
+            )
+            for item in items
+        ]
+
+    if strength is None:
+        strength = clamp_strength(items[0].enhancement_strength)
+    # Requests cancelled while queued are dropped before any work
+    live = [item for item in items if item.control is None or not item.control.cancelled]
+    if len(live) < len(items):
+        if not live:
+            for item in items:
+                abort_stats.record(item.control.cancel_reason, denoising_steps(num_inference_steps, strength))
+            items[0].control.check()
+        results = iter(run_batch(
+            enhancer, live, prompt_fn, num_inference_steps, guidance_scale, strength, scheduler, resolution, mode,
+            variant,
+        ))
+        return [
+            next(results) if item.control is None or not item.control.cancelled
+            else RunCancelled(item.control.cancel_reason)
+            for item in items
+        ]
+    variant = resolve_variant(enhancer, variant)
+    inpaint = variant == INPAINT
+    traces = _traces(items)
+    with metrics.timed("llm", *traces):
+        prompts = [build_prompt(prompt_fn(item.description)) for item in items]
+
+    if mode == ROI_MODE:
+        with metrics.timed("preprocess", *traces):
+            regions = [
+                prepare_region(
+                    item.original_image, item.user_drawing,
+                    max_size=ROI_MAX_SIZE, run_size=resolution, min_size=ROI_MIN_SIZE,
+                    pad=ROI_PADDING, feather=ROI_FEATHER,
+                )
+                for item in items
+            ]
+        runs = [(region.image, region.control_image, region.mask) for region in regions]
+        outputs = _run_groups(
+            enhancer, items, prompts, runs, num_inference_steps, guidance_scale, strength, scheduler, variant
+        )
+        return [
+            output if isinstance(output, BaseException) else blend_region(region, output)
+            for output, region in zip(outputs, regions)
+        ]
+
+    if mode == TILED_MODE:
+        return _run_tiled(
+            enhancer, items, prompts, num_inference_steps, guidance_scale, strength, scheduler, resolution, variant
+        )
+
+    size = (TARGET_SIZE, TARGET_SIZE)
+    prepared = []
+    # Resize, pad, Canny edges and (inpaint) the mask, which prepare_inputs does together
+    with metrics.timed("preprocess", *traces):
+        for item in items:
+            cached = original_cache.preprocessed(item.image_id, TARGET_SIZE)
+            p = prepare_inputs(
+                item.original_image, item.user_drawing,
+                max_size=MAX_IMAGE_SIZE, target_size=TARGET_SIZE, with_mask=inpaint, image=cached,
+            )
+            if cached is None:
+                original_cache.store_preprocessed(item.image_id, TARGET_SIZE, p.image)
+            prepared.append(p)
+        runs = [(p.image, p.control_image, p.mask) for p in prepared]
+        if resolution != TARGET_SIZE:
+            # Inputs are prepared at full size for compositing, then scaled for the run
+            run_size = (resolution, resolution)
+            runs = [
+                (
+                    image.resize(run_size, Image.LANCZOS),
+                    control.resize(run_size, Image.BILINEAR),
+                    mask.resize(run_size, Image.BILINEAR) if mask is not None else None,
+                )
+                for image, control, mask in runs
+            ]
+    outputs = _run_groups(
+        enhancer, items, prompts, runs, num_inference_steps, guidance_scale, strength, scheduler, variant,
+        image_ids=[item.image_id for item in items],
+    )
+
+    results = []
+    for output, p in zip(outputs, prepared):
+        if not isinstance(output, BaseException):
+            if output.size != size:
+                output = output.resize(size, Image.LANCZOS)
+            if inpaint:
+                # Keep everything outside the drawing exactly as it was
+                output = Image.composite(output, p.image, p.mask)
+        results.append(output)
+    return results
+
+
+def _run_tiled(
+    enhancer,
+    items: List[EnhanceInputs],
+    prompts: List[str],
+    num_inference_steps: int,
+    guidance_scale: float,
+    strength: float,
+    scheduler: str,
+    resolution: int,
+    variant: str,
+) -> list:
+    """
+    Enhance the touched tiles of every item, TILE_BATCH_SIZE tiles per call
+
+    Tiles from all items in the batch share pipeline calls. Each tile is cut
+    just before its call and blended into its item's result straight after,
+    so memory stays at one canvas per item plus one batch of tiles.
+    """
+    with metrics.timed("preprocess", *_traces(items)):
+        tiled = [
+            prepare_tiles(
+                item.original_image, item.user_drawing,
+                max_size=ROI_MAX_SIZE, tile_size=TARGET_SIZE, overlap=TILE_OVERLAP,
+            )
+            for item in items
+        ]
+    results: list = [t.canvas.copy() for t in tiled]
+    work = [(index, box) for index, t in enumerate(tiled) for box in t.boxes]
+
+    for start in range(0, len(work), max(1, TILE_BATCH_SIZE)):
+        chunk = []
+        for index, box in work[start:start + TILE_BATCH_SIZE]:
+            control = items[index].control
+            if control is not None and control.cancelled and not isinstance(results[index], BaseException):
+                # Cancelled between tile batches: report it rather than return it half-done
+                results[index] = RunCancelled(control.cancel_reason)
+            if not isinstance(results[index], BaseException):
+                chunk.append((index, box))
+        if not chunk:
+            continue
+        with metrics.timed("preprocess", *_traces([items[index] for index, _ in chunk])):
+            tiles = [
+                build_tile(tiled[index], box, run_size=resolution, overlap=TILE_OVERLAP, feather=ROI_FEATHER)
+                for index, box in chunk
+            ]
+        outputs = _run_groups(
+            enhancer,
+            [items[index] for index, _ in chunk],
+            [prompts[index] for index, _ in chunk],
+            [(tile.image, tile.control_image, tile.mask) for tile in tiles],
+            num_inference_steps, guidance_scale, strength, scheduler, variant,
+        )
+        for (index, _), tile, output in zip(chunk, tiles, outputs):
+            if isinstance(output, BaseException):
+                results[index] = output
+            elif not isinstance(results[index], BaseException):
+                blend_tile(results[index], tile, output)
+    return results
+
+
+def _run_groups(
+    enhancer,
+    items: List[EnhanceInputs],
+    prompts: List[str],
+    runs: List[Tuple[Image.Image, Image.Image, Optional[Image.Image]]],
+    num_inference_steps: int,
+    guidance_scale: float,
+    strength: float,
+    scheduler: str,
+    variant: str,
+    image_ids: Optional[List[Optional[str]]] = None,
+) -> list:
+    """
+    One pipeline call per distinct input size (a batch must share a shape)
+
+    Args:
+        runs: Per item (image, control image, mask) at the size to diffuse at
+        image_ids: Per item content hash of the image being run, when it is
+            the whole original; with all ids present, img2img runs start from
+            cached latents instead of VAE-encoding the image
+
+    Returns:
+        Pipeline output per item, or RunCancelled for items whose call was aborted
+
+    Each call is timed as text_encode, vae_encode (cached latents only),
+    denoise (the pipeline call itself) and vae_decode.
+    """
+    pipeline = pipeline_for(enhancer, variant)
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for index, (image, _, _) in enumerate(runs):
+        groups.setdefault(image.size, []).append(index)
+
+    steps = denoising_steps(num_inference_steps, strength)
+    outputs: list = [None] * len(items)
+    for (width, height), indices in groups.items():
+        group = [items[i] for i in indices]
+        traces = _traces(group)
+        step_times: List[float] = []
+        kwargs = dict(
+            prompt=[prompts[i] for i in indices],
+            negative_prompt=[NEGATIVE_PROMPT] * len(indices),
+            image=[runs[i][0] for i in indices],
+            control_image=[runs[i][1] for i in indices],
+            strength=strength,
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            generator=_generators([item.seed for item in group]),
+            callback=_step_callback(group, steps, step_times),
+            callback_steps=1,
+        )
+        if variant == PLAIN:
+            # Plain img2img takes its size from the image and has no width/height
+            del kwargs["control_image"]
+        elif (width, height) != (TARGET_SIZE, TARGET_SIZE):
+            kwargs.update(width=width, height=height)
+        if variant == INPAINT:
+            kwargs.update(
+                mask_image=[runs[i][2] for i in indices],
+                controlnet_conditioning_scale=INPAINT_CONDITIONING_SCALE,
+            )
+
+        try:
+            with pipeline_lock(pipeline), inference_context(enhancer):
+                use_scheduler(pipeline, scheduler)
+                start = time.perf_counter()
+                if supports_embeddings(pipeline):
+                    # Cached embeddings instead of running the text encoder every call
+                    with metrics.timed("text_encode", *traces):
+                        kwargs["prompt_embeds"] = prompt_embeddings.embed(pipeline, kwargs.pop("prompt"))
+                        kwargs["negative_prompt_embeds"] = prompt_embeddings.embed(
+                            pipeline, kwargs.pop("negative_prompt")
+                        )
+                ids = [image_ids[i] for i in indices] if image_ids else [None]
+                if variant != INPAINT and all(ids) and supports_latents(pipeline):
+                    # Img2img takes 4-channel latents in place of the image. Inpaint
+                    # also encodes the masked image from pixels, so it keeps them.
+                    with metrics.timed("vae_encode", *traces):
+                        kwargs["image"] = original_cache.latents(pipeline, ids, kwargs["image"])
+                decode = supports_latents(pipeline)
+                if decode:
+                    # Decode here rather than in the pipeline, so it is timed on its own
+                    kwargs["output_type"] = "latent"
+                with metrics.timed("denoise", *traces):
+                    images = pipeline(**kwargs).images
+                if decode:
+                    with metrics.timed("vae_decode", *traces):
+                        images = decode_latents(pipeline, images)
+                for step_seconds in step_times:
+                    metrics.observe("denoise_step", step_seconds)
+                step_costs.observe(
+                    time.perf_counter() - start, steps, int((width * height) ** 0.5), len(indices),
+                    step_seconds=sum(step_times) / len(step_times) if step_times else None,
+                )
+        except RunCancelled as e:
+            # Only this group's requests were all cancelled; other groups still run
+            images = [e] * len(indices)
+        for i, image in zip(indices, images):
+            outputs[i] = image
+    return outputs
@@ -0,0 +1,199 @@
+"""
+Dreamy Vision - Step Planner
+Chooses scheduler, step count and resolution for each request from a
+quality tier or latency budget, using step costs measured on this host
+"""
+
+import math
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import (
+    DEVICE, TARGET_SIZE, NUM_INFERENCE_STEPS,
+    PLAN_PRIOR_STEP_SECONDS, PLAN_PRIOR_OVERHEAD_SECONDS,
+)
+
+
+DEFAULT_SCHEDULER = "default"  # Whatever the pipeline was loaded with
+
+# Few-step solvers that work with the stock SD 1.5 weights, by diffusers class
+SCHEDULERS = {
+    "dpm++": "DPMSolverMultistepScheduler",
+    "unipc": "UniPCMultistepScheduler",
+}
+
+# Tiers are defined by the denoising steps that actually run, so the
+# trade-off no longer depends on enhancement_strength by accident.
+# Each entry is (scheduler, denoising steps, resolution).
+TIERS: Dict[str, Tuple[str, int, int]] = {
+    "fast": ("dpm++", 2, 384),
+    "balanced": ("dpm++", 4, TARGET_SIZE),
+    "best": ("dpm++", 8, TARGET_SIZE),
+}
+
+# Candidates for a millisecond budget, best quality first
+BUDGET_LADDER: List[Tuple[str, int, int]] = [
+    ("dpm++", 8, TARGET_SIZE),
+    ("dpm++", 6, TARGET_SIZE),
+    ("dpm++", 4, TARGET_SIZE),
+    ("dpm++", 3, TARGET_SIZE),
+    ("dpm++", 2, TARGET_SIZE),
+    ("dpm++", 2, 384),
+    ("dpm++", 1, 384),
+    ("dpm++", 1, 256),
+]
+
+
+class InvalidPlanError(ValueError):
+    """Raised for an unknown quality tier or a non-positive budget"""
+
+
+@dataclass
+class StepPlan:
+    """How one request will be run"""
+    tier: str                 # fast / balanced / best / budget / custom
+    scheduler: str
+    num_inference_steps: int  # Length of the full schedule
+    denoising_steps: int      # Steps that run after strength truncation
+    resolution: int           # Square size the pipeline runs at
+    strength: float
+    estimated_ms: int
+    budget_ms: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def steps_for(denoising_steps: int, strength: float) -> int:
+    """Smallest schedule length whose strength-truncated tail runs `denoising_steps` steps"""
+    num_inference_steps = max(denoising_steps, math.ceil(denoising_steps / strength))
+    while int(num_inference_steps * strength) < denoising_steps:
+        num_inference_steps += 1
+    return num_inference_steps
+
+
+class StepCostModel:
+    """
+    Moving averages of per-step and fixed cost on this host
+
+    Costs are normalised to one 512x512 image and scale with pixel count
+    and batch size. The fixed part covers prompt encoding, VAE encode and
+    decode. Starts from per-device priors and converges on real runs.
+    """
+
+    def __init__(self, step_seconds: float, overhead_seconds: float, alpha: float = 0.2):
+        self._lock = threading.Lock()
+        self.step_seconds = step_seconds
+        self.overhead_seconds = overhead_seconds
+        self.alpha = alpha
+        self.runs = 0
+
+    @staticmethod
+    def _units(resolution: int, batch_size: int) -> float:
+        return (resolution / 512) ** 2 * max(1, batch_size)
+
+    def _blend(self, old: float, new: float) -> float:
+        # The first real measurement replaces the prior outright
+        return new if self.runs == 0 else (1 - self.alpha) * old + self.alpha * new
+
+    def observe(self, seconds: float, steps: int, resolution: int, batch_size: int = 1,
+                step_seconds: Optional[float] = None):
+        """
+        Record one pipeline call
+
+        Args:
+            seconds: Wall time of the whole call
+            steps: Denoising steps it ran
+            resolution: Square size it ran at
+            batch_size: Images in the call
+            step_seconds: Measured mean step time, if the step callback saw it
+        """
+        units = self._units(resolution, batch_size)
+        with self._lock:
+            if step_seconds is not None:
+                step = step_seconds / units
+                overhead = max(0.0, seconds - steps * step_seconds) / units
+                self.overhead_seconds = self._blend(self.overhead_seconds, overhead)
+            else:
+                # Only the total is known (worker processes): keep the fixed part
+                step = max(0.0, seconds / units - self.overhead_seconds) / max(1, steps)
+            self.step_seconds = self._blend(self.step_seconds, step)
+            self.runs += 1
+
+    def estimate(self, steps: int, resolution: int, batch_size: int = 1) -> float:
+        """Predicted seconds for one pipeline call"""
+        units = self._units(resolution, batch_size)
+        return units * (self.overhead_seconds + steps * self.step_seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "step_seconds": round(self.step_seconds, 4),
+            "overhead_seconds": round(self.overhead_seconds, 4),
+            "calibration_runs": self.runs,
+        }
+
+
+def plan_steps(
+    strength: float,
+    quality: Optional[str] = None,
+    budget_ms: Optional[float] = None,
+    num_inference_steps: int = NUM_INFERENCE_STEPS,
+    costs: Optional[StepCostModel] = None,
+) -> StepPlan:
+    """
+    Pick how to run one request
+
+    Args:
+        strength: Clamped denoising strength
+        quality: "fast", "balanced" or "best"
+        budget_ms: Latency target for the diffusion run; the best ladder
+            entry predicted to fit is used (the cheapest if none fits)
+        num_inference_steps: Schedule length when neither quality nor budget is given
+        costs: Cost model for estimates (defaults to this host's)
+
+    Returns:
+        StepPlan
+
+    Raises:
+        InvalidPlanError: For an unknown tier or a non-positive budget
+    """
+    costs = costs or step_costs
+
+    def make(tier, scheduler, denoising, resolution, steps=None):
+        steps = steps or steps_for(denoising, strength)
+        denoising = max(1, min(int(steps * strength), steps))
+        return StepPlan(
+            tier=tier,
+            scheduler=scheduler,
+            num_inference_steps=steps,
+            denoising_steps=denoising,
+            resolution=resolution,
+            strength=strength,
+            estimated_ms=int(costs.estimate(denoising, resolution) * 1000),
+            budget_ms=int(budget_ms) if budget_ms is not None else None,
+        )
+
+    if quality is not None:
+        if quality not in TIERS:
+            raise InvalidPlanError(f"Unknown quality tier: {quality} (expected one of {', '.join(TIERS)})")
+        return make(quality, *TIERS[quality])
+
+    if budget_ms is not None:
+        if budget_ms <= 0:
+            raise InvalidPlanError("Latency budget must be positive")
+        plans = [make("budget", *candidate) for candidate in BUDGET_LADDER]
+        for plan in plans:
+            if plan.estimated_ms <= budget_ms:
+                return plan
+        return plans[-1]
+
+    # Legacy behaviour: caller-chosen schedule length on the loaded scheduler
+    return make("custom", DEFAULT_SCHEDULER, 0, TARGET_SIZE, steps=num_inference_steps)
+
+
+# Process-wide cost model
+step_costs = StepCostModel(
+    step_seconds=PLAN_PRIOR_STEP_SECONDS.get(DEVICE, PLAN_PRIOR_STEP_SECONDS["cpu"]),
+    overhead_seconds=PLAN_PRIOR_OVERHEAD_SECONDS.get(DEVICE, PLAN_PRIOR_OVERHEAD_SECONDS["cpu"]),
+)
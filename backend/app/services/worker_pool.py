@@ -0,0 +1,285 @@
+"""
+Dreamy Vision - Worker Process Pool
+Runs diffusion in several forked processes that share one copy of the
+model weights, each pinned to its own slice of CPU cores
+"""
+
+import gc
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.services.run_control import RunControl
+from app.services.runner import EnhanceInputs, run_batch, denoising_steps
+from app.services.step_planner import step_costs
+
+
+# Requests that can be in a worker at once with live cancellation and progress
+CONTROL_SLOTS = 256
+
+# Cancel reasons as they cross the process boundary (flag value = index + 1)
+CANCEL_REASONS = ("cancelled", "client disconnected", "deadline exceeded", "timed out")
+
+# Set in the parent before forking; children inherit it (copy-on-write)
+_enhancer = None
+_cpu_slices: List[List[int]] = []
+_next_slice = None
+_cancel_flags = None  # One byte per slot: 0 = live, else CANCEL_REASONS index + 1
+_progress = None      # (slot, generation, step, total_steps, latents) from the workers
+
+
+def _available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _init_worker(threads: int):
+    """Pin this worker to its core slice and size torch's thread pools to match"""
+    with _next_slice.get_lock():
+        index = _next_slice.value
+        _next_slice.value += 1
+    cpus = _cpu_slices[index % len(_cpu_slices)]
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            print(f"Warning: Could not pin worker to CPUs {cpus}: {e}")
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Already initialised in the parent; intra-op threads matter most
+    except ImportError:
+        pass
+
+
+class _WorkerControl(RunControl):
+    """A request's RunControl inside a worker: cancelled through its shared flag, steps sent back to the parent"""
+
+    def __init__(self, slot: int, generation: int, deadline: Optional[float]):
+        super().__init__(deadline=deadline)
+        self.slot = slot
+        self.generation = generation
+
+    @property
+    def cancelled(self) -> bool:
+        flag = _cancel_flags[self.slot]
+        if flag:
+            self.cancel(CANCEL_REASONS[flag - 1])
+        return RunControl.cancelled.fget(self)
+
+    def on_step(self, step: int, total_steps: int, latents: Any):
+        super().on_step(step, total_steps, latents)
+        if hasattr(latents, "detach"):
+            # NumPy pickles as plain bytes; tensors would go through torch's shared-memory reducers
+            latents = latents.detach().float().cpu().numpy()
+        _progress.put((self.slot, self.generation, step, total_steps, latents))
+
+
+def _run_in_worker(key, items: List[EnhanceInputs], prompts: Dict[str, str],
+                   controls: List[Tuple[Optional[float], int, int]]):
+    num_inference_steps, guidance_scale, strength, scheduler, resolution, mode, variant = key
+    # RunControl holds thread primitives, so only (deadline, slot, generation)
+    # crosses the process boundary. CLOCK_MONOTONIC is system-wide, so parent
+    # deadlines hold here too.
+    for item, (deadline, slot, generation) in zip(items, controls):
+        item.control = _WorkerControl(slot, generation, deadline) if slot >= 0 else RunControl(deadline=deadline)
+    # Per-item RunCancelled results pickle back as values
+    return run_batch(
+        _enhancer,
+        items,
+        prompt_fn=prompts.__getitem__,
+        num_inference_steps=num_inference_steps,
+        guidance_scale=guidance_scale,
+        strength=strength,
+        scheduler=scheduler,
+        resolution=resolution,
+        mode=mode,
+        variant=variant,
+    )
+
+
+def _cancel_flag(reason: str) -> int:
+    return CANCEL_REASONS.index(reason) + 1 if reason in CANCEL_REASONS else 1
+
+
+class WorkerPool:
+    """
+    Fork-after-load process pool for CPU inference
+
+    The parent loads the enhancer once, then forks `processes` workers.
+    Weight tensors are never written after loading, so their pages stay
+    shared between all workers instead of being copied per process.
+    Each worker gets `threads` cores (default: an even share) and pins
+    torch's intra-op pool to them.
+
+    Prompt enhancement stays in the parent (where the LLM cache lives);
+    workers receive finished prompts. Each request in a worker gets a slot:
+    the parent raises its shared cancel flag when the request's RunControl
+    is cancelled (or passes its deadline), and the worker sends every step
+    (with latents, for previews) back over a queue to the request's
+    listeners.
+
+    `start` must run while the process is still single-threaded (before
+    the server starts threads of its own): a forked child only gets the
+    forking thread, and any lock another thread held at that moment stays
+    locked forever in the child.
+
+    Args:
+        load_fn: Returns the loaded ImageEnhancer (called in the parent)
+        processes: Number of worker processes
+        threads: Cores per worker (0 = split available cores evenly)
+    """
+
+    def __init__(self, load_fn: Callable, processes: int, threads: int = 0):
+        self.load_fn = load_fn
+        self.processes = processes
+        self.threads = threads
+        self._pool = None
+        self._lock = threading.Lock()
+        # Parent side of the control slots: slot -> (generation, control)
+        self._slot_lock = threading.Lock()
+        self._slots: Dict[int, Tuple[int, RunControl]] = {}
+        self._free_slots = list(range(CONTROL_SLOTS))
+        self._generation = 0
+
+    @property
+    def started(self) -> bool:
+        return self._pool is not None
+
+    def start(self):
+        """Load weights, then fork the workers (idempotent; call while single-threaded)"""
+        global _enhancer, _cpu_slices, _next_slice, _cancel_flags, _progress
+        with self._lock:
+            if self._pool is not None:
+                return
+            _enhancer = self.load_fn()
+
+            others = [thread.name for thread in threading.enumerate() if thread is not threading.current_thread()]
+            if others:
+                print(f"Warning: Forking worker pool with other threads running ({', '.join(others)}); "
+                      "workers may inherit locks those threads hold")
+
+            cpus = _available_cpus()
+            threads = self.threads or max(1, len(cpus) // self.processes)
+            _cpu_slices = [
+                [cpus[(i * threads + j) % len(cpus)] for j in range(threads)]
+                for i in range(self.processes)
+            ]
+            context = multiprocessing.get_context("fork")
+            _next_slice = context.Value("i", 0)
+            _cancel_flags = context.RawArray("b", CONTROL_SLOTS)
+            _progress = context.Queue()
+
+            # Move everything loaded so far out of the GC's reach, so collections
+            # in the children don't touch (and un-share) those pages
+            gc.collect()
+            gc.freeze()
+            self._pool = context.Pool(
+                processes=self.processes,
+                initializer=_init_worker,
+                initargs=(threads,),
+            )
+            print(f"Worker pool: {self.processes} processes x {threads} threads")
+
+    def run_batch(self, key: Hashable, items: List[EnhanceInputs], prompt_fn: Callable[[str], str]) -> list:
+        """
+        Run one batch on a worker process (blocks the calling thread)
+
+        While it runs, this thread relays the items' cancellation to the
+        worker and the worker's steps to the items' controls.
+        """
+        if self._pool is None:
+            raise RuntimeError("Worker pool is not started; call start() before the server starts its threads")
+        prompts = {item.description: prompt_fn(item.description) for item in items}
+        slots = [self._claim_slot(item.control) for item in items]
+        controls = [
+            (item.control.deadline if item.control is not None else None, slot, generation)
+            for item, (slot, generation) in zip(items, slots)
+        ]
+        payload = [
+            EnhanceInputs(
+                original_image=item.original_image,
+                user_drawing=item.user_drawing,
+                description=item.description,
+                enhancement_strength=item.enhancement_strength,
+                seed=item.seed,
+                image_id=item.image_id,
+            )
+            for item in items
+        ]
+        start = time.perf_counter()
+        try:
+            self._relay_cancels(items, slots)
+            pending = self._pool.apply_async(_run_in_worker, (key, payload, prompts, controls))
+            while not pending.ready():
+                self._relay_cancels(items, slots)
+                self._relay_progress(timeout=0.05)
+            results = pending.get()
+            while self._relay_progress(timeout=0):
+                pass  # Steps the worker sent just before returning
+        finally:
+            for slot, _ in slots:
+                self._release_slot(slot)
+        # Step timings stay in the worker; calibrate the parent's planner from wall time
+        num_inference_steps, _, strength, _, resolution, _, _ = key
+        step_costs.observe(
+            time.perf_counter() - start, denoising_steps(num_inference_steps, strength), resolution, len(items)
+        )
+        return results
+
+    def _claim_slot(self, control: Optional[RunControl]) -> Tuple[int, int]:
+        """(slot, generation) for a request's control; slot -1 if it has none or all are taken"""
+        if control is None:
+            return -1, 0
+        with self._slot_lock:
+            if not self._free_slots:
+                print(f"Warning: All {CONTROL_SLOTS} worker control slots in use; running without cancellation")
+                return -1, 0
+            slot = self._free_slots.pop()
+            # Steps still queued from the slot's previous owner carry the old generation
+            self._generation += 1
+            self._slots[slot] = (self._generation, control)
+            _cancel_flags[slot] = 0
+            return slot, self._generation
+
+    def _release_slot(self, slot: int):
+        if slot < 0:
+            return
+        with self._slot_lock:
+            del self._slots[slot]
+            self._free_slots.append(slot)
+
+    @staticmethod
+    def _relay_cancels(items: List[EnhanceInputs], slots: List[Tuple[int, int]]):
+        for item, (slot, _) in zip(items, slots):
+            if slot >= 0 and not _cancel_flags[slot] and item.control.cancelled:
+                _cancel_flags[slot] = _cancel_flag(item.control.cancel_reason)
+
+    def _relay_progress(self, timeout: float) -> bool:
+        """Hand one queued worker step to its control (whichever batch it belongs to); False if none came"""
+        try:
+            if timeout > 0:
+                slot, generation, step, total_steps, latents = _progress.get(timeout=timeout)
+            else:
+                slot, generation, step, total_steps, latents = _progress.get_nowait()
+        except queue.Empty:
+            return False
+        with self._slot_lock:
+            owner = self._slots.get(slot)
+        if owner is not None and owner[0] == generation:
+            owner[1].on_step(step, total_steps, latents)
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
@@ -0,0 +1,183 @@
+"""
+Dreamy Vision - Caching Utilities
+Thread-safe LRU cache and single-flight call coalescing
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by entry count and/or total size
+
+    Args:
+        max_entries: Maximum number of entries (None = unbounded)
+        max_bytes: Maximum total size as measured by `sizeof` (None = unbounded)
+        ttl: Seconds before an entry expires (None = never)
+        sizeof: Returns the size of a value in bytes (default: every value counts as 1)
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 1)
+        self._data: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[2] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, created_at: Optional[float] = None):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # Would evict everything else and still not fit
+            self._data[key] = (value, size, created_at if created_at is not None else time.time())
+            self.nbytes += size
+            while self._data and (
+                (self.max_entries is not None and len(self._data) > self.max_entries)
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def items(self):
+        """Snapshot of (key, value, created_at) for live entries, oldest first"""
+        with self._lock:
+            return [(key, value, created_at) for key, (value, _, created_at) in self._data.items()]
+
+    def _remove(self, key: Hashable) -> Any:
+        value, size, _ = self._data.pop(key)
+        self.nbytes -= size
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.state: Any = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution
+
+    The first caller runs the function; callers that arrive while it is in
+    flight block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.coalesced = 0
+
+    def do(
+        self,
+        key: Hashable,
+        fn: Callable[..., Any],
+        join: Optional[Callable[[Any], Any]] = None,
+        check: Optional[Callable[[], None]] = None,
+    ) -> Any:
+        """
+        Run `fn`, or wait for the identical call already in flight
+
+        Args:
+            key: Calls with equal keys are coalesced
+            fn: The work; with `join` it is called with the call's shared state
+            join: Called (under the lock) by every caller with the in-flight
+                call's state, None for the first; returns the state to keep.
+                Lets waiting callers attach themselves to the running call.
+            check: Polled while waiting; an exception from it stops this
+                caller waiting (the call carries on for the others)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.coalesced += 1
+            if join is not None:
+                call.state = join(call.state)
+
+        if leader:
+            try:
+                call.result = fn(call.state) if join is not None else fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        elif check is None:
+            call.done.wait()
+        else:
+            while not call.done.wait(0.1):
+                check()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
@@ -0,0 +1,204 @@
+"""
+Dreamy Vision - Image Encoding/Decoding
+Turns request payloads into PIL Images and results back into bytes
+"""
+
+import base64
+import binascii
+import io
+import json
+import math
+from typing import Any, Dict, Iterator, Optional
+
+from PIL import Image
+
+from app.config import (
+    DECODE_DRAFT, MAX_IMAGE_SIZE, MAX_IMAGE_PIXELS,
+    OUTPUT_FORMAT, PNG_COMPRESS_LEVEL, WEBP_QUALITY, WEBP_LOSSLESS, JPEG_QUALITY,
+)
+
+
+MAX_DIMENSION = 2048
+
+# Decode close to the size preprocessing will shrink to anyway
+DRAFT_SIZE = MAX_IMAGE_SIZE if DECODE_DRAFT else None
+
+OUTPUT_MEDIA_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+# base64 turns 3 bytes into 4 characters: chunks of whole triples encode independently
+BASE64_CHUNK_SIZE = 3 * 16 * 1024
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload's dimensions exceed the pixel budget"""
+
+
+def decode_image_bytes(image_data: bytes, draft_size: Optional[int] = DRAFT_SIZE, max_pixels: int = MAX_IMAGE_PIXELS) -> Image.Image:
+    """
+    Decode raw image file bytes (PNG, JPEG, WebP...) to an RGB PIL Image
+    
+    Only the header is read before the size check, so oversized images
+    (decompression bombs) are rejected without decoding any pixels.
+    
+    Args:
+        image_data: Encoded image file
+        draft_size: If set, decode at reduced resolution as long as the longest
+            side stays >= draft_size (JPEG DCT scaling, integer reduce otherwise)
+        max_pixels: Largest width * height accepted
+    
+    Returns:
+        RGB PIL Image
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        width, height = image.size
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(f"Image is too large: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Invalid image data: {str(e)}")
+    
+    # Pillow only warns between its MAX_IMAGE_PIXELS and twice that; both are too large here
+    if Image.MAX_IMAGE_PIXELS:
+        max_pixels = min(max_pixels, Image.MAX_IMAGE_PIXELS)
+    if width * height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is {width}x{height} ({width * height:,} pixels); limit is {max_pixels:,}"
+        )
+    
+    try:
+        if draft_size is not None and image.format == 'JPEG':
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale directly
+            scale = draft_size / max(width, height)
+            if scale < 1:
+                image.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+        image = image.convert('RGB')
+
+        # Validate and limit size
+        width, height = image.size
+        limit = MAX_DIMENSION
+        if draft_size is not None:
+            limit = min(limit, draft_size)
+
+        if width > limit or height > limit:
+            # Cheap integer box reduction that stays >= limit; the one quality
+            # (LANCZOS) resize happens later, straight to the model's target size
+            factor = max(width, height) // limit
+            if max(width, height) // factor > MAX_DIMENSION:
+                factor += 1
+            if factor > 1:
+                image = image.reduce(factor)
+
+        return image
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(f"Image is too large: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Invalid image data: {str(e)}")
+
+
+def decode_base64_image(base64_str: str, draft_size: Optional[int] = DRAFT_SIZE) -> Image.Image:
+    """Decode base64 string (optionally a data URL) to PIL Image"""
+    # Skip a data URL prefix without splitting the whole payload
+    comma = base64_str.find(',', 0, 256)
+    if comma != -1:
+        base64_str = base64_str[comma + 1:]
+    try:
+        image_data = binascii.a2b_base64(base64_str)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid image data: {str(e)}")
+    return decode_image_bytes(image_data, draft_size=draft_size)
+
+
+def encode_image(
+    image: Image.Image,
+    output_format: str = OUTPUT_FORMAT,
+    quality: Optional[int] = None,
+    compress_level: Optional[int] = None,
+    lossless: Optional[bool] = None,
+) -> bytes:
+    """
+    Encode PIL Image to PNG, WebP or JPEG bytes
+
+    Args:
+        image: Image to encode
+        output_format: "png", "webp" or "jpeg"
+        quality: WebP/JPEG quality 1-100 (WebP lossless: compression effort);
+            defaults to DREAMY_WEBP_QUALITY / DREAMY_JPEG_QUALITY
+        compress_level: PNG zlib level 0-9; defaults to DREAMY_PNG_COMPRESS_LEVEL
+        lossless: Lossless WebP; defaults to DREAMY_WEBP_LOSSLESS
+    """
+    output_format = output_format.lower()
+    if output_format not in OUTPUT_MEDIA_TYPES:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    buffer = io.BytesIO()
+    if output_format == "webp":
+        image.save(
+            buffer, format='WEBP',
+            quality=quality if quality is not None else WEBP_QUALITY,
+            lossless=lossless if lossless is not None else WEBP_LOSSLESS,
+        )
+    elif output_format == "jpeg":
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, format='JPEG', quality=quality if quality is not None else JPEG_QUALITY)
+    else:
+        image.save(
+            buffer, format='PNG',
+            compress_level=compress_level if compress_level is not None else PNG_COMPRESS_LEVEL,
+        )
+    return buffer.getvalue()
+
+
+def encode_image_to_base64(image: Image.Image, output_format: str = OUTPUT_FORMAT, **options) -> str:
+    """Encode PIL Image to base64 string (options as for encode_image)"""
+    return base64.b64encode(encode_image(image, output_format, **options)).decode('ascii')
+
+
+def iter_base64(data: bytes, chunk_size: int = BASE64_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield the base64 encoding of `data` in chunks
+
+    Slices a memoryview, so only one chunk's encoding exists at a time
+    instead of a base64 copy of the whole image plus its str.
+    """
+    chunk_size -= chunk_size % 3
+    view = memoryview(data)
+    for offset in range(0, len(view), chunk_size):
+        yield binascii.b2a_base64(view[offset:offset + chunk_size], newline=False)
+
+
+def base64_length(size: int) -> int:
+    return 4 * math.ceil(size / 3)
+
+
+def _json_head(fields: Dict[str, Any], key: str) -> bytes:
+    """`{...fields,"key":"` - the object up to where the base64 value starts"""
+    head = json.dumps(fields, separators=(",", ":"))[:-1]
+    return f'{head}{"," if fields else ""}{json.dumps(key)}:"'.encode()
+
+
+def iter_json_with_base64(fields: Dict[str, Any], key: str, data: bytes) -> Iterator[bytes]:
+    """
+    A JSON object of `fields` plus `key` holding `data` as base64, as chunks
+
+    Equivalent to json.dumps(dict(fields, key=base64 str)) without building
+    either string. base64 needs no JSON escaping, so it goes out as is.
+    """
+    yield _json_head(fields, key)
+    yield from iter_base64(data)
+    yield b'"}'
+
+
+def json_with_base64_length(fields: Dict[str, Any], key: str, data: bytes) -> int:
+    """Byte length of what iter_json_with_base64 yields (for Content-Length)"""
+    return len(_json_head(fields, key)) + base64_length(len(data)) + 2
+
+
+def iter_chunks(data: bytes, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Yield `data` in chunks for streaming response bodies"""
+    view = memoryview(data)
+    for offset in range(0, len(view), chunk_size):
+        yield view[offset:offset + chunk_size].tobytes()
@@ -2,11 +2,25 @@
 Dreamy Vision - Image Processing Utilities
 """
 
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
 from PIL import Image
 import numpy as np
 import cv2
 
 
+def fit_size(width: int, height: int, max_size: int) -> Tuple[int, int]:
+    """Size after shrinking to max_size on the longest side (never enlarges)"""
+    if width > height:
+        if width > max_size:
+            return max_size, int(height * (max_size / width))
+    elif height > max_size:
+        return int(width * (max_size / height)), max_size
+    return width, height
+
+
 def preprocess_image(image: Image.Image, max_size: int = 512, target_size: int = 512, force_square: bool = True) -> Image.Image:
     """
     Preprocess image: resize to max dimension while maintaining aspect ratio,
@@ -28,18 +42,7 @@ def preprocess_image(image: Image.Image, max_size: int = 512, target_size: int =
     width, height = image.size
     
     # Resize to max dimension while maintaining aspect ratio
-    if width > height:
-        if width > max_size:
-            new_width = max_size
-            new_height = int(height * (max_size / width))
-        else:
-            new_width, new_height = width, height
-    else:
-        if height > max_size:
-            new_height = max_size
-            new_width = int(width * (max_size / height))
-        else:
-            new_width, new_height = width, height
+    new_width, new_height = fit_size(width, height, max_size)
     
     # Resize
     image = image.resize((new_width, new_height), Image.LANCZOS)
@@ -145,3 +148,403 @@ def create_inpaint_mask(drawing: Image.Image, target_size: tuple, expand: int =
     
     return mask_image
 
+
+
+# Per-thread scratch arrays reused across requests (intermediates only -
+# anything handed back to callers is freshly allocated)
+_scratch = threading.local()
+_kernels: Dict[int, np.ndarray] = {}
+
+
+def _scratch_buffer(name: str, shape: tuple) -> np.ndarray:
+    buffers = getattr(_scratch, "buffers", None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape:
+        buffer = np.empty(shape, dtype=np.uint8)
+        buffers[name] = buffer
+    return buffer
+
+
+def _dilate_kernel(expand: int) -> np.ndarray:
+    kernel = _kernels.get(expand)
+    if kernel is None:
+        kernel = _kernels[expand] = np.ones((expand, expand), np.uint8)
+    return kernel
+
+
+def _drawing_mask(gray: np.ndarray, expand: int) -> np.ndarray:
+    """Mask of drawn pixels, dilated and softened (a scratch buffer - copy to keep)"""
+    height, width = gray.shape
+    mask = _scratch_buffer("mask", (height, width))
+    # The background is whatever most of the canvas is; a sparse sketch on black stays as drawn
+    if np.median(gray[::4, ::4]) > 128:
+        # Dark drawing on a light background: keep pixels below 250
+        cv2.threshold(gray, 249, 255, cv2.THRESH_BINARY_INV, dst=mask)
+    else:
+        cv2.threshold(gray, 5, 255, cv2.THRESH_BINARY, dst=mask)
+    if expand > 0:
+        dilated = cv2.dilate(mask, _dilate_kernel(expand), dst=_scratch_buffer("dilated", (height, width)), iterations=1)
+        mask = cv2.GaussianBlur(dilated, (5, 5), 0, dst=_scratch_buffer("blurred", (height, width)))
+    return mask
+
+
+def _to_gray(drawing: Image.Image, size: Tuple[int, int]) -> np.ndarray:
+    """Drawing resized once to `size`, as a grayscale array (scratch buffer)"""
+    if drawing.size != size:
+        drawing = drawing.resize(size, Image.LANCZOS)
+    drawing_array = np.asarray(drawing)
+    if drawing_array.ndim == 2:
+        return drawing_array
+    return cv2.cvtColor(
+        drawing_array,
+        cv2.COLOR_RGBA2GRAY if drawing_array.shape[2] == 4 else cv2.COLOR_RGB2GRAY,
+        dst=_scratch_buffer("gray", (size[1], size[0])),
+    )
+
+
+@dataclass
+class PreparedInputs:
+    """Everything the diffusion pipelines need from one request"""
+    image: Image.Image                 # Original, resized and padded to target size
+    control_image: Image.Image         # Canny edges of the drawing (RGB)
+    mask: Optional[Image.Image]        # Inpaint mask (L, white = enhance), if requested
+    content_box: Tuple[int, int, int, int]  # (left, top, right, bottom) of the image inside the padding
+
+
+def prepare_inputs(
+    original: Image.Image,
+    drawing: Image.Image,
+    max_size: int = 512,
+    target_size: int = 512,
+    with_mask: bool = True,
+    expand: int = 10,
+    image: Optional[Image.Image] = None,
+) -> PreparedInputs:
+    """
+    Single preprocessing stage for one request
+    
+    Each input is resized once, straight to its final size. The drawing is
+    fitted to the same area as the original (rather than stretched to the
+    square), so edges and mask line up with the padded original. Grayscale,
+    Canny edges and the inpaint mask are computed from one shared grayscale
+    array using reusable scratch buffers.
+    
+    Args:
+        original: Original pattern photo
+        drawing: User's drawing, same aspect ratio as the original
+        max_size: Maximum dimension of the content area
+        target_size: Square size for SD (content is padded to this)
+        with_mask: Also compute the inpaint mask
+        expand: Pixels to expand mask for smooth blending
+        image: The original already prepared for these sizes (from a cache);
+            skips resizing and padding it again
+    
+    Returns:
+        PreparedInputs
+    """
+    width, height = fit_size(original.size[0], original.size[1], max_size)
+    left = (target_size - width) // 2
+    top = (target_size - height) // 2
+    region = (slice(top, top + height), slice(left, left + width))
+    
+    # Original: one resize, then pad to square
+    if image is None:
+        image = original if original.mode == 'RGB' else original.convert('RGB')
+        if image.size != (width, height):
+            image = image.resize((width, height), Image.LANCZOS)
+        if (width, height) != (target_size, target_size):
+            square_image = Image.new('RGB', (target_size, target_size), (0, 0, 0))
+            square_image.paste(image, (left, top))
+            image = square_image
+    
+    # Drawing: one resize, one grayscale conversion
+    gray = _to_gray(drawing, (width, height))
+    
+    # Control image: Canny edges placed into the padded square
+    edges = cv2.Canny(gray, 50, 150, edges=_scratch_buffer("edges", (height, width)))
+    control = np.zeros((target_size, target_size, 3), dtype=np.uint8)
+    control[region] = edges[:, :, None]
+    control_image = Image.fromarray(control, 'RGB')
+    
+    mask_image = None
+    if with_mask:
+        mask = _drawing_mask(gray, expand)
+        padded_mask = np.zeros((target_size, target_size), dtype=np.uint8)
+        padded_mask[region] = mask
+        mask_image = Image.fromarray(padded_mask, 'L')
+    
+    return PreparedInputs(
+        image=image,
+        control_image=control_image,
+        mask=mask_image,
+        content_box=(left, top, left + width, top + height),
+    )
+
+
+@dataclass
+class RegionInputs:
+    """A tile around the user's drawing, ready for the pipelines"""
+    image: Image.Image          # Tile of the original, scaled to the run size
+    control_image: Image.Image  # Canny edges of the drawing over the tile (RGB)
+    mask: Image.Image           # Inpaint mask over the tile, run size (L)
+    canvas: Image.Image         # Original at working resolution
+    box: Tuple[int, int, int, int]  # (left, top, right, bottom) of the tile in the canvas
+    blend_mask: Image.Image     # Feathered mask at tile size for blending back (L)
+    coverage: float             # Fraction of the canvas inside the tile
+
+
+def _align_box(box: Tuple[int, int, int, int], width: int, height: int, align: int) -> Tuple[int, int, int, int]:
+    """Snap a box outwards to multiples of `align`, staying inside the canvas"""
+    left, top, right, bottom = box
+    left = max(0, left - left % align)
+    top = max(0, top - top % align)
+    right = min(width, right + (-right) % align)
+    bottom = min(height, bottom + (-bottom) % align)
+    return left, top, right, bottom
+
+
+def _run_dims(width: int, height: int, run_size: int, min_size: int = 0) -> Tuple[int, int]:
+    """Diffusion size for a tile: longest side in [min_size, run_size], multiples of 8"""
+    longest = max(width, height)
+    scale = min(run_size, max(min_size, longest)) / longest
+    return (
+        max(8, int(round(width * scale / 8)) * 8),
+        max(8, int(round(height * scale / 8)) * 8),
+    )
+
+
+def _tile_control(gray: np.ndarray, box: Tuple[int, int, int, int], run_dims: Tuple[int, int]) -> Image.Image:
+    """Canny edges of the drawing inside `box`, computed at the run size"""
+    left, top, right, bottom = box
+    gray_tile = cv2.resize(gray[top:bottom, left:right], run_dims, interpolation=cv2.INTER_AREA)
+    edges = cv2.Canny(gray_tile, 50, 150)
+    return Image.fromarray(cv2.cvtColor(edges, cv2.COLOR_GRAY2RGB), 'RGB')
+
+
+def region_box(mask: np.ndarray, pad: int = 32, align: int = 8) -> Tuple[int, int, int, int]:
+    """
+    Square-ish box around the mask's non-zero pixels
+
+    The bounding box is padded by `pad`, grown to a square where the canvas
+    allows (diffusion does better on square-ish tiles), shifted back inside
+    the canvas and aligned to `align` pixels for the latent grid. An empty
+    mask gives the whole canvas.
+
+    Returns:
+        (left, top, right, bottom)
+    """
+    height, width = mask.shape
+    x, y, w, h = cv2.boundingRect(mask)
+    if w == 0 or h == 0:
+        return 0, 0, width, height
+    side = max(w, h) + 2 * pad
+    box_width, box_height = min(side, width), min(side, height)
+    left = min(max(0, x + w // 2 - box_width // 2), width - box_width)
+    top = min(max(0, y + h // 2 - box_height // 2), height - box_height)
+    return _align_box((left, top, left + box_width, top + box_height), width, height, align)
+
+
+def prepare_region(
+    original: Image.Image,
+    drawing: Image.Image,
+    max_size: int = 2048,
+    run_size: int = 512,
+    min_size: int = 256,
+    pad: int = 32,
+    expand: int = 10,
+    feather: int = 16,
+) -> RegionInputs:
+    """
+    Preprocess for region-of-interest enhancement
+
+    Only the tile around the drawing is diffused, so compute follows the
+    drawing's area rather than the canvas. The tile is cut from the original
+    at up to `max_size` resolution: a small drawing on a large photo is
+    diffused at more pixels than it would get in a 512px full frame.
+
+    Args:
+        original: Original pattern photo
+        drawing: User's drawing, same aspect ratio as the original
+        max_size: Longest side of the working canvas
+        run_size: Longest side the tile is diffused at (smaller tiles run at their own size)
+        min_size: Tiles smaller than this are upscaled to it
+        pad: Context pixels around the drawing's bounding box
+        expand: Pixels to expand the mask by
+        feather: Blur radius for blending the tile back into the original
+
+    Returns:
+        RegionInputs
+    """
+    canvas = original if original.mode == 'RGB' else original.convert('RGB')
+    width, height = fit_size(canvas.size[0], canvas.size[1], max_size)
+    if canvas.size != (width, height):
+        canvas = canvas.resize((width, height), Image.LANCZOS)
+
+    gray = _to_gray(drawing, (width, height))
+    mask = _drawing_mask(gray, expand)
+    left, top, right, bottom = region_box(mask, pad=pad)
+    tile_width, tile_height = right - left, bottom - top
+
+    run_dims = _run_dims(tile_width, tile_height, run_size, min_size)
+
+    image = canvas.crop((left, top, right, bottom))
+    if image.size != run_dims:
+        image = image.resize(run_dims, Image.LANCZOS)
+    control_image = _tile_control(gray, (left, top, right, bottom), run_dims)
+
+    mask_tile = mask[top:bottom, left:right]
+    run_mask = Image.fromarray(cv2.resize(mask_tile, run_dims, interpolation=cv2.INTER_LINEAR), 'L')
+    kernel = 2 * feather + 1
+    blend_mask = Image.fromarray(cv2.GaussianBlur(mask_tile, (kernel, kernel), 0), 'L')
+
+    return RegionInputs(
+        image=image,
+        control_image=control_image,
+        mask=run_mask,
+        canvas=canvas,
+        box=(left, top, right, bottom),
+        blend_mask=blend_mask,
+        coverage=(tile_width * tile_height) / (width * height),
+    )
+
+
+def blend_region(region: RegionInputs, output: Image.Image) -> Image.Image:
+    """Scale an enhanced tile back to its box and feather it into the canvas"""
+    left, top, right, bottom = region.box
+    size = (right - left, bottom - top)
+    if output.size != size:
+        output = output.resize(size, Image.LANCZOS)
+    tile = Image.composite(output, region.canvas.crop(region.box), region.blend_mask)
+    result = region.canvas.copy()
+    result.paste(tile, (left, top))
+    return result
+
+
+@dataclass
+class TiledInputs:
+    """An original split into overlapping tiles, keeping those the drawing touches"""
+    canvas: Image.Image         # Original at working resolution
+    gray: np.ndarray            # Drawing as grayscale at canvas size
+    mask: np.ndarray            # Drawing mask at canvas size
+    boxes: List[Tuple[int, int, int, int]]  # Touched tiles, in raster order
+    grid_tiles: int             # Tiles in the full grid
+
+
+@dataclass
+class TileInputs:
+    """One tile, ready for the pipelines"""
+    image: Image.Image          # Tile of the original at the run size
+    control_image: Image.Image  # Canny edges of the drawing (RGB)
+    mask: Image.Image           # Inpaint mask at the run size (L)
+    box: Tuple[int, int, int, int]  # Position in the canvas
+    weight: Image.Image         # Blend weight at tile size: feathered mask x seam ramps (L)
+
+
+def tile_starts(length: int, tile: int, overlap: int) -> List[int]:
+    """Tile offsets covering `length` with at least `overlap` pixels shared between neighbours"""
+    if length <= tile:
+        return [0]
+    stride = tile - overlap
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def prepare_tiles(
+    original: Image.Image,
+    drawing: Image.Image,
+    max_size: int = 2048,
+    tile_size: int = 512,
+    overlap: int = 64,
+    expand: int = 10,
+) -> TiledInputs:
+    """
+    Split the original into overlapping tiles at its native resolution
+
+    Only tiles that intersect the drawing mask are kept, so cost follows the
+    number of tiles touched. Pixel data for each tile is cut on demand by
+    `build_tile`, so only a batch of tiles is ever held at run size.
+
+    Args:
+        original: Original pattern photo
+        drawing: User's drawing, same aspect ratio as the original
+        max_size: Longest side of the working canvas
+        tile_size: Tile side in canvas pixels
+        overlap: Pixels shared between neighbouring tiles for seam blending
+        expand: Pixels to expand the mask by
+
+    Returns:
+        TiledInputs
+    """
+    canvas = original if original.mode == 'RGB' else original.convert('RGB')
+    width, height = fit_size(canvas.size[0], canvas.size[1], max_size)
+    if canvas.size != (width, height):
+        canvas = canvas.resize((width, height), Image.LANCZOS)
+
+    gray = _to_gray(drawing, (width, height)).copy()
+    mask = _drawing_mask(gray, expand).copy()
+
+    xs = tile_starts(width, tile_size, overlap)
+    ys = tile_starts(height, tile_size, overlap)
+    boxes = []
+    for top in ys:
+        for left in xs:
+            box = (left, top, min(width, left + tile_size), min(height, top + tile_size))
+            if cv2.countNonZero(mask[box[1]:box[3], box[0]:box[2]]) > 0:
+                boxes.append(box)
+
+    return TiledInputs(canvas=canvas, gray=gray, mask=mask, boxes=boxes, grid_tiles=len(xs) * len(ys))
+
+
+def build_tile(
+    tiled: TiledInputs,
+    box: Tuple[int, int, int, int],
+    run_size: int = 512,
+    overlap: int = 64,
+    feather: int = 16,
+) -> TileInputs:
+    """
+    Cut one tile's inputs and its blend weight
+
+    Tiles are blended back in raster order, so the weight ramps up from 0
+    across the overlap on the left and top edges (where an earlier tile was
+    already painted) and stays at full strength on the right and bottom.
+    """
+    left, top, right, bottom = box
+    tile_width, tile_height = right - left, bottom - top
+    run_dims = _run_dims(tile_width, tile_height, run_size)
+
+    image = tiled.canvas.crop(box)
+    if image.size != run_dims:
+        image = image.resize(run_dims, Image.LANCZOS)
+    mask_tile = tiled.mask[top:bottom, left:right]
+    run_mask = Image.fromarray(cv2.resize(mask_tile, run_dims, interpolation=cv2.INTER_LINEAR), 'L')
+
+    ramp_x = np.ones(tile_width, dtype=np.float32)
+    ramp_y = np.ones(tile_height, dtype=np.float32)
+    if left > 0:
+        ramp_x[:overlap] = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+    if top > 0:
+        ramp_y[:overlap] = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+    kernel = 2 * feather + 1
+    feathered = cv2.GaussianBlur(mask_tile, (kernel, kernel), 0).astype(np.float32)
+    weight = (feathered * ramp_y[:, None] * ramp_x[None, :]).astype(np.uint8)
+
+    return TileInputs(
+        image=image,
+        control_image=_tile_control(tiled.gray, box, run_dims),
+        mask=run_mask,
+        box=box,
+        weight=Image.fromarray(weight, 'L'),
+    )
+
+
+def blend_tile(result: Image.Image, tile: TileInputs, output: Image.Image):
+    """Blend an enhanced tile into `result` (in place) using the tile's weight"""
+    left, top, right, bottom = tile.box
+    size = (right - left, bottom - top)
+    if output.size != size:
+        output = output.resize(size, Image.LANCZOS)
+    result.paste(Image.composite(output, result.crop(tile.box), tile.weight), (left, top))
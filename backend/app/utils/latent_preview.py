@@ -0,0 +1,51 @@
+"""
+Dreamy Vision - Latent Previews
+Cheap approximate RGB previews straight from SD 1.5 latents, without
+running the VAE decoder
+"""
+
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+
+# Linear fit from the 4 SD 1.5 latent channels to RGB (each row is one channel)
+SD15_LATENT_RGB_FACTORS = np.array([
+    [0.3512, 0.2297, 0.3227],
+    [0.3250, 0.4974, 0.2350],
+    [-0.2829, 0.1762, 0.2721],
+    [-0.2120, -0.2616, -0.7177],
+], dtype=np.float32)
+
+
+def latents_to_preview(latents, size: int = 128) -> Image.Image:
+    """
+    Project one latent tensor (1x4xHxW or 4xHxW) to a small RGB image
+
+    Args:
+        latents: torch tensor or NumPy array of SD 1.5 latents
+        size: Longest side of the returned preview
+
+    Returns:
+        PIL Image preview (roughly 1/8 of the output resolution, upscaled to size)
+    """
+    if hasattr(latents, "detach"):
+        latents = latents.detach().float().cpu().numpy()
+    latents = np.asarray(latents, dtype=np.float32)
+    if latents.ndim == 4:
+        latents = latents[0]
+    rgb = np.einsum("khw,kc->hwc", latents, SD15_LATENT_RGB_FACTORS)
+    rgb = np.clip((rgb + 1.0) * 127.5, 0, 255).astype(np.uint8)
+    preview = Image.fromarray(rgb, 'RGB')
+    height, width = rgb.shape[:2]
+    scale = size / max(width, height)
+    return preview.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.BILINEAR)
+
+
+def preview_to_base64(preview: Image.Image) -> str:
+    """Encode a preview as low-quality JPEG base64 (a few KB)"""
+    buffer = io.BytesIO()
+    preview.save(buffer, format='JPEG', quality=70)
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark batch enhancement: N interpretations of one original, one by one vs batched
+
+"sequential" is N separate single-image runs, as N /enhance calls would be.
+"batched" is what /enhance/batch does: one run with the original's image_id
+set, so its preprocessing and VAE latents are computed once for all N.
+Each mode starts with empty caches.
+
+Usage:
+    python benchmarks/batch_enhance.py                   # stub pipeline
+    python benchmarks/batch_enhance.py --tiny            # tiny real pipeline (downloads ~10MB)
+    python benchmarks/batch_enhance.py --variants 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import runner
+from app.services.latent_cache import OriginalCache
+from app.services.result_cache import hash_image
+from app.services.runner import EnhanceInputs, run_batch
+from benchmarks.batching import load_tiny_enhancer
+from benchmarks.stubs import StubEnhancer
+from test_enhance import create_test_image, create_test_drawing
+
+SHAPES = ("dinosaur", "circle", "line", "random")
+
+
+def make_variants(count, image_id=None):
+    original = create_test_image(pattern="clouds")
+    return [
+        EnhanceInputs(original, create_test_drawing(shape=SHAPES[i % len(SHAPES)]),
+                      f"interpretation {i}", 0.15, seed=i, image_id=image_id)
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--variants", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--tiny", action="store_true", help="Use a tiny real diffusers pipeline")
+    args = parser.parse_args()
+
+    enhancer = load_tiny_enhancer() if args.tiny else StubEnhancer()
+    image_id = hash_image(create_test_image(pattern="clouds"))
+    run_batch(enhancer, make_variants(1), prompt_fn=str, num_inference_steps=args.steps)  # warm-up
+
+    print(f"{'variants':>9} {'sequential s':>13} {'batched s':>10} {'speedup':>8}")
+    for count in args.variants:
+        runner.original_cache = OriginalCache()
+        start = time.perf_counter()
+        for item in make_variants(count):
+            run_batch(enhancer, [item], prompt_fn=str, num_inference_steps=args.steps)
+        sequential = time.perf_counter() - start
+
+        runner.original_cache = OriginalCache()
+        items = make_variants(count, image_id=image_id)
+        start = time.perf_counter()
+        run_batch(enhancer, items, prompt_fn=str, num_inference_steps=args.steps)
+        batched = time.perf_counter() - start
+        print(f"{count:>9} {sequential:>13.2f} {batched:>10.2f} {sequential / batched:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
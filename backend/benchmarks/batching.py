@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark micro-batching: images/sec against batch size on CPU
+
+Runs the pipeline runner directly at each batch size, then replays the same
+load through MicroBatcher from concurrent threads.
+
+Usage:
+    python benchmarks/batching.py                  # stub pipeline only
+    python benchmarks/batching.py --tiny           # also a tiny real pipeline (downloads ~10MB)
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.batching import MicroBatcher
+from app.services.runner import EnhanceInputs, run_batch
+from benchmarks.stubs import StubEnhancer
+from test_enhance import create_test_image, create_test_drawing
+
+TINY_SD_MODEL_ID = "hf-internal-testing/tiny-stable-diffusion-torch"
+TINY_CONTROLNET_MODEL_ID = "hf-internal-testing/tiny-controlnet"
+
+
+def make_items(count):
+    original = create_test_image(pattern="clouds")
+    drawing = create_test_drawing(shape="dinosaur")
+    return [EnhanceInputs(original, drawing, "dinosaur in clouds", 0.15, seed=i) for i in range(count)]
+
+
+def bench_direct(enhancer, batch_sizes, steps, repeats):
+    print(f"{'batch':>6} {'seconds':>9} {'images/s':>9}")
+    for batch_size in batch_sizes:
+        items = make_items(batch_size)
+        run_batch(enhancer, items[:1], prompt_fn=str, num_inference_steps=steps)  # warm-up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            run_batch(enhancer, items, prompt_fn=str, num_inference_steps=steps)
+        elapsed = (time.perf_counter() - start) / repeats
+        print(f"{batch_size:>6} {elapsed:>9.3f} {batch_size / elapsed:>9.2f}")
+
+
+def bench_batcher(enhancer, max_batch_size, requests, steps, max_wait):
+    def run(key, items):
+        return run_batch(enhancer, items, prompt_fn=str, num_inference_steps=steps)
+
+    batcher = MicroBatcher(run, max_batch_size=max_batch_size, max_wait=max_wait)
+    items = make_items(requests)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_batch_size) as pool:
+        list(pool.map(lambda item: batcher.submit("key", item), items))
+    elapsed = time.perf_counter() - start
+    stats = batcher.stats()
+    print(f"max_batch={max_batch_size:<3} {requests / elapsed:>7.2f} images/s  "
+          f"mean batch {stats['mean_batch_size']}")
+
+
+def load_tiny_enhancer():
+    import torch
+    from diffusers import StableDiffusionControlNetImg2ImgPipeline, ControlNetModel
+
+    torch.manual_seed(0)
+    controlnet = ControlNetModel.from_pretrained(TINY_CONTROLNET_MODEL_ID)
+    pipeline = StableDiffusionControlNetImg2ImgPipeline.from_pretrained(
+        TINY_SD_MODEL_ID,
+        controlnet=controlnet,
+        safety_checker=None,
+        requires_safety_checker=False,
+    )
+    pipeline.set_progress_bar_config(disable=True)
+    return StubEnhancer(pipeline=pipeline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=16, help="Requests for the batcher replay")
+    parser.add_argument("--max-wait-ms", type=float, default=50)
+    parser.add_argument("--tiny", action="store_true", help="Also benchmark a tiny real diffusers pipeline")
+    args = parser.parse_args()
+
+    runs = [("stub pipeline", StubEnhancer())]
+    if args.tiny:
+        runs.append(("tiny ControlNet img2img", load_tiny_enhancer()))
+
+    for name, enhancer in runs:
+        print("=" * 60)
+        print(f"{name}: direct batched calls ({args.steps} steps)")
+        print("=" * 60)
+        bench_direct(enhancer, args.batch_sizes, args.steps, args.repeats)
+        print()
+        print(f"{name}: MicroBatcher with {args.requests} concurrent requests")
+        for max_batch_size in args.batch_sizes:
+            bench_batcher(enhancer, max_batch_size, args.requests, args.steps, args.max_wait_ms / 1000.0)
+        print()
+
+
+if __name__ == "__main__":
+    main()
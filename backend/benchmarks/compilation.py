@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark graph compilation: startup cost vs steady-state latency
+
+Each mode runs in a fresh process twice: first with an empty compile cache
+(cold start), then again reusing the cache it left behind (a restart).
+Reports load time, the first image (where compilation happens) and the
+steady-state per-image latency after it.
+
+Usage:
+    python benchmarks/compilation.py                       # tiny pipeline (downloads ~10MB)
+    python benchmarks/compilation.py --full --modes none trace
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import SD_MODEL_ID, CONTROLNET_MODEL_ID
+from app.services import compilation
+from app.services.compilation import compile_pipelines, COMPILE_MODES
+from app.services.runner import EnhanceInputs, run_batch
+from benchmarks.batching import TINY_SD_MODEL_ID, TINY_CONTROLNET_MODEL_ID
+from benchmarks.precision import load_enhancer
+from test_enhance import create_test_image, create_test_drawing
+
+
+def child(args):
+    """One measured process: load, compile, first image, steady state"""
+    compilation.COMPILE_CACHE_DIR = Path(args.cache_dir)
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = str(Path(args.cache_dir) / "inductor")
+    model_ids = (SD_MODEL_ID, CONTROLNET_MODEL_ID) if args.full else (TINY_SD_MODEL_ID, TINY_CONTROLNET_MODEL_ID)
+
+    start = time.perf_counter()
+    enhancer = load_enhancer(*model_ids)
+    active = compile_pipelines(enhancer, args.child)
+    load_seconds = time.perf_counter() - start
+
+    item = EnhanceInputs(create_test_image(pattern="clouds"), create_test_drawing(shape="dinosaur"),
+                         "dinosaur in clouds", 0.15, seed=0)
+    start = time.perf_counter()
+    run_batch(enhancer, [item], prompt_fn=str, num_inference_steps=args.steps)
+    first_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.repeats):
+        run_batch(enhancer, [item], prompt_fn=str, num_inference_steps=args.steps)
+    steady_ms = (time.perf_counter() - start) / args.repeats * 1000
+
+    failed = [name for name in ("unet", "controlnet", "vae")
+              if getattr(getattr(enhancer.pipeline, name), "failed", False)]
+    print(json.dumps({"active": active, "load": load_seconds, "first": first_seconds,
+                      "steady_ms": steady_ms, "fell_back": failed}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=list(COMPILE_MODES), choices=COMPILE_MODES)
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--full", action="store_true", help="Use the real model weights instead of the tiny ones")
+    parser.add_argument("--child", choices=COMPILE_MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    print(f"{'mode':>8} {'start':>6} {'load s':>7} {'first s':>8} {'steady ms':>10}  fallback")
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for start in ("cold", "warm"):
+                command = [sys.executable, __file__, "--child", mode, "--cache-dir", cache_dir,
+                           "--steps", str(args.steps), "--repeats", str(args.repeats)]
+                if args.full:
+                    command.append("--full")
+                output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{mode:>8} {start:>6} {result['load']:>7.1f} {result['first']:>8.2f} "
+                      f"{result['steady_ms']:>10.0f}  {', '.join(result['fell_back']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
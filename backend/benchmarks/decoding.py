@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark draft decoding against full-resolution decoding
+
+Builds a corpus of large synthetic JPEGs and PNGs (phone-camera sizes),
+then decodes each one with and without draft mode. Every measurement runs
+in a fresh child process so peak RSS reflects that decode alone.
+
+Usage:
+    python benchmarks/decoding.py
+    python benchmarks/decoding.py --megapixels 12 24 48 --repeats 5
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from PIL import Image
+
+from app.config import MAX_IMAGE_SIZE
+from app.utils.image_io import decode_image_bytes
+
+
+def synthetic_photo(megapixels, seed=0):
+    """Smooth gradients plus noise: compresses roughly like a real photo"""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = np.stack([x + y * 0.5, np.sin(x * 9) * 0.5 + y, 1 - x * y], axis=-1) * 160
+    noise = rng.normal(0, 12, size=(height, width, 3)).astype(np.float32)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), 'RGB')
+
+
+def encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        image.save(buffer, format='JPEG', quality=90)
+    else:
+        image.save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def _child(data, draft_size, repeats, queue):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for _ in range(repeats):
+        image = decode_image_bytes(data, draft_size=draft_size, max_pixels=10 ** 9)
+    elapsed_ms = (time.perf_counter() - start) / repeats * 1000
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    queue.put((elapsed_ms, peak / 1024, image.size))
+
+
+def measure(data, draft_size, repeats):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_child, args=(data, draft_size, repeats, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Draft vs full decoding benchmark")
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[4, 12, 24])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'file':>12} {'bytes':>12} {'mode':>6} {'ms':>9} {'peak MiB':>9} {'decoded':>11}")
+    for megapixels in args.megapixels:
+        photo = synthetic_photo(megapixels)
+        for fmt in ('JPEG', 'PNG'):
+            data = encode(photo, fmt)
+            label = f"{megapixels:g}MP {fmt}"
+            for mode, draft_size in (("full", None), ("draft", MAX_IMAGE_SIZE)):
+                elapsed_ms, peak_mib, size = measure(data, draft_size, args.repeats)
+                print(f"{label:>12} {len(data):>12,} {mode:>6} {elapsed_ms:>9.1f} {peak_mib:>9.1f} "
+                      f"{size[0]:>5}x{size[1]:<5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark response encoding: time against bytes for each output format
+
+Encodes 512x512 results (a smooth "clouds" image and a noisy "texture" one,
+which bracket how well real outputs compress) with each format and setting,
+then compares building the base64 JSON body as one string against
+streaming it in chunks (peak memory from tracemalloc).
+
+Usage:
+    python benchmarks/encoding.py
+    python benchmarks/encoding.py --size 1024 --json encoding.json
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.utils.image_io import encode_image, iter_json_with_base64
+from benchmarks.report import summarize, write_json, load_baseline, change
+from test_enhance import create_test_image
+
+# (label, encode_image options)
+SETTINGS = [
+    ("png level 0", dict(output_format="png", compress_level=0)),
+    ("png level 1", dict(output_format="png", compress_level=1)),
+    ("png level 3", dict(output_format="png", compress_level=3)),
+    ("png level 6", dict(output_format="png", compress_level=6)),
+    ("png level 9", dict(output_format="png", compress_level=9)),
+    ("webp q75", dict(output_format="webp", quality=75, lossless=False)),
+    ("webp q90", dict(output_format="webp", quality=90, lossless=False)),
+    ("webp lossless", dict(output_format="webp", quality=50, lossless=True)),
+    ("jpeg q85", dict(output_format="jpeg", quality=85)),
+    ("jpeg q95", dict(output_format="jpeg", quality=95)),
+]
+
+
+def measure(fn, repeats):
+    fn()
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return summarize(seconds)
+
+
+def peak_bytes(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def json_as_string(data):
+    """The JSON body the way /enhance used to build it"""
+    return json.dumps({"processing_time": 0.0, "enhanced_image": base64.b64encode(data).decode()}).encode()
+
+
+def json_streamed(data):
+    for _ in iter_json_with_base64({"processing_time": 0.0}, "enhanced_image", data):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Earlier --json output to compare against")
+    args = parser.parse_args()
+    baseline = load_baseline(args.baseline, "encoding")
+
+    results = []
+    print(f"{'image':>8} {'setting':<14} {'p50 ms':>8} {'KiB':>8} {'vs base':>8}")
+    for pattern in ("clouds", "texture"):
+        image = create_test_image(size=(args.size, args.size), pattern=pattern)
+        for label, options in SETTINGS:
+            data = encode_image(image, **options)
+            result = dict(
+                name=f"{pattern}/{label}", image=pattern, setting=label, bytes=len(data),
+                **measure(lambda: encode_image(image, **options), args.repeats),
+            )
+            results.append(result)
+            print(f"{pattern:>8} {label:<14} {result['p50_ms']:>8.2f} {len(data) / 1024:>8.0f} "
+                  f"{change(result['p50_ms'], baseline.get(result['name']), 'p50_ms'):>8}")
+
+    data = encode_image(create_test_image(size=(args.size, args.size), pattern="texture"), "png", compress_level=1)
+    print()
+    print(f"base64 JSON body for a {len(data) / 1024:.0f} KiB image")
+    for label, fn in (("string", json_as_string), ("streamed", json_streamed)):
+        result = dict(
+            name=f"json/{label}", setting=label, bytes=len(data),
+            peak_kib=peak_bytes(lambda: fn(data)) / 1024,
+            **measure(lambda: fn(data), args.repeats),
+        )
+        results.append(result)
+        print(f"{label:>10}: {result['p50_ms']:>7.2f} ms, peak {result['peak_kib']:>7.0f} KiB")
+
+    if args.json:
+        write_json(args.json, "encoding", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Fake Ollama server for trying the LLM client without a model
+
+Serves /api/tags and /api/generate (streamed NDJSON or whole responses,
+JSON format included) with canned answers, a configurable time to first
+token and per-token delay, and optional random failures. Counts requests
+and distinct client connections, so connection reuse is visible.
+
+Usage:
+    python benchmarks/fake_ollama.py --port 11434      # then DREAMY_OLLAMA_URL=http://localhost:11434
+
+    from benchmarks.fake_ollama import FakeOllama
+    with FakeOllama(first_token_ms=50, token_ms=5) as server:
+        service = OllamaLLMService(server.url, "fake")
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import socket
+import threading
+import time
+
+HINTS = [
+    "a dinosaur stretching its neck", "a dragon curled around a tower", "a whale breaching",
+    "an old man's face in profile", "a running horse", "a castle on a cliff",
+    "a rabbit with long ears", "a sailing ship", "a phoenix rising", "a sleeping cat",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeOllama:
+    """
+    In-process fake Ollama on a background thread
+
+    Args:
+        first_token_ms: Delay before the first token (prompt processing)
+        token_ms: Delay per generated word
+        fail_rate: Fraction of requests answered with 503
+        port: Port to listen on (0 = any free port)
+        model: Model name reported by /api/tags
+    """
+
+    def __init__(self, first_token_ms: float = 50, token_ms: float = 5, fail_rate: float = 0.0,
+                 port: int = 0, model: str = "fake"):
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.fail_rate = fail_rate
+        self.port = port or free_port()
+        self.model = model
+        self.requests = 0
+        self.failures = 0
+        self.connections = set()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def answer(self, body: dict) -> str:
+        prompt, system = body.get("prompt", ""), body.get("system", "")
+        if body.get("format") == "json":
+            return json.dumps({"subject": prompt, "attributes": ["fluffy"], "setting": "sky", "mood": "calm"})
+        if "suggest" in system:
+            count = re.search(r"List (\d+)", prompt)
+            return "\n".join(HINTS[:int(count.group(1)) if count else 3])
+        return f"{prompt}, highly detailed, soft natural light, intricate texture"
+
+    def app(self):
+        from fastapi import FastAPI, Request
+        from fastapi.responses import JSONResponse, StreamingResponse
+
+        app = FastAPI()
+
+        @app.get("/api/tags")
+        async def tags():
+            return {"models": [{"name": self.model}]}
+
+        @app.post("/api/generate")
+        async def generate(request: Request):
+            self.requests += 1
+            self.connections.add(tuple(request.scope["client"] or ()))
+            if random.random() < self.fail_rate:
+                self.failures += 1
+                return JSONResponse(status_code=503, content={"error": "model is loading"})
+            body = await request.json()
+            words = re.findall(r"\S+\s*", self.answer(body))
+
+            if not body.get("stream", True):
+                await asyncio.sleep((self.first_token_ms + self.token_ms * len(words)) / 1000)
+                return {"model": self.model, "response": "".join(words), "done": True}
+
+            async def chunks():
+                await asyncio.sleep(self.first_token_ms / 1000)
+                for word in words:
+                    yield json.dumps({"model": self.model, "response": word, "done": False}) + "\n"
+                    await asyncio.sleep(self.token_ms / 1000)
+                yield json.dumps({"model": self.model, "response": "", "done": True}) + "\n"
+
+            return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+        return app
+
+    def start(self) -> "FakeOllama":
+        import uvicorn
+        self._server = uvicorn.Server(uvicorn.Config(self.app(), host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, name="fake-ollama", daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join()
+
+    def __enter__(self) -> "FakeOllama":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+    server = FakeOllama(args.first_token_ms, args.token_ms, args.fail_rate, port=args.port)
+    uvicorn.run(server.app(), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
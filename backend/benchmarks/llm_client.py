@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pooled Ollama client against a new connection per call
+
+Runs against the fake Ollama server (no model needed). "per-call" posts
+with `requests` and no shared session from a thread per caller, like the
+original service. "pooled" uses OllamaLLMService: blocking calls from the
+same threads, and coroutines on one event loop. Also reports when the
+first hint arrives with streaming, against waiting for all of them.
+
+Usage:
+    python benchmarks/llm_client.py
+    python benchmarks/llm_client.py --calls 200 --concurrency 1 8 32 --json llm.json
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.ollama import OllamaLLMService, HINTS_SYSTEM
+from benchmarks.fake_ollama import FakeOllama
+from benchmarks.report import summarize, write_json, load_baseline, change
+
+
+def per_call(url, description):
+    import requests
+    response = requests.post(f"{url}/api/generate", json={
+        "model": "fake", "prompt": f'List 3 different things someone might see in "{description}".',
+        "system": HINTS_SYSTEM, "stream": False,
+    }, timeout=60)
+    response.raise_for_status()
+    return response.json()["response"].splitlines()
+
+
+def run_threads(fn, calls, concurrency):
+    def timed(index):
+        start = time.perf_counter()
+        fn(f"cloud shape {index}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(timed, range(calls)))
+    return latencies, time.perf_counter() - start
+
+
+def run_async(service, calls, concurrency):
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+
+        async def timed(index):
+            async with limit:
+                start = time.perf_counter()
+                await service.agenerate_hints(f"cloud shape {index}")
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(timed(index) for index in range(calls)))
+        return list(latencies), time.perf_counter() - start
+    return asyncio.run(main())
+
+
+def first_hint(service, repeats):
+    """(seconds to the first streamed hint, seconds for the whole list)"""
+    async def main():
+        first, whole = [], []
+        for index in range(repeats):
+            start = time.perf_counter()
+            stream = service.stream_hints(f"streamed shape {index}", 5)
+            await stream.__anext__()
+            first.append(time.perf_counter() - start)
+            await stream.aclose()
+            start = time.perf_counter()
+            await service.agenerate_hints(f"whole shape {index}", 5)
+            whole.append(time.perf_counter() - start)
+        return first, whole
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--first-token-ms", type=float, default=20)
+    parser.add_argument("--token-ms", type=float, default=2)
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Pooled client's in-flight limit")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Earlier --json output to compare against")
+    args = parser.parse_args()
+    baseline = load_baseline(args.baseline, "llm_client")
+
+    results = []
+    with FakeOllama(first_token_ms=args.first_token_ms, token_ms=args.token_ms) as server:
+        service = OllamaLLMService(server.url, "fake", max_concurrency=args.max_concurrency)
+        runs = {
+            "per-call": lambda calls, concurrency: run_threads(lambda text: per_call(server.url, text), calls, concurrency),
+            "pooled": lambda calls, concurrency: run_threads(service.generate_hints, calls, concurrency),
+            "pooled-async": lambda calls, concurrency: run_async(service, calls, concurrency),
+        }
+        print(f"{'client':<13} {'conc':>5} {'calls/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'conns':>6} {'vs base':>8}")
+        for concurrency in args.concurrency:
+            for name, run in runs.items():
+                server.connections.clear()
+                latencies, wall = run(args.calls, concurrency)
+                result = dict(
+                    name=f"{name}@{concurrency}", client=name, concurrency=concurrency,
+                    throughput=len(latencies) / wall, connections=len(server.connections),
+                    **summarize(latencies),
+                )
+                results.append(result)
+                print(f"{name:<13} {concurrency:>5} {result['throughput']:>8.1f} {result['p50_ms']:>8.1f} "
+                      f"{result['p95_ms']:>8.1f} {result['connections']:>6} "
+                      f"{change(result['p95_ms'], baseline.get(result['name']), 'p95_ms'):>8}")
+
+        first, whole = first_hint(service, repeats=10)
+        for name, seconds in (("first-hint", first), ("all-hints", whole)):
+            results.append(dict(name=name, **summarize(seconds)))
+        print(f"\nstreamed first hint: {summarize(first)['p50_ms']:.1f} ms, "
+              f"all five hints: {summarize(whole)['p50_ms']:.1f} ms")
+        service.close()
+
+    if args.json:
+        write_json(args.json, "llm_client", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
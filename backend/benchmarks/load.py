@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator: latency percentiles and throughput per endpoint
+
+By default the API runs in-process (through httpx's ASGI transport) with a
+stub enhancer and an echo LLM, so it needs no model download and measures
+everything around diffusion: decode, preprocessing, queueing, batching and
+encoding. --url targets a running server instead.
+
+Each request gets its own seed so the result cache doesn't answer it;
+--distinct N cycles through N request bodies to measure a warm cache
+instead. Stage timings are read from /metrics before and after the run.
+
+Usage:
+    python benchmarks/load.py --requests 200 --concurrency 8
+    python benchmarks/load.py --endpoint upload --step-ms 0 --json after.json --baseline before.json
+    python benchmarks/load.py --url http://localhost:8000 --requests 20 --concurrency 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.report import summarize, write_json, load_baseline, change
+from benchmarks.transport import multipart_body, png_bytes
+from test_enhance import create_test_image, create_test_drawing, image_to_base64
+
+ENDPOINTS = ("enhance", "upload")
+STAGE_LINE = re.compile(r'^dreamy_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$')
+
+
+def request_factory(args):
+    """fn(index) -> (path, httpx request kwargs) for the chosen endpoint"""
+    size = (args.size, args.size * 3 // 4)
+    original = create_test_image(size=size, pattern="clouds")
+    drawing = create_test_drawing(size=size, shape="dinosaur")
+    fields = {
+        "description": "dinosaur in clouds",
+        "enhancement_strength": 0.15,
+        "num_inference_steps": args.steps,
+    }
+    if args.mode:
+        fields["mode"] = args.mode
+
+    def seed(index):
+        return index % args.distinct if args.distinct else index
+
+    if args.endpoint == "enhance":
+        original_b64, drawing_b64 = image_to_base64(original), image_to_base64(drawing)
+        return lambda index: ("/enhance", {"json": dict(
+            fields, original_image=original_b64, user_drawing=drawing_b64, seed=seed(index),
+        )})
+
+    files = {"original_image": png_bytes(original), "user_drawing": png_bytes(drawing)}
+
+    def upload(index):
+        body, content_type = multipart_body(dict(fields, seed=seed(index)), files)
+        return "/enhance/upload", {"content": body, "headers": {"Content-Type": content_type}}
+    return upload
+
+
+def in_process_app(args):
+    from app import main as server
+    from benchmarks.stubs import StubEnhancer, StubPipeline
+
+    class EchoLLM:
+        def enhance_prompt(self, description):
+            return description
+
+    pipeline = StubPipeline() if args.step_ms is None else StubPipeline(step_overhead=args.step_ms / 1000, step_per_image=0)
+    server.model_loader.provide(enhancer=StubEnhancer(pipeline=pipeline), llm=EchoLLM())
+    return server.app
+
+
+async def stage_totals(client):
+    """(sum, count) per stage from /metrics; {} if the server has no /metrics"""
+    response = await client.get("/metrics")
+    if response.status_code != 200:
+        return {}
+    totals = {}
+    for line in response.text.splitlines():
+        match = STAGE_LINE.match(line)
+        if match:
+            kind, stage, value = match.groups()
+            totals.setdefault(stage, [0.0, 0.0])[0 if kind == "sum" else 1] = float(value)
+    return totals
+
+
+def stage_means(before, after):
+    """Mean ms per stage observation during the run"""
+    means = {}
+    for stage, (total, count) in after.items():
+        previous_total, previous_count = before.get(stage, (0.0, 0.0))
+        if count > previous_count:
+            means[stage] = (total - previous_total) / (count - previous_count) * 1000
+    return means
+
+
+async def run_load(client, make_request, total, concurrency):
+    """Fire `total` requests from `concurrency` workers; returns (latencies, statuses, wall seconds)"""
+    latencies, statuses = [], Counter()
+    next_index = iter(range(total))
+
+    async def worker():
+        for index in next_index:
+            path, kwargs = make_request(index)
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, **kwargs)
+                await response.aread()
+                statuses[response.status_code] += 1
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def bench(args):
+    import httpx
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        transport = httpx.ASGITransport(app=in_process_app(args))
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout)
+
+    make_request = request_factory(args)
+    async with client:
+        # Warm-up outside the measured run (first request loads models on a real server)
+        await run_load(client, lambda index: make_request(10 ** 6 + index), args.warmup, 1)
+        before = await stage_totals(client)
+        results = []
+        for concurrency in args.concurrency:
+            latencies, statuses, wall = await run_load(
+                client, lambda index: make_request(concurrency * args.requests + index), args.requests, concurrency,
+            )
+            after = await stage_totals(client)
+            results.append(dict(
+                name=f"{args.endpoint}@{concurrency}",
+                endpoint=args.endpoint,
+                concurrency=concurrency,
+                requests=args.requests,
+                ok=len(latencies),
+                statuses={str(status): count for status, count in statuses.items()},
+                throughput_rps=len(latencies) / wall if wall else 0.0,
+                stages_ms=stage_means(before, after),
+                **summarize(latencies),
+            ))
+            before = after
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Target a running server instead of the in-process stub")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="enhance",
+                        help="enhance: JSON/base64, upload: multipart with binary response")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--size", type=int, default=1024, help="Test image width in pixels")
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--mode", help="Enhancement mode (full, roi, tiled); server default if unset")
+    parser.add_argument("--distinct", type=int, default=0, help="Cycle through this many request bodies (0 = all unique)")
+    parser.add_argument("--step-ms", type=float, help="Stub cost per denoising step (default: the stub's own model)")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Earlier --json output to compare against")
+    args = parser.parse_args()
+    baseline = load_baseline(args.baseline, "load")
+
+    results = asyncio.run(bench(args))
+
+    print(f"{'endpoint':>8} {'conc':>5} {'ok':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'vs base':>8}")
+    for result in results:
+        print(f"{result['endpoint']:>8} {result['concurrency']:>5} {result['ok']:>5} "
+              f"{result['throughput_rps']:>8.2f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+              f"{result['p99_ms']:>9.1f} {change(result['p95_ms'], baseline.get(result['name']), 'p95_ms'):>8}")
+        failed = {status: count for status, count in result["statuses"].items() if status != "200"}
+        if failed:
+            print(f"{'':>14} failures: {json.dumps(failed)}")
+        if result["stages_ms"]:
+            print(f"{'':>14} stages: " + ", ".join(
+                f"{stage} {ms:.1f}" for stage, ms in sorted(result["stages_ms"].items())
+            ))
+
+    if args.json:
+        write_json(args.json, "load", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
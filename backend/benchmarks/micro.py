@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for every image_processing function and image decode/encode
+
+Inputs come from test_enhance.py's generators at each size (4:3, like phone
+photos). Each case is timed individually over --repeats runs after a
+warm-up. --json writes the results for later comparison; --baseline shows
+the change against such a file.
+
+Usage:
+    python benchmarks/micro.py
+    python benchmarks/micro.py --sizes 512 2048 --json before.json
+    python benchmarks/micro.py --baseline before.json --filter prepare
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import MAX_IMAGE_SIZE, TARGET_SIZE, ROI_MAX_SIZE, ROI_FEATHER, TILE_OVERLAP
+from app.utils.image_io import decode_base64_image, decode_image_bytes, encode_image, encode_image_to_base64
+from app.utils.image_processing import (
+    fit_size, preprocess_image, prepare_drawing_mask, create_inpaint_mask, prepare_inputs,
+    region_box, prepare_region, blend_region, tile_starts, prepare_tiles, build_tile, blend_tile,
+)
+from benchmarks.report import summarize, write_json, load_baseline, change
+from test_enhance import create_test_image, create_test_drawing, image_to_base64
+
+
+def cases(size):
+    """(name, fn) per benchmarked call, with inputs prepared up front"""
+    shape = (size, size * 3 // 4)
+    original = create_test_image(size=shape, pattern="texture")
+    drawing = create_test_drawing(size=shape, shape="dinosaur")
+    original_b64 = image_to_base64(original)
+    original_png = encode_image(original, "png")
+    target = (TARGET_SIZE, TARGET_SIZE)
+
+    region = prepare_region(original, drawing, max_size=ROI_MAX_SIZE, run_size=TARGET_SIZE)
+    tiled = prepare_tiles(original, drawing, max_size=ROI_MAX_SIZE, tile_size=TARGET_SIZE, overlap=TILE_OVERLAP)
+    box = tiled.boxes[0]
+    tile = build_tile(tiled, box, run_size=TARGET_SIZE, overlap=TILE_OVERLAP, feather=ROI_FEATHER)
+    canvas = tiled.canvas.copy()
+    # Stand-in pipeline outputs: the inputs themselves
+    result = prepare_inputs(original, drawing, max_size=MAX_IMAGE_SIZE, target_size=TARGET_SIZE).image
+
+    return [
+        ("fit_size", lambda: fit_size(shape[0], shape[1], MAX_IMAGE_SIZE)),
+        ("preprocess_image", lambda: preprocess_image(original, MAX_IMAGE_SIZE, TARGET_SIZE)),
+        ("prepare_drawing_mask", lambda: prepare_drawing_mask(drawing, target)),
+        ("create_inpaint_mask", lambda: create_inpaint_mask(drawing, target)),
+        ("prepare_inputs", lambda: prepare_inputs(
+            original, drawing, max_size=MAX_IMAGE_SIZE, target_size=TARGET_SIZE)),
+        ("prepare_inputs_cached", lambda: prepare_inputs(
+            original, drawing, max_size=MAX_IMAGE_SIZE, target_size=TARGET_SIZE, image=result)),
+        ("region_box", lambda: region_box(tiled.mask)),
+        ("prepare_region", lambda: prepare_region(original, drawing, max_size=ROI_MAX_SIZE, run_size=TARGET_SIZE)),
+        ("blend_region", lambda: blend_region(region, region.image)),
+        ("tile_starts", lambda: tile_starts(tiled.canvas.size[0], TARGET_SIZE, TILE_OVERLAP)),
+        ("prepare_tiles", lambda: prepare_tiles(
+            original, drawing, max_size=ROI_MAX_SIZE, tile_size=TARGET_SIZE, overlap=TILE_OVERLAP)),
+        ("build_tile", lambda: build_tile(tiled, box, run_size=TARGET_SIZE, overlap=TILE_OVERLAP, feather=ROI_FEATHER)),
+        ("blend_tile", lambda: blend_tile(canvas, tile, tile.image)),
+        ("decode_base64_image", lambda: decode_base64_image(original_b64)),
+        ("decode_image_bytes", lambda: decode_image_bytes(original_png)),
+        ("encode_image_to_base64", lambda: encode_image_to_base64(result)),
+    ]
+
+
+def measure(fn, repeats):
+    fn()  # warm-up (also sizes scratch buffers)
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return summarize(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--filter", help="Only run cases whose name contains this")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Earlier --json output to compare against")
+    args = parser.parse_args()
+    baseline = load_baseline(args.baseline, "micro")
+
+    results = []
+    print(f"{'case':<24} {'size':>6} {'p50 ms':>9} {'p95 ms':>9} {'vs base':>8}")
+    for size in args.sizes:
+        for name, fn in cases(size):
+            if args.filter and args.filter not in name:
+                continue
+            result = dict(name=f"{name}@{size}", case=name, size=size, **measure(fn, args.repeats))
+            results.append(result)
+            print(f"{name:<24} {size:>6} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} "
+                  f"{change(result['p50_ms'], baseline.get(result['name']), 'p50_ms'):>8}")
+
+    if args.json:
+        write_json(args.json, "micro", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
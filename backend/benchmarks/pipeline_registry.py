@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pipeline registry: resident memory and variant switch cost
+
+"separate" loads the ControlNet img2img and inpaint pipelines with their
+own from_pretrained calls, so every component is held twice. "registry"
+loads each component once and builds both variants from them. Each runs in
+a fresh process; switch cost is the per-image latency when requests
+alternate between img2img and inpaint, against staying on one variant.
+
+Usage:
+    python benchmarks/pipeline_registry.py               # tiny pipeline (downloads ~10MB)
+    python benchmarks/pipeline_registry.py --full        # the real SD 1.5 + ControlNet weights
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import SD_MODEL_ID, CONTROLNET_MODEL_ID
+from app.services.pipeline_registry import PipelineRegistry, RegistryEnhancer, IMG2IMG, INPAINT, module_bytes
+from app.services.runner import EnhanceInputs, run_batch, pipeline_for
+from benchmarks.batching import TINY_SD_MODEL_ID, TINY_CONTROLNET_MODEL_ID
+from benchmarks.stubs import StubEnhancer
+from test_enhance import create_test_image, create_test_drawing
+
+MODES = ("separate", "registry")
+
+
+def load_separate(sd_model_id, controlnet_model_id):
+    from diffusers import (
+        ControlNetModel, StableDiffusionControlNetImg2ImgPipeline, StableDiffusionControlNetInpaintPipeline,
+    )
+    pipelines = []
+    for cls in (StableDiffusionControlNetImg2ImgPipeline, StableDiffusionControlNetInpaintPipeline):
+        pipeline = cls.from_pretrained(
+            sd_model_id,
+            controlnet=ControlNetModel.from_pretrained(controlnet_model_id),
+            safety_checker=None,
+            requires_safety_checker=False,
+        )
+        pipeline.set_progress_bar_config(disable=True)
+        pipelines.append(pipeline)
+    return StubEnhancer(pipeline=pipelines[0], inpaint_pipeline=pipelines[1])
+
+
+def weight_bytes(enhancer) -> int:
+    seen, total = [], 0
+    for pipeline in (enhancer.pipeline, enhancer.inpaint_pipeline):
+        for module in pipeline.components.values():
+            if all(module is not other for other in seen):
+                seen.append(module)
+                total += module_bytes(module)
+    return total
+
+
+def per_image_ms(enhancer, item, variants, steps):
+    start = time.perf_counter()
+    for variant in variants:
+        run_batch(enhancer, [item], prompt_fn=str, num_inference_steps=steps, variant=variant)
+    return (time.perf_counter() - start) / len(variants) * 1000
+
+
+def child(args):
+    """One measured process: load both variants, then run same-variant and alternating requests"""
+    model_ids = (SD_MODEL_ID, CONTROLNET_MODEL_ID) if args.full else (TINY_SD_MODEL_ID, TINY_CONTROLNET_MODEL_ID)
+    start = time.perf_counter()
+    if args.child == "registry":
+        enhancer = RegistryEnhancer(PipelineRegistry(*model_ids))
+    else:
+        enhancer = load_separate(*model_ids)
+    for variant in (IMG2IMG, INPAINT):
+        pipeline_for(enhancer, variant)  # Registry builds variants on first use
+    load_seconds = time.perf_counter() - start
+
+    item = EnhanceInputs(create_test_image(pattern="clouds"), create_test_drawing(shape="dinosaur"),
+                         "dinosaur in clouds", 0.15, seed=0)
+    per_image_ms(enhancer, item, [IMG2IMG, INPAINT], args.steps)  # warm-up
+    same = per_image_ms(enhancer, item, [IMG2IMG] * args.repeats, args.steps)
+    alternating = per_image_ms(enhancer, item, [IMG2IMG, INPAINT] * args.repeats, args.steps)
+    print(json.dumps({
+        "load": load_seconds,
+        "weights_mb": weight_bytes(enhancer) / (1024 * 1024),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "same_ms": same,
+        "alternating_ms": alternating,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--full", action="store_true", help="Use the real model weights instead of the tiny ones")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    print(f"{'mode':>9} {'load s':>7} {'weights MiB':>12} {'max RSS MiB':>12} {'same ms':>8} {'alt ms':>8}")
+    for mode in MODES:
+        command = [sys.executable, __file__, "--child", mode, "--steps", str(args.steps),
+                   "--repeats", str(args.repeats)]
+        if args.full:
+            command.append("--full")
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:>9} {result['load']:>7.1f} {result['weights_mb']:>12.0f} {result['max_rss_mb']:>12.0f} "
+              f"{result['same_ms']:>8.0f} {result['alternating_ms']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark inference precision modes: load time, per-image latency and
+quality against fp32 on a fixed seed corpus
+
+Each mode loads a fresh pipeline (int8 quantizes in place). Outputs are
+compared to the fp32 run of the same input and seed by PSNR; the script
+exits non-zero if any mode falls below --min-psnr, so it can gate changes.
+
+Usage:
+    python benchmarks/precision.py                       # tiny pipeline (downloads ~10MB)
+    python benchmarks/precision.py --full                # the real SD 1.5 + ControlNet weights
+    python benchmarks/precision.py --modes fp32 int8 --channels-last
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import SD_MODEL_ID, CONTROLNET_MODEL_ID
+from app.services.precision import apply_precision, PRECISIONS, FP32
+from app.services.runner import EnhanceInputs, run_batch
+from benchmarks.batching import TINY_SD_MODEL_ID, TINY_CONTROLNET_MODEL_ID
+from benchmarks.stubs import StubEnhancer
+from test_enhance import create_test_image, create_test_drawing
+
+
+def load_enhancer(sd_model_id, controlnet_model_id):
+    import torch
+    from diffusers import StableDiffusionControlNetImg2ImgPipeline, ControlNetModel
+
+    controlnet = ControlNetModel.from_pretrained(controlnet_model_id, torch_dtype=torch.float32)
+    pipeline = StableDiffusionControlNetImg2ImgPipeline.from_pretrained(
+        sd_model_id,
+        controlnet=controlnet,
+        torch_dtype=torch.float32,
+        safety_checker=None,
+        requires_safety_checker=False,
+    )
+    pipeline.set_progress_bar_config(disable=True)
+    return StubEnhancer(pipeline=pipeline)
+
+
+def make_corpus():
+    """Fixed inputs and seeds, so every mode sees exactly the same work"""
+    corpus = []
+    for pattern in ("clouds", "texture"):
+        for shape in ("dinosaur", "circle", "line"):
+            corpus.append(EnhanceInputs(
+                create_test_image(pattern=pattern),
+                create_test_drawing(shape=shape),
+                f"a {shape} in the {pattern}",
+                0.15,
+                seed=len(corpus),
+            ))
+    return corpus
+
+
+def psnr(a, b):
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    mse = np.mean((a - b) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=list(PRECISIONS), choices=PRECISIONS)
+    parser.add_argument("--channels-last", action="store_true")
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--min-psnr", type=float, default=30.0, help="Fail below this PSNR (dB) vs fp32")
+    parser.add_argument("--full", action="store_true", help="Use the real model weights instead of the tiny ones")
+    args = parser.parse_args()
+
+    model_ids = (SD_MODEL_ID, CONTROLNET_MODEL_ID) if args.full else (TINY_SD_MODEL_ID, TINY_CONTROLNET_MODEL_ID)
+    corpus = make_corpus()
+    modes = [FP32] + [mode for mode in args.modes if mode != FP32]
+
+    reference = None
+    failed = False
+    print(f"{'mode':>6} {'active':>7} {'load s':>7} {'ms/image':>9} {'min PSNR':>9} {'mean PSNR':>10}")
+    for mode in modes:
+        start = time.perf_counter()
+        enhancer = load_enhancer(*model_ids)
+        active = apply_precision(enhancer, mode, channels_last=args.channels_last)
+        load_seconds = time.perf_counter() - start
+
+        run_batch(enhancer, corpus[:1], prompt_fn=str, num_inference_steps=args.steps)  # warm-up
+        outputs = []
+        start = time.perf_counter()
+        for item in corpus:
+            outputs.extend(run_batch(enhancer, [item], prompt_fn=str, num_inference_steps=args.steps))
+        ms_per_image = (time.perf_counter() - start) / len(corpus) * 1000
+
+        if reference is None:
+            reference = outputs
+            scores = [float("inf")]
+        else:
+            scores = [psnr(out, ref) for out, ref in zip(outputs, reference)]
+        low = min(scores)
+        failed |= low < args.min_psnr
+        print(f"{mode:>6} {active:>7} {load_seconds:>7.1f} {ms_per_image:>9.0f} {low:>9.1f} "
+              f"{np.mean(scores):>10.1f}")
+        del enhancer
+
+    if failed:
+        print(f"Quality regression: a mode fell below {args.min_psnr} dB PSNR against fp32")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-request preprocessing, before and after the single-stage pipeline
+
+"before" is the original chain: LANCZOS decode cap to 2048, then
+preprocess_image + prepare_drawing_mask + create_inpaint_mask, each
+resizing and grayscaling the drawing on its own.
+"after" is decode (integer reduce) + prepare_inputs.
+
+Peak allocations come from tracemalloc, which sees NumPy/OpenCV arrays but
+not Pillow's internal image buffers; see the RSS column for those.
+
+Usage:
+    python benchmarks/preprocessing.py --sizes 512 1024 3000
+"""
+
+import argparse
+import io
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from PIL import Image
+
+from app.config import MAX_IMAGE_SIZE, TARGET_SIZE
+from app.utils.image_io import decode_image_bytes
+from app.utils.image_processing import (
+    preprocess_image, prepare_drawing_mask, create_inpaint_mask, prepare_inputs,
+)
+from test_enhance import create_test_image, create_test_drawing
+
+
+def legacy_decode(image_data):
+    """decode_base64_image as it was: full decode, then LANCZOS to 2048"""
+    image = Image.open(io.BytesIO(image_data)).convert('RGB')
+    width, height = image.size
+    if width > 2048 or height > 2048:
+        if width > height:
+            new_size = (2048, int(height * (2048 / width)))
+        else:
+            new_size = (int(width * (2048 / height)), 2048)
+        image = image.resize(new_size, Image.LANCZOS)
+    return image
+
+
+def before(original_data, drawing_data):
+    original = legacy_decode(original_data)
+    drawing = legacy_decode(drawing_data)
+    size = (TARGET_SIZE, TARGET_SIZE)
+    preprocess_image(original, MAX_IMAGE_SIZE, TARGET_SIZE)
+    prepare_drawing_mask(drawing, size)
+    create_inpaint_mask(drawing, size)
+
+
+def after(original_data, drawing_data):
+    original = decode_image_bytes(original_data)
+    drawing = decode_image_bytes(drawing_data)
+    prepare_inputs(original, drawing, max_size=MAX_IMAGE_SIZE, target_size=TARGET_SIZE)
+
+
+def png_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def measure(fn, args, repeats):
+    fn(*args)  # warm-up (also sizes the scratch buffers)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(*args)
+    elapsed_ms = (time.perf_counter() - start) / repeats * 1000
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed_ms, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocessing microbenchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048, 3000])
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'variant':>8} {'ms':>9} {'peak KiB':>10} {'max RSS MiB':>12}")
+    for size in args.sizes:
+        shape = (size, size * 3 // 4)  # Phone photos are rarely square
+        original_data = png_bytes(create_test_image(size=shape, pattern="texture"))
+        drawing_data = png_bytes(create_test_drawing(size=shape, shape="dinosaur"))
+        for name, fn in (("before", before), ("after", after)):
+            elapsed_ms, peak = measure(fn, (original_data, drawing_data), args.repeats)
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{size:>6} {name:>8} {elapsed_ms:>9.2f} {peak / 1024:>10.0f} {rss:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark the prompt embedding cache: text encoder time with and without it
+
+Replays a stream of descriptions in which a few come up again and again, as
+they do in practice, and reports per-batch encoding time for a cold encoder
+call against the cache.
+
+Usage:
+    python benchmarks/prompt_embeddings.py               # tiny pipeline (downloads ~10MB)
+    python benchmarks/prompt_embeddings.py --full        # the real SD 1.5 text encoder
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import SD_MODEL_ID, CONTROLNET_MODEL_ID, NEGATIVE_PROMPT
+from app.services.prompt_embeddings import PromptEmbeddings
+from app.services.runner import build_prompt
+from benchmarks.batching import TINY_SD_MODEL_ID, TINY_CONTROLNET_MODEL_ID
+from benchmarks.precision import load_enhancer
+
+DESCRIPTIONS = ["dinosaur", "dragon in the sky", "castle", "a cat", "flowers", "sunset over water",
+                "a rocket", "tree house", "whale", "lighthouse"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--full", action="store_true", help="Use the real model weights instead of the tiny ones")
+    args = parser.parse_args()
+
+    model_ids = (SD_MODEL_ID, CONTROLNET_MODEL_ID) if args.full else (TINY_SD_MODEL_ID, TINY_CONTROLNET_MODEL_ID)
+    pipeline = load_enhancer(*model_ids).pipeline
+    rng = random.Random(0)
+    # Skewed towards the first few descriptions
+    stream = [build_prompt(rng.choices(DESCRIPTIONS, weights=[1 / (i + 1) for i in range(len(DESCRIPTIONS))])[0])
+              for _ in range(args.requests)]
+    batches = [stream[i:i + args.batch_size] for i in range(0, len(stream), args.batch_size)]
+
+    uncached = PromptEmbeddings(max_bytes=0)
+    cached = PromptEmbeddings()
+    cached.precompute(pipeline, NEGATIVE_PROMPT)
+    print(f"{'cache':>6} {'ms/batch':>9} {'hit rate':>9}")
+    for name, embeddings in (("off", uncached), ("on", cached)):
+        start = time.perf_counter()
+        for batch in batches:
+            embeddings.embed(pipeline, batch)
+            embeddings.embed(pipeline, [NEGATIVE_PROMPT] * len(batch))
+        ms = (time.perf_counter() - start) / len(batches) * 1000
+        print(f"{name:>6} {ms:>9.2f} {embeddings.stats()['hit_rate']:>9.2f}")
+    print(f"Cache stats: {cached.stats()}")
+
+
+if __name__ == "__main__":
+    main()
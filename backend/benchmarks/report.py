@@ -0,0 +1,80 @@
+"""
+Dreamy Vision - Benchmark Reports
+Percentiles, JSON result files and comparison against an earlier run
+"""
+
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> float:
+    """q-th percentile (0-100) with linear interpolation between ranks"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(seconds: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    ms = [value * 1000 for value in seconds]
+    return {
+        "mean_ms": sum(ms) / len(ms) if ms else 0.0,
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "min_ms": min(ms) if ms else 0.0,
+        "max_ms": max(ms) if ms else 0.0,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """What a run needs to be compared fairly with another"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_json(path: str, benchmark: str, args: Dict[str, Any], results: List[Dict[str, Any]], **extra):
+    with open(path, "w") as f:
+        json.dump(dict(
+            benchmark=benchmark, environment=environment(), args=args, results=results, **extra,
+        ), f, indent=2)
+    print(f"Wrote {path}")
+
+
+def load_baseline(path: Optional[str], benchmark: str) -> Dict[str, Dict[str, Any]]:
+    """Results of an earlier run by name ({} without a path)"""
+    if not path:
+        return {}
+    with open(path) as f:
+        report = json.load(f)
+    if report.get("benchmark") != benchmark:
+        raise SystemExit(f"{path} is a {report.get('benchmark')} report, not {benchmark}")
+    return {result["name"]: result for result in report["results"]}
+
+
+def change(current: float, baseline: Optional[Dict[str, Any]], key: str) -> str:
+    """Relative change against the baseline, e.g. '-12%' (blank without one)"""
+    if not baseline or not baseline.get(key):
+        return ""
+    return f"{(current - baseline[key]) / baseline[key]:+.0%}"
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark region-of-interest and tiled modes: latency against drawing coverage
+
+Draws circles of increasing size on the test pattern and enhances each one
+in full-frame, ROI and tiled mode. ROI latency should follow the tile's
+share of the canvas and tiled latency the number of tiles touched;
+full-frame latency stays flat (but works at 512px only).
+
+Usage:
+    python benchmarks/roi.py                    # stub pipeline (cost scales with pixels)
+    python benchmarks/roi.py --tiny             # tiny real pipeline (downloads ~10MB)
+    python benchmarks/roi.py --original-size 2048  # more tiles
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import ROI_MAX_SIZE, NUM_INFERENCE_STEPS
+from app.config import TARGET_SIZE, TILE_OVERLAP
+from app.services.runner import EnhanceInputs, run_batch, FULL_MODE, ROI_MODE, TILED_MODE
+from app.utils.image_processing import prepare_region, prepare_tiles
+from benchmarks.batching import load_tiny_enhancer
+from benchmarks.stubs import StubEnhancer, StubPipeline
+from test_enhance import create_test_image
+
+
+def circle_drawing(size, radius_fraction):
+    """White circle outline on black, centred off-centre like a real sketch"""
+    width, height = size
+    radius = int(min(width, height) * radius_fraction)
+    cx, cy = int(width * 0.4), int(height * 0.45)
+    drawing = Image.new('RGB', size, color='black')
+    ImageDraw.Draw(drawing).ellipse(
+        [cx - radius, cy - radius, cx + radius, cy + radius], outline='white', width=max(3, width // 150)
+    )
+    return drawing
+
+
+def timed(enhancer, item, mode, steps, repeats):
+    run_batch(enhancer, [item], prompt_fn=str, num_inference_steps=steps, mode=mode)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        run_batch(enhancer, [item], prompt_fn=str, num_inference_steps=steps, mode=mode)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--original-size", type=int, default=1024)
+    parser.add_argument("--radii", type=float, nargs="+", default=[0.05, 0.1, 0.2, 0.3, 0.45])
+    parser.add_argument("--steps", type=int, default=NUM_INFERENCE_STEPS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tiny", action="store_true", help="Use a tiny real diffusers pipeline")
+    args = parser.parse_args()
+
+    # A pricier per-pixel stub so diffusion dominates, as it does on real hardware
+    enhancer = load_tiny_enhancer() if args.tiny else StubEnhancer(StubPipeline(0.002, 0.05))
+    size = (args.original_size, args.original_size)
+    original = create_test_image(size=size, pattern="clouds")
+
+    print(f"Original {size[0]}x{size[1]}, {args.steps} steps, strength 0.15")
+    print(f"{'radius':>7} {'coverage':>9} {'tile':>11} {'tiles':>6} "
+          f"{'full ms':>8} {'roi ms':>8} {'tiled ms':>9}")
+    for radius in args.radii:
+        drawing = circle_drawing(size, radius)
+        item = EnhanceInputs(original, drawing, "a circle", 0.15, seed=0)
+        region = prepare_region(original, drawing, max_size=ROI_MAX_SIZE)
+        tiled = prepare_tiles(original, drawing, max_size=ROI_MAX_SIZE, tile_size=TARGET_SIZE, overlap=TILE_OVERLAP)
+        full_ms = timed(enhancer, item, FULL_MODE, args.steps, args.repeats)
+        roi_ms = timed(enhancer, item, ROI_MODE, args.steps, args.repeats)
+        tiled_ms = timed(enhancer, item, TILED_MODE, args.steps, args.repeats)
+        tile = f"{region.image.size[0]}x{region.image.size[1]}"
+        tiles = f"{len(tiled.boxes)}/{tiled.grid_tiles}"
+        print(f"{radius:>7.2f} {region.coverage:>8.0%} {tile:>11} {tiles:>6} "
+              f"{full_ms:>8.0f} {roi_ms:>8.0f} {tiled_ms:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark step planning: predicted vs measured latency per tier and budget
+
+Each plan is run through the pipeline runner, which feeds the measured
+step and fixed costs back into the planner, so later predictions use
+this host's numbers instead of the per-device priors.
+
+Usage:
+    python benchmarks/step_planner.py                   # stub pipeline
+    python benchmarks/step_planner.py --tiny            # tiny real pipeline (downloads ~10MB)
+    python benchmarks/step_planner.py --budgets 500 2000 8000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.runner import EnhanceInputs, run_batch, clamp_strength
+from app.services.step_planner import plan_steps, step_costs, TIERS
+from benchmarks.batching import load_tiny_enhancer
+from benchmarks.stubs import StubEnhancer
+from test_enhance import create_test_image, create_test_drawing
+
+
+def run_plan(enhancer, item, plan):
+    start = time.perf_counter()
+    run_batch(
+        enhancer, [item], prompt_fn=str,
+        num_inference_steps=plan.num_inference_steps,
+        strength=plan.strength,
+        scheduler=plan.scheduler,
+        resolution=plan.resolution,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--strength", type=float, default=0.12)
+    parser.add_argument("--budgets", type=float, nargs="+", default=[200, 1000, 5000, 20000])
+    parser.add_argument("--calibration-runs", type=int, default=3)
+    parser.add_argument("--tiny", action="store_true", help="Use a tiny real diffusers pipeline")
+    args = parser.parse_args()
+
+    enhancer = load_tiny_enhancer() if args.tiny else StubEnhancer()
+    strength = clamp_strength(args.strength)
+    item = EnhanceInputs(create_test_image(pattern="clouds"), create_test_drawing(shape="dinosaur"),
+                         "dinosaur in clouds", strength, seed=0)
+
+    print(f"Priors: {step_costs.to_dict()}")
+    for _ in range(args.calibration_runs):
+        run_plan(enhancer, item, plan_steps(strength, quality="balanced"))
+    print(f"Calibrated: {step_costs.to_dict()}")
+    print()
+
+    plans = [plan_steps(strength, quality=tier) for tier in TIERS]
+    plans += [plan_steps(strength, budget_ms=budget) for budget in args.budgets]
+    print(f"{'tier':>9} {'budget':>7} {'sched':>6} {'steps':>6} {'denoise':>8} {'res':>5} "
+          f"{'est ms':>8} {'real ms':>8}")
+    for plan in plans:
+        measured = run_plan(enhancer, item, plan)
+        budget = str(plan.budget_ms) if plan.budget_ms is not None else "-"
+        print(f"{plan.tier:>9} {budget:>7} {plan.scheduler:>6} {plan.num_inference_steps:>6} "
+              f"{plan.denoising_steps:>8} {plan.resolution:>5} {plan.estimated_ms:>8} {measured:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Dreamy Vision - Benchmark Stubs
+Stand-ins for the diffusion pipelines so benchmarks run without model weights
+"""
+
+import time
+from types import SimpleNamespace
+
+from app.services.runner import EnhanceInputs, run_batch
+
+
+class StubPipeline:
+    """
+    Diffusers-shaped pipeline with a simple cost model
+
+    Each denoising step costs `step_overhead + step_per_image * batch` seconds
+    for 512x512 inputs, which is roughly how a real UNet behaves: fixed
+    per-call work (Python, kernel launches, scheduler) plus work proportional
+    to the batch. The per-image part scales with pixel count.
+    Only `strength * num_inference_steps` steps run, as in img2img.
+    """
+
+    def __init__(self, step_overhead: float = 0.004, step_per_image: float = 0.006):
+        self.step_overhead = step_overhead
+        self.step_per_image = step_per_image
+        self.calls = 0
+
+    def __call__(self, prompt, image, num_inference_steps=30, strength=1.0,
+                 callback=None, callback_steps=1, **kwargs):
+        images = image if isinstance(image, list) else [image]
+        batch = len(images)
+        pixels = images[0].size[0] * images[0].size[1] / (512 * 512)
+        steps = max(1, int(num_inference_steps * strength))
+        self.calls += 1
+        for step in range(steps):
+            time.sleep(self.step_overhead + self.step_per_image * batch * pixels)
+            if callback is not None and step % callback_steps == 0:
+                callback(step, 0, None)
+        return SimpleNamespace(images=[img.copy() for img in images])
+
+
+class StubEnhancer:
+    """ImageEnhancer stand-in exposing the attributes the runner uses"""
+
+    def __init__(self, pipeline=None, inpaint_pipeline=None):
+        self.pipeline = pipeline if pipeline is not None else StubPipeline()
+        self.inpaint_pipeline = inpaint_pipeline
+        self.use_inpainting = inpaint_pipeline is not None
+
+    def enhance(self, original_image, user_drawing, description, enhancement_strength):
+        item = EnhanceInputs(original_image, user_drawing, description, enhancement_strength)
+        return run_batch(self, [item], prompt_fn=lambda text: text)[0]
+
+
+class CpuStubPipeline(StubPipeline):
+    """
+    Stub pipeline that does real CPU work against a large weight tensor
+
+    Each step multiplies the batch's activations by `weights`, so step time
+    responds to torch thread counts and the weights show up in process
+    memory like real model weights do.
+    """
+
+    def __init__(self, weights_mb: int = 512, tokens_per_image: int = 256):
+        import torch
+        super().__init__()
+        width = int((weights_mb * 1024 * 1024 / 4) ** 0.5)
+        self.weights = torch.randn(width, width)
+        self.tokens_per_image = tokens_per_image
+
+    def __call__(self, prompt, image, num_inference_steps=30, strength=1.0,
+                 callback=None, callback_steps=1, **kwargs):
+        import torch
+        images = image if isinstance(image, list) else [image]
+        steps = max(1, int(num_inference_steps * strength))
+        activations = torch.randn(len(images) * self.tokens_per_image, self.weights.shape[0])
+        self.calls += 1
+        with torch.no_grad():
+            for step in range(steps):
+                activations = torch.tanh(activations @ self.weights)
+                if callback is not None and step % callback_steps == 0:
+                    callback(step, 0, None)
+        return SimpleNamespace(images=[img.copy() for img in images])
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Compare base64-in-JSON against multipart upload / raw image responses
+
+Reports request and response payload sizes and the server-side decode and
+encode cost for each transport. With --e2e it also measures full request
+latency in-process against a stub enhancer (no model download).
+
+Usage:
+    python benchmarks/transport.py
+    python benchmarks/transport.py --size 2048 --e2e
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.utils.image_io import decode_base64_image, decode_image_bytes, encode_image, encode_image_to_base64
+from test_enhance import create_test_image, create_test_drawing, image_to_base64
+
+
+def timed(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def multipart_body(fields, files):
+    """Build a multipart/form-data body the way a browser FormData would"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, data in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{name}.png"\r\n'
+            f'Content-Type: image/png\r\n\r\n'.encode() + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def png_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON/base64 and binary image transport")
+    parser.add_argument("--size", type=int, default=1024, help="Test image edge length in pixels")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--e2e", action="store_true", help="Also time full requests in-process (needs httpx)")
+    args = parser.parse_args()
+
+    size = (args.size, args.size)
+    original = create_test_image(size=size, pattern="texture")
+    drawing = create_test_drawing(size=size, shape="dinosaur")
+    original_png, drawing_png = png_bytes(original), png_bytes(drawing)
+    result = original.resize((512, 512))
+
+    fields = {"description": "dinosaur in clouds", "enhancement_strength": "0.15"}
+    json_body = json.dumps(dict(
+        original_image=image_to_base64(original),
+        user_drawing=image_to_base64(drawing),
+        **fields,
+    )).encode()
+    form_body, form_type = multipart_body(fields, {"original_image": original_png, "user_drawing": drawing_png})
+    json_response = json.dumps({"enhanced_image": encode_image_to_base64(result), "processing_time": 0.0}).encode()
+
+    print("=" * 60)
+    print(f"Payload sizes ({args.size}x{args.size} original)")
+    print("=" * 60)
+    print(f"request  JSON/base64: {len(json_body):>10,} bytes")
+    print(f"request  multipart:   {len(form_body):>10,} bytes ({len(form_body) / len(json_body):.0%})")
+    print(f"response JSON/base64: {len(json_response):>10,} bytes")
+    for output_format in ("png", "webp"):
+        data = encode_image(result, output_format)
+        print(f"response {output_format:<12} {len(data):>10,} bytes ({len(data) / len(json_response):.0%})")
+    print()
+
+    original_b64 = image_to_base64(original)
+    print("=" * 60)
+    print("Server-side cost per request (ms)")
+    print("=" * 60)
+    print(f"decode base64 original: {timed(lambda: decode_base64_image(original_b64), args.repeats):>8.2f}")
+    print(f"decode bytes original:  {timed(lambda: decode_image_bytes(original_png), args.repeats):>8.2f}")
+    print(f"encode PNG + base64:    {timed(lambda: encode_image_to_base64(result), args.repeats):>8.2f}")
+    print(f"encode PNG bytes:       {timed(lambda: encode_image(result, 'png'), args.repeats):>8.2f}")
+    print(f"encode WebP bytes:      {timed(lambda: encode_image(result, 'webp'), args.repeats):>8.2f}")
+    print()
+
+    if args.e2e:
+        bench_e2e(json_body, form_body, form_type, args.repeats)
+
+
+def bench_e2e(json_body, form_body, form_type, repeats):
+    from fastapi.testclient import TestClient
+    from app import main as server
+    from benchmarks.stubs import StubEnhancer, StubPipeline
+
+    class EchoLLM:
+        def enhance_prompt(self, description):
+            return description
+
+    server.model_loader.provide(
+        enhancer=StubEnhancer(pipeline=StubPipeline(step_overhead=0, step_per_image=0)),
+        llm=EchoLLM(),
+    )
+
+    with TestClient(server.app) as client:
+        def post_json():
+            response = client.post("/enhance", content=json_body, headers={"Content-Type": "application/json"})
+            base64.b64decode(response.json()["enhanced_image"])
+
+        def post_form():
+            response = client.post("/enhance/upload", content=form_body, headers={"Content-Type": form_type})
+            response.read()
+
+        post_json(), post_form()  # warm-up
+        print("=" * 60)
+        print("End-to-end latency with a zero-cost stub pipeline (ms)")
+        print("=" * 60)
+        print(f"POST /enhance (JSON):         {timed(post_json, repeats):>8.2f}")
+        print(f"POST /enhance/upload (bytes): {timed(post_form, repeats):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark the fork-after-load worker pool: throughput and memory vs worker count
+
+Uses a CPU stub pipeline that holds a large weight tensor and does real
+matmuls per step, so both core usage and weight sharing are visible.
+Memory is reported as the summed RSS of all processes (double-counts shared
+pages) and the summed PSS (splits shared pages fairly - the real footprint).
+
+Usage:
+    python benchmarks/worker_pool.py --workers 1 2 4 --weights-mb 1024
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import TARGET_SIZE
+from app.services.runner import EnhanceInputs, FULL_MODE
+from app.services.step_planner import DEFAULT_SCHEDULER
+from app.services.worker_pool import WorkerPool
+from benchmarks.stubs import StubEnhancer, CpuStubPipeline
+from test_enhance import create_test_image, create_test_drawing
+
+
+def memory_kib(pid, field):
+    """Read Rss or Pss (KiB) from /proc/<pid>/smaps_rollup"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def pool_memory_mib():
+    pids = [os.getpid()] + [child.pid for child in multiprocessing.active_children()]
+    rss = sum(memory_kib(pid, "Rss") for pid in pids) / 1024
+    pss = sum(memory_kib(pid, "Pss") for pid in pids) / 1024
+    return rss, pss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker pool throughput and memory benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--weights-mb", type=int, default=512)
+    args = parser.parse_args()
+
+    original = create_test_image(pattern="clouds")
+    drawing = create_test_drawing(shape="dinosaur")
+    key = (args.steps, 7.5, 0.5, DEFAULT_SCHEDULER, TARGET_SIZE, FULL_MODE, None)
+
+    print(f"{'workers':>8} {'threads':>8} {'images/s':>9} {'RSS MiB':>9} {'PSS MiB':>9}")
+    for processes in args.workers:
+        pool = WorkerPool(lambda: StubEnhancer(CpuStubPipeline(args.weights_mb)), processes)
+        pool.start()
+        # Warm every worker once
+        with ThreadPoolExecutor(max_workers=processes) as threads:
+            list(threads.map(
+                lambda _: pool.run_batch(key, [EnhanceInputs(original, drawing, "warm-up", 0.5)], str),
+                range(processes),
+            ))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=processes) as threads:
+            list(threads.map(
+                lambda i: pool.run_batch(key, [EnhanceInputs(original, drawing, "dinosaur", 0.5, seed=i)], str),
+                range(args.requests),
+            ))
+        elapsed = time.perf_counter() - start
+        rss, pss = pool_memory_mib()
+        threads_per_worker = max(1, len(os.sched_getaffinity(0)) // processes)
+        print(f"{processes:>8} {threads_per_worker:>8} {args.requests / elapsed:>9.2f} {rss:>9.0f} {pss:>9.0f}")
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+# test_enhance.py and test_llm.py are scripts that talk to a running server
+# and a live LLM; run them directly, not under pytest
+collect_ignore = ["test_enhance.py", "test_llm.py"]
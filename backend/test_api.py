@@ -0,0 +1,335 @@
+"""
+Tests for the HTTP endpoints, with stub pipelines and a canned LLM
+
+Needs the full server environment (app.models and its model packages);
+skipped where app.main can't be imported.
+"""
+
+import base64
+import io
+import json
+import time
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+main = pytest.importorskip("app.main")
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.services.llm_cache import CachedLLMService
+from benchmarks.stubs import StubEnhancer
+
+
+class CannedLLM:
+    model = "canned"
+
+    def enhance_prompt(self, description):
+        return f"{description}, detailed"
+
+    def generate_hints(self, description, num_hints=3):
+        return [f"{description} {i}" for i in range(num_hints)]
+
+    def understand_description(self, description):
+        return {"subject": description}
+
+
+def png(size=(64, 64), color=(50, 100, 150), square=None):
+    """PNG bytes of a flat image, with an optional white square (left, top, right, bottom)"""
+    image = Image.new('RGB', size, color)
+    if square is not None:
+        image.paste((255, 255, 255), square)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def data_url(data):
+    return "data:image/png;base64," + base64.b64encode(data).decode()
+
+
+def enhance_body(**fields):
+    body = dict(
+        original_image=data_url(png()),
+        user_drawing=data_url(png(color=(0, 0, 0), square=(16, 16, 48, 48))),
+        description="a dinosaur",
+    )
+    body.update(fields)
+    return body
+
+
+@pytest.fixture(scope="module")
+def client():
+    main.model_loader.provide(enhancer=StubEnhancer(), llm=CachedLLMService(CannedLLM(), backend="ollama"))
+    with TestClient(main.app) as client:
+        yield client
+
+
+def sse_events(text):
+    """(event, data) pairs from a Server-Sent Events body"""
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed", "cancelled"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_queued_job_can_be_polled_and_fetched(client):
+    response = client.post("/jobs/enhance", json=enhance_body(description="a queued dinosaur"))
+    assert response.status_code == 202
+    job = wait_for_job(client, response.json()["id"])
+    assert job["status"] == "done" and job["progress"] == 1.0
+
+    result = client.get(f"/jobs/{job['id']}/result")
+    assert result.status_code == 200
+    assert result.headers["content-type"] == "image/png"
+    assert Image.open(io.BytesIO(result.content)).size == (512, 512)
+
+
+def test_unknown_jobs_are_404(client):
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.get("/jobs/missing/result").status_code == 404
+    assert client.delete("/jobs/missing").status_code == 404
+
+
+def test_cancelling_a_finished_job_leaves_it_done(client):
+    job_id = client.post("/jobs/enhance", json=enhance_body(description="a finished dinosaur")).json()["id"]
+    wait_for_job(client, job_id)
+    assert client.delete(f"/jobs/{job_id}").json()["status"] == "done"
+
+
+def test_stream_reports_progress_then_the_result(client):
+    response = client.post("/enhance/stream", json=enhance_body(description="a streamed dinosaur"))
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    names = [event for event, _ in events]
+    assert names[0] == "queued" and names[-1] == "result"
+    progress = [data for event, data in events if event == "progress"]
+    assert progress and progress[-1]["step"] == progress[-1]["total"]
+    result = events[-1][1]
+    assert Image.open(io.BytesIO(base64.b64decode(result["enhanced_image"]))).size == (512, 512)
+    assert result["media_type"] == "image/png"
+
+
+def test_stream_reports_failures_as_an_error_event(client):
+    events = sse_events(client.post("/enhance/stream", json=enhance_body(original_image="bm90IGFuIGltYWdl")).text)
+    assert [event for event, _ in events] == ["queued", "error"]
+
+
+def upload(client, data):
+    return client.post("/images", files={"image": ("image.png", data, "image/png")})
+
+
+def test_uploaded_images_are_used_by_id(client):
+    original = upload(client, png(size=(96, 64)))
+    assert original.status_code == 200
+    assert (original.json()["width"], original.json()["height"]) == (96, 64)
+    assert upload(client, png(size=(96, 64))).json()["image_id"] == original.json()["image_id"]
+    drawing = upload(client, png(size=(96, 64), color=(0, 0, 0), square=(16, 16, 48, 48))).json()
+
+    response = client.post("/enhance", json=dict(
+        description="a stored dinosaur", image_id=original.json()["image_id"], drawing_id=drawing["image_id"],
+    ))
+    assert response.status_code == 200
+    assert response.json()["image_id"] == original.json()["image_id"]
+
+
+def test_inline_originals_get_an_id_for_the_next_request(client):
+    first = client.post("/enhance", json=enhance_body(description="an inline dinosaur")).json()
+    again = client.post("/enhance", json=enhance_body(
+        description="an inline dinosaur, again", original_image=None, image_id=first["image_id"],
+    ))
+    assert again.status_code == 200
+
+
+def test_missing_and_unknown_images(client):
+    assert client.post("/enhance", json=enhance_body(original_image=None)).status_code == 400
+    assert client.post("/enhance", json=enhance_body(original_image=None, image_id="0" * 64)).status_code == 404
+    assert upload(client, b"not an image").status_code == 400
+
+
+@pytest.mark.parametrize("output_format, media_type, image_format", [
+    (None, "image/png", "PNG"), ("webp", "image/webp", "WEBP"), ("jpeg", "image/jpeg", "JPEG"),
+])
+def test_enhance_streams_a_json_body_of_the_declared_length(client, output_format, media_type, image_format):
+    response = client.post("/enhance", json=enhance_body(
+        description=f"a dinosaur as {output_format}", output_format=output_format,
+    ))
+    assert response.status_code == 200
+    assert int(response.headers["content-length"]) == len(response.content)
+    body = response.json()
+    assert body["media_type"] == media_type
+    assert Image.open(io.BytesIO(base64.b64decode(body["enhanced_image"]))).format == image_format
+
+
+@pytest.mark.parametrize("fields", [dict(output_format="gif"), dict(output_quality=0), dict(png_compress_level=10)])
+def test_bad_output_settings_are_400(client, fields):
+    assert client.post("/enhance", json=enhance_body(**fields)).status_code == 400
+
+
+def test_upload_endpoint_returns_image_bytes(client):
+    response = client.post(
+        "/enhance/upload",
+        files={
+            "original_image": ("original.png", png(), "image/png"),
+            "user_drawing": ("drawing.png", png(color=(0, 0, 0), square=(16, 16, 48, 48)), "image/png"),
+        },
+        data={"description": "an uploaded dinosaur"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert Image.open(io.BytesIO(response.content)).size == (512, 512)
+    assert json.loads(response.headers["x-step-plan"])["num_inference_steps"] > 0
+    assert response.headers["x-image-id"]
+
+
+def test_upload_endpoint_needs_an_original(client):
+    response = client.post(
+        "/enhance/upload",
+        files={"user_drawing": ("drawing.png", png(), "image/png")},
+        data={"description": "a dinosaur"},
+    )
+    assert response.status_code == 400
+
+
+def test_ready_once_the_pipeline_and_llm_are_loaded(client):
+    response = client.get("/ready")
+    assert response.status_code == 200
+    status = response.json()
+    assert status["ready"] is True
+    assert status["components"]["img2img"]["status"] == "ready"
+    assert status["components"]["llm"]["status"] == "ready"
+
+
+def test_repeated_requests_are_answered_from_the_result_cache(client):
+    body = enhance_body(description="a cached dinosaur")
+    first = client.post("/enhance", json=body).json()
+    hits = client.get("/cache/stats").json()["hits"]
+    again = client.post("/enhance", json=body).json()
+    stats = client.get("/cache/stats").json()
+    assert stats["hits"] == hits + 1
+    assert again["enhanced_image"] == first["enhanced_image"]
+    assert {"llm", "prompt_embeddings", "originals", "images"} <= set(stats)
+
+
+def test_trace_header_adds_a_server_timing_breakdown(client):
+    response = client.post("/enhance", json=enhance_body(description="a traced dinosaur"), headers={"X-Trace": "1"})
+    stages = [part.split(";")[0] for part in response.headers["server-timing"].split(", ")]
+    assert {"queue", "decode", "denoise", "total"} <= set(stages)
+    assert "server-timing" not in client.post("/enhance", json=enhance_body(description="an untraced dinosaur")).headers
+
+
+def test_metrics_are_in_prometheus_text_format(client):
+    client.post("/enhance", json=enhance_body(description="a measured dinosaur"))
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'dreamy_stage_seconds_count{stage="denoise"}' in text
+    assert "dreamy_queue_depth " in text and 'dreamy_cache_hit_rate{cache="results"}' in text
+
+
+def test_requests_past_their_deadline_are_504(client):
+    response = client.post("/enhance", json=enhance_body(description="a late dinosaur", deadline_ms=1))
+    assert response.status_code == 504
+    response = client.post(
+        "/enhance", json=enhance_body(description="a late dinosaur"), headers={"X-Deadline-Ms": "1"},
+    )
+    assert response.status_code == 504
+
+
+def test_deadline_header_must_be_an_integer(client):
+    response = client.post("/enhance", json=enhance_body(), headers={"X-Deadline-Ms": "soon"})
+    assert response.status_code == 400
+
+
+def test_quality_tier_decides_the_plan(client):
+    plan = client.post("/enhance", json=enhance_body(description="a fast dinosaur", quality="fast")).json()["plan"]
+    assert plan["tier"] == "fast"
+
+
+@pytest.mark.parametrize("fields", [dict(quality="ultra"), dict(latency_budget_ms=0)])
+def test_invalid_plans_are_400(client, fields):
+    assert client.post("/enhance", json=enhance_body(**fields)).status_code == 400
+
+
+@pytest.mark.parametrize("mode", ["roi", "tiled"])
+def test_region_modes_return_the_original_at_its_own_size(client, mode):
+    response = client.post("/enhance", json=enhance_body(
+        description=f"a {mode} dinosaur", mode=mode,
+        original_image=data_url(png(size=(960, 640))),
+        user_drawing=data_url(png(size=(960, 640), color=(0, 0, 0), square=(100, 100, 160, 160))),
+    ))
+    assert response.status_code == 200
+    body = response.json()
+    assert body["plan"]["mode"] == mode
+    assert Image.open(io.BytesIO(base64.b64decode(body["enhanced_image"]))).size == (960, 640)
+
+
+def test_unknown_modes_are_400(client):
+    assert client.post("/enhance", json=enhance_body(mode="everything")).status_code == 400
+
+
+def batch_body(**fields):
+    drawing = data_url(png(color=(0, 0, 0), square=(16, 16, 48, 48)))
+    body = dict(
+        original_image=data_url(png()),
+        variants=[
+            dict(description="a batch dragon", user_drawing=drawing),
+            dict(description="a batch whale", user_drawing=drawing, enhancement_strength=0.5),
+            dict(description="a batch ship", user_drawing=drawing),
+        ],
+    )
+    body.update(fields)
+    return body
+
+
+def test_batch_returns_every_variant_in_order(client):
+    response = client.post("/enhance/batch", json=batch_body())
+    assert response.status_code == 200
+    body = response.json()
+    assert [result["index"] for result in body["results"]] == [0, 1, 2]
+    assert body["image_id"]
+    for result in body["results"]:
+        assert Image.open(io.BytesIO(base64.b64decode(result["enhanced_image"]))).size == (512, 512)
+
+
+def test_batch_stream_sends_one_result_per_variant(client):
+    events = sse_events(client.post("/enhance/batch", json=batch_body(stream=True)).text)
+    names = [event for event, _ in events]
+    assert names[0] == "queued" and names[-1] == "done"
+    assert sorted(data["index"] for event, data in events if event == "result") == [0, 1, 2]
+
+
+def test_batch_needs_variants(client):
+    assert client.post("/enhance/batch", json=batch_body(variants=[])).status_code == 400
+
+
+def test_hint_returns_hints_and_an_enhanced_prompt(client):
+    response = client.post("/hint", json=dict(description="a hint cloud", num_hints=2))
+    assert response.status_code == 200
+    assert response.json() == dict(
+        hints=["a hint cloud 0", "a hint cloud 1"], enhanced_prompt="a hint cloud, detailed",
+    )
+
+
+def test_hint_stream_sends_hints_then_the_prompt(client):
+    response = client.post("/hint", json=dict(description="a streamed cloud", num_hints=3, stream=True))
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    assert [event for event, _ in events] == ["hint", "hint", "hint", "prompt", "done"]
+    assert [data["hint"] for event, data in events if event == "hint"] == [f"a streamed cloud {i}" for i in range(3)]
+    assert events[3][1] == {"enhanced_prompt": "a streamed cloud, detailed"}
+    assert events[4][1] == {"hints": 3}
@@ -0,0 +1,79 @@
+"""
+Tests for micro-batching of concurrent enhancement requests
+"""
+
+import threading
+
+import pytest
+
+from app.services.batching import MicroBatcher
+
+
+def submit_all(batcher, submissions):
+    """Submit (key, item) pairs from one thread each; returns results (or exceptions) in order"""
+    results = [None] * len(submissions)
+
+    def submit(index, key, item):
+        try:
+            results[index] = batcher.submit(key, item)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=submit, args=(i, key, item)) for i, (key, item) in enumerate(submissions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_groups_requests_by_key():
+    calls = []
+    lock = threading.Lock()
+
+    def run(key, items):
+        with lock:
+            calls.append((key, sorted(items)))
+        return [f"{key}:{item}" for item in items]
+
+    batcher = MicroBatcher(run, max_batch_size=8, max_wait=0.5)
+    results = submit_all(batcher, [("a", 1), ("b", 2), ("a", 3), ("b", 4)])
+    assert results == ["a:1", "b:2", "a:3", "b:4"]
+    assert sorted(calls) == [("a", [1, 3]), ("b", [2, 4])]
+    assert batcher.stats()["batch_sizes"] == {2: 2}
+
+
+def test_full_batch_runs_without_waiting():
+    batcher = MicroBatcher(lambda key, items: items, max_batch_size=2, max_wait=30)
+    assert submit_all(batcher, [("k", 1), ("k", 2)]) == [1, 2]
+
+
+def test_lone_request_runs_after_max_wait():
+    batcher = MicroBatcher(lambda key, items: [item * 2 for item in items], max_wait=0.01)
+    assert batcher.submit("k", 21) == 42
+    assert batcher.stats()["mean_batch_size"] == 1.0
+
+
+def test_per_item_errors_reach_only_their_caller():
+    def run(key, items):
+        return [ValueError(item) if item == "bad" else item for item in items]
+
+    batcher = MicroBatcher(run, max_batch_size=3, max_wait=0.5)
+    results = submit_all(batcher, [("k", "ok"), ("k", "bad"), ("k", "fine")])
+    assert results[0] == "ok" and results[2] == "fine"
+    assert isinstance(results[1], ValueError)
+
+
+def test_batch_error_reaches_every_caller():
+    def run(key, items):
+        raise RuntimeError("pipeline failed")
+
+    batcher = MicroBatcher(run, max_batch_size=2, max_wait=0.5)
+    results = submit_all(batcher, [("k", 1), ("k", 2)])
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_error_raised_directly_for_a_single_request():
+    batcher = MicroBatcher(lambda key, items: [KeyError("missing")], max_wait=0)
+    with pytest.raises(KeyError):
+        batcher.submit("k", 1)
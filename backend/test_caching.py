@@ -0,0 +1,150 @@
+"""
+Tests for the caching utilities and run controls shared by coalesced requests
+"""
+
+import threading
+import time
+
+import pytest
+
+from app.services.run_control import RunCancelled, RunControl, SharedControl
+from app.utils.caching import LRUCache, SingleFlight
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_lru_bounds_total_size():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    cache.put("c", "xxxx")
+    assert "a" not in cache
+    assert cache.nbytes == 8
+
+
+def test_lru_skips_values_larger_than_the_budget():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("big", "x" * 11)
+    assert "big" not in cache
+    assert cache.get("a") == "xxxx"
+
+
+def test_lru_replacing_a_key_updates_its_size():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("a", "xx")
+    assert cache.nbytes == 2 and len(cache) == 1
+
+
+def test_lru_expires_entries_after_ttl():
+    cache = LRUCache(ttl=60)
+    cache.put("old", 1, created_at=time.time() - 61)
+    cache.put("new", 2)
+    assert cache.get("old") is None
+    assert cache.get("new") == 2
+    assert [key for key, _, _ in cache.items()] == ["new"]
+
+
+def test_lru_counts_hits_and_misses():
+    cache = LRUCache()
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a", count=False)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_single_flight_runs_concurrent_calls_once():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while flight.coalesced < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+
+
+def test_single_flight_shares_errors_and_forgets_the_call():
+    flight = SingleFlight()
+
+    def fail():
+        raise KeyError("boom")
+
+    with pytest.raises(KeyError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: "again") == "again"
+
+
+def test_single_flight_waiter_stops_on_its_own_check():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        release.wait(5)
+        return "result"
+
+    leader = threading.Thread(target=flight.do, args=("k", work))
+    leader.start()
+    started.wait(5)
+    control = RunControl(deadline=time.monotonic() + 0.1)
+    with pytest.raises(RunCancelled):
+        flight.do("k", work, check=control.check)
+    release.set()
+    leader.join(5)
+
+
+def test_shared_control_cancels_only_when_every_member_has():
+    first, second = RunControl(), RunControl()
+    shared = SharedControl().join(first).join(second)
+    first.cancel("client disconnected")
+    assert not shared.cancelled
+    second.cancel()
+    assert shared.cancelled
+    assert shared.cancel_reason == "client disconnected"
+
+
+def test_shared_control_deadline_is_the_latest_member_deadline():
+    shared = SharedControl().join(RunControl(deadline=10.0)).join(RunControl(deadline=20.0))
+    assert shared.deadline == 20.0
+    shared.join(RunControl())
+    assert shared.deadline is None
+
+
+def test_shared_control_passes_steps_to_live_members():
+    live, gone = RunControl(), RunControl()
+    seen = []
+    live.add_listener(lambda step, total, latents: seen.append(("live", step)))
+    gone.add_listener(lambda step, total, latents: seen.append(("gone", step)))
+    shared = SharedControl().join(live).join(gone)
+    gone.cancel()
+    shared.on_step(0, 4, None)
+    assert seen == [("live", 0)]
+    assert live.steps_done == 1
@@ -0,0 +1,76 @@
+"""
+Tests for graph compilation
+
+Runs real ControlNet pipeline calls with the compiled stand-ins in place
+(the pipelines type-check their ControlNet). Needs torch, diffusers and
+the tiny test models (downloaded once, about 10MB).
+"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("diffusers")
+
+from PIL import Image
+
+from app.config import TARGET_SIZE
+from app.services import compilation
+from app.services.compilation import CompiledModule, compile_pipelines, warm_up, COMPILE, TRACE, NONE
+from app.services.runner import EnhanceInputs, run_batch
+from benchmarks.batching import TINY_SD_MODEL_ID, TINY_CONTROLNET_MODEL_ID
+from benchmarks.precision import load_enhancer
+
+
+@pytest.fixture
+def enhancer(tmp_path, monkeypatch):
+    monkeypatch.setattr(compilation, "COMPILE_CACHE_DIR", tmp_path)
+    try:
+        return load_enhancer(TINY_SD_MODEL_ID, TINY_CONTROLNET_MODEL_ID)
+    except OSError as e:
+        pytest.skip(f"Tiny test models unavailable: {e}")
+
+
+@pytest.fixture
+def eager_backend(monkeypatch):
+    # Same wrappers as with inductor, without minutes of kernel compilation
+    compile_fn = torch.compile
+    monkeypatch.setattr(torch, "compile", lambda model, **options: compile_fn(model, backend="eager", **options))
+
+
+def enhance(enhancer):
+    size = (TARGET_SIZE, TARGET_SIZE)
+    item = EnhanceInputs(Image.new('RGB', size, (128, 128, 128)), Image.new('RGB', size), "test", 0.5, seed=0)
+    return run_batch(enhancer, [item], prompt_fn=str, num_inference_steps=4)
+
+
+def test_compiled_controlnet_passes_the_pipeline_checks(enhancer, eager_backend):
+    assert compile_pipelines(enhancer, COMPILE) == COMPILE
+    assert hasattr(enhancer.pipeline.controlnet, "_orig_mod")  # torch's OptimizedModule
+    [output] = enhance(enhancer)
+    assert output.size == (TARGET_SIZE, TARGET_SIZE)
+    assert not enhancer.pipeline.unet.failed
+    assert not enhancer.pipeline.vae.failed
+
+
+def test_trace_leaves_controlnet_eager(enhancer):
+    from diffusers import ControlNetModel
+    assert compile_pipelines(enhancer, TRACE) == TRACE
+    assert isinstance(enhancer.pipeline.controlnet, ControlNetModel)
+    assert isinstance(enhancer.pipeline.unet, CompiledModule)
+    [output] = enhance(enhancer)
+    assert output.size == (TARGET_SIZE, TARGET_SIZE)
+    assert not enhancer.pipeline.unet.failed
+
+
+def test_failed_warm_up_puts_modules_back_on_eager(enhancer, eager_backend, monkeypatch):
+    compile_pipelines(enhancer, COMPILE)
+
+    def reject(*args, **kwargs):
+        raise TypeError("pipeline rejected a stand-in")
+
+    monkeypatch.setattr(enhancer.pipeline, "check_inputs", reject)
+    assert not warm_up(enhancer)
+    assert enhancer.compile_mode == NONE
+    for name in ("unet", "controlnet", "vae"):
+        module = getattr(enhancer.pipeline, name)
+        assert not isinstance(module, CompiledModule) and not hasattr(module, "_orig_mod")
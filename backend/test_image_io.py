@@ -0,0 +1,78 @@
+"""
+Tests for image decoding limits and streamed JSON bodies
+"""
+
+import base64
+import io
+import json
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from app.utils.image_io import (
+    ImageTooLargeError, decode_base64_image, decode_image_bytes, iter_base64, iter_json_with_base64,
+    json_with_base64_length,
+)
+
+
+def encoded(size, format='PNG', mode='RGB'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 128).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def test_decode_converts_to_rgb():
+    assert decode_image_bytes(encoded((16, 16), mode='L')).mode == 'RGB'
+
+
+def test_decode_rejects_images_over_the_pixel_limit():
+    with pytest.raises(ImageTooLargeError):
+        decode_image_bytes(encoded((100, 100)), max_pixels=99 * 99)
+    assert decode_image_bytes(encoded((100, 100)), max_pixels=100 * 100).size == (100, 100)
+
+
+@pytest.mark.filterwarnings("ignore::PIL.Image.DecompressionBombWarning")
+def test_decode_turns_pillow_bomb_checks_into_too_large(monkeypatch):
+    # Over MAX_IMAGE_PIXELS Pillow warns, over twice that it raises: both are "too large"
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    for size in [(40, 40), (100, 100)]:
+        with pytest.raises(ImageTooLargeError):
+            decode_image_bytes(encoded(size), max_pixels=10 ** 9)
+
+
+def test_decode_rejects_garbage():
+    with pytest.raises(ValueError) as info:
+        decode_image_bytes(b"not an image")
+    assert not isinstance(info.value, ImageTooLargeError)
+
+
+def test_decode_draft_keeps_longest_side_at_least_draft_size():
+    image = decode_image_bytes(encoded((1600, 800), format='JPEG'), draft_size=512)
+    assert 512 <= max(image.size) < 1600
+
+
+def test_decode_without_draft_keeps_full_size():
+    assert decode_image_bytes(encoded((1600, 800)), draft_size=None).size == (1600, 800)
+
+
+def test_decode_base64_accepts_data_urls():
+    payload = "data:image/png;base64," + base64.b64encode(encoded((8, 8))).decode()
+    assert decode_base64_image(payload).size == (8, 8)
+
+
+@pytest.mark.parametrize("fields", [{}, {"processing_time": 1.5, "image_id": "abc"}, {"note": 'quote " and \\ é'}])
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 100, 3 * 16 * 1024 + 1])
+def test_json_with_base64_matches_json_dumps(fields, size):
+    data = bytes(range(256)) * (size // 256) + bytes(range(size % 256))
+    body = b"".join(iter_json_with_base64(fields, "enhanced_image", data))
+    expected = dict(fields, enhanced_image=base64.b64encode(data).decode())
+    assert json.loads(body) == expected
+    assert len(body) == json_with_base64_length(fields, "enhanced_image", data)
+
+
+def test_iter_base64_chunks_concatenate_to_one_encoding():
+    data = bytes(range(256)) * 50
+    assert b"".join(iter_base64(data, chunk_size=100)) == base64.b64encode(data)
@@ -0,0 +1,174 @@
+"""
+Tests for preprocessing and region-of-interest and tiled crop and blend geometry
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("PIL")
+
+from PIL import Image, ImageDraw
+
+from app.utils.image_processing import (
+    _align_box, _drawing_mask, _run_dims, blend_region, blend_tile, build_tile, prepare_inputs, prepare_region,
+    prepare_tiles, preprocess_image, region_box, tile_starts,
+)
+
+
+def drawing_with_square(size, box):
+    """A stroke-like white square at `box` (left, top, right, bottom) on black, as the canvas sends"""
+    drawing = Image.new('RGB', size, 'black')
+    drawing.paste((255, 255, 255), box)
+    return drawing
+
+
+def drawing_with_ring(size, centre, radius, color='white', background='black'):
+    """A thin stroke: a 3px circle outline around `centre`"""
+    drawing = Image.new('RGB', size, background)
+    x, y = centre
+    ImageDraw.Draw(drawing).ellipse((x - radius, y - radius, x + radius, y + radius), outline=color, width=3)
+    return drawing
+
+
+def test_prepare_inputs_pads_like_preprocess_image():
+    original = Image.new('RGB', (1024, 512), (50, 100, 150))
+    prepared = prepare_inputs(original, drawing_with_square((1024, 512), (480, 200, 560, 280)))
+    assert prepared.content_box == (0, 128, 512, 384)
+    assert np.array_equal(np.asarray(prepared.image), np.asarray(preprocess_image(original)))
+
+
+def test_prepare_inputs_aligns_control_and_mask_with_the_padded_original():
+    prepared = prepare_inputs(Image.new('RGB', (1024, 512)), drawing_with_square((1024, 512), (480, 200, 560, 280)))
+    mask = np.asarray(prepared.mask)
+    control = np.asarray(prepared.control_image)
+    assert prepared.mask.size == prepared.control_image.size == (512, 512)
+    # The square is drawn at (240, 100)-(280, 140) of the content, which starts 128px down
+    assert mask[128 + 120, 260] == 255
+    assert not mask[:128].any() and not mask[384:].any()
+    assert control[128 + 100, 240:280].any()
+    assert not control[:128].any()
+
+
+def test_prepare_inputs_results_outlive_the_next_call():
+    first = prepare_inputs(Image.new('RGB', (256, 256)), drawing_with_square((256, 256), (10, 10, 50, 50)))
+    before = np.asarray(first.mask).copy()
+    prepare_inputs(Image.new('RGB', (256, 256)), drawing_with_square((256, 256), (200, 200, 250, 250)))
+    assert np.array_equal(np.asarray(first.mask), before)
+
+
+def test_prepare_inputs_reuses_a_prepared_original():
+    image = Image.new('RGB', (512, 512))
+    prepared = prepare_inputs(Image.new('RGB', (1024, 512)), Image.new('RGB', (1024, 512)), image=image)
+    assert prepared.image is image
+    assert prepared.content_box == (0, 128, 512, 384)
+
+
+def test_align_box_grows_outwards_inside_the_canvas():
+    assert _align_box((3, 5, 17, 21), 100, 100, 8) == (0, 0, 24, 24)
+    assert _align_box((90, 90, 99, 99), 100, 100, 8) == (88, 88, 100, 100)
+
+
+@pytest.mark.parametrize("width, height, run_size, min_size, expected", [
+    (1024, 512, 512, 0, (512, 256)),
+    (100, 100, 512, 256, (256, 256)),
+    (300, 200, 512, 0, (304, 200)),
+    (4, 4, 512, 0, (8, 8)),
+])
+def test_run_dims(width, height, run_size, min_size, expected):
+    assert _run_dims(width, height, run_size, min_size) == expected
+
+
+def test_region_box_pads_centres_and_aligns():
+    mask = np.zeros((400, 600), dtype=np.uint8)
+    mask[100:140, 200:220] = 255
+    left, top, right, bottom = region_box(mask, pad=32, align=8)
+    assert left <= 200 and top <= 100 and right >= 220 and bottom >= 140
+    assert (right - left) >= 40 + 64 and (bottom - top) >= 40 + 64
+    assert all(value % 8 == 0 for value in (left, top))
+
+
+def test_region_box_stays_inside_the_canvas_at_the_edge():
+    mask = np.zeros((200, 200), dtype=np.uint8)
+    mask[190:200, 190:200] = 255
+    left, top, right, bottom = region_box(mask, pad=32)
+    assert 0 <= left < right <= 200 and 0 <= top < bottom <= 200
+
+
+def test_region_box_of_empty_mask_is_the_whole_canvas():
+    assert region_box(np.zeros((120, 80), dtype=np.uint8)) == (0, 0, 80, 120)
+
+
+def test_region_blend_only_changes_the_tile():
+    original = Image.new('RGB', (800, 600), (50, 100, 150))
+    region = prepare_region(original, drawing_with_square((800, 600), (360, 260, 440, 340)), run_size=256, min_size=128)
+    left, top, right, bottom = region.box
+    assert region.image.size == region.mask.size == region.control_image.size
+    assert region.blend_mask.size == (right - left, bottom - top)
+    assert 0 < region.coverage < 1
+
+    result = blend_region(region, Image.new('RGB', region.image.size, (255, 0, 0)))
+    assert result.size == original.size
+    assert result.getpixel((400, 300)) == (255, 0, 0)
+    assert result.getpixel((5, 5)) == (50, 100, 150)
+    assert result.getpixel((left - 1 if left else right, top)) == (50, 100, 150)
+
+
+
+
+@pytest.mark.parametrize("color, background", [("white", "black"), ("black", "white")])
+def test_region_box_stays_tight_around_a_thin_stroke(color, background):
+    # A few thin strokes cover well under 1% of the canvas; only the stroke is the drawing
+    drawing = drawing_with_ring((1024, 1024), (300, 300), 60, color, background)
+    region = prepare_region(Image.new('RGB', (1024, 1024)), drawing, max_size=1024)
+    left, top, right, bottom = region.box
+    assert left <= 240 and top <= 240 and right >= 360 and bottom >= 360
+    assert right - left < 240 and bottom - top < 240
+    assert region.coverage < 0.06
+
+
+def test_drawing_mask_of_a_blank_canvas_is_empty():
+    for value in (0, 255):
+        assert not _drawing_mask(np.full((64, 64), value, dtype=np.uint8), expand=10).any()
+
+
+@pytest.mark.parametrize("length, tile, overlap", [(512, 512, 64), (1000, 512, 64), (2048, 512, 64), (1100, 512, 100)])
+def test_tile_starts_cover_the_length_with_overlap(length, tile, overlap):
+    starts = tile_starts(length, tile, overlap)
+    assert starts[0] == 0
+    assert starts[-1] + tile == max(length, tile)
+    for previous, start in zip(starts, starts[1:]):
+        assert start - previous <= tile - overlap
+
+
+def test_tiles_keep_only_those_the_drawing_touches():
+    original = Image.new('RGB', (1200, 500), (50, 100, 150))
+    tiled = prepare_tiles(original, drawing_with_square((1200, 500), (50, 50, 130, 130)), tile_size=512, overlap=64)
+    assert tiled.grid_tiles == len(tile_starts(1200, 512, 64)) == 3
+    assert tiled.boxes == [(0, 0, 512, 500)]
+
+
+@pytest.mark.parametrize("color, background", [("white", "black"), ("black", "white")])
+def test_thin_stroke_in_a_corner_selects_only_that_tile(color, background):
+    original = Image.new('RGB', (1280, 1280), (50, 100, 150))
+    drawing = drawing_with_ring((1280, 1280), (1180, 1180), 40, color, background)
+    tiled = prepare_tiles(original, drawing, max_size=1280, tile_size=512, overlap=64)
+    assert tiled.grid_tiles == 9
+    assert tiled.boxes == [(768, 768, 1280, 1280)]
+
+
+def test_tile_weight_ramps_in_over_the_left_overlap():
+    original = Image.new('RGB', (960, 512), (50, 100, 150))
+    tiled = prepare_tiles(original, drawing_with_square((960, 512), (0, 192, 960, 320)), tile_size=512, overlap=64)
+    first, second = (build_tile(tiled, box, run_size=256, overlap=64) for box in tiled.boxes)
+    weight = np.asarray(second.weight)
+    assert weight[256, 0] == 0
+    assert weight[256, 32] < weight[256, 63] <= weight[256, 200]
+    assert np.asarray(first.weight)[256, 0] > 0
+    assert first.image.size == (256, 256)
+
+    result = tiled.canvas.copy()
+    for tile in (first, second):
+        blend_tile(result, tile, Image.new('RGB', tile.image.size, (255, 0, 0)))
+    assert result.size == (960, 512)
+    assert result.getpixel((500, 256)) == (255, 0, 0)
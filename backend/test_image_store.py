@@ -0,0 +1,91 @@
+"""
+Tests for the uploaded image store
+"""
+
+import os
+import time
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from app.services.image_store import ImageStore
+from app.services.result_cache import hash_image
+
+
+def image(size=(64, 64), color=(10, 20, 30)):
+    return Image.new('RGB', size, color)
+
+
+def test_put_returns_the_content_hash_and_get_finds_it():
+    store = ImageStore()
+    image_id = store.put(image())
+    assert image_id == hash_image(image())
+    assert store.get(image_id).size == (64, 64)
+    assert store.get("missing") is None
+    assert (store.stats()["hits"], store.stats()["misses"]) == (1, 1)
+
+
+def test_memory_tier_evicts_past_its_budget():
+    store = ImageStore(memory_bytes=64 * 64 * 3 * 2)
+    ids = [store.put(image(color=(i, 0, 0))) for i in range(3)]
+    assert store.get(ids[0]) is None
+    assert store.get(ids[2]) is not None
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    image_id = ImageStore(disk_dir=str(tmp_path)).put(image())
+    restarted = ImageStore(disk_dir=str(tmp_path))
+    assert restarted.get(image_id).getpixel((0, 0)) == (10, 20, 30)
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.get(image_id) is not None and restarted.stats()["hits"] == 1
+
+
+def test_disk_tier_drops_expired_files(tmp_path):
+    image_id = ImageStore(disk_dir=str(tmp_path)).put(image())
+    path = tmp_path / f"{image_id}.png"
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert ImageStore(disk_dir=str(tmp_path), ttl=60).get(image_id) is None
+    assert not path.exists()
+
+
+def test_disk_tier_evicts_the_oldest_past_its_budget(tmp_path):
+    first = ImageStore(disk_dir=str(tmp_path)).put(image(color=(1, 0, 0)))
+    old = time.time() - 30
+    os.utime(tmp_path / f"{first}.png", (old, old))
+    size = (tmp_path / f"{first}.png").stat().st_size
+    second = ImageStore(disk_dir=str(tmp_path), disk_bytes=size + size // 2).put(image(color=(2, 0, 0)))
+    assert not (tmp_path / f"{first}.png").exists()
+    assert (tmp_path / f"{second}.png").exists()
+
+
+def test_ids_that_are_not_hex_never_reach_the_disk(tmp_path):
+    store = ImageStore(disk_dir=str(tmp_path))
+    assert store.get("../../etc/passwd") is None
+
+
+def test_kept_images_use_their_own_budget():
+    store = ImageStore(memory_bytes=64 * 64 * 3, inline_bytes=64 * 64 * 3)
+    uploaded = store.put(image(color=(1, 0, 0)))
+    store.keep(image(color=(2, 0, 0)), draft_size=None)
+    store.keep(image(color=(3, 0, 0)), draft_size=None)
+    assert store.get(uploaded) is not None
+    assert store.stats()["inline_entries"] == 1
+
+
+def test_kept_drafts_only_serve_requests_that_need_no_more_detail():
+    store = ImageStore()
+    # Decoded with draft 512 and actually reduced (a 2048px JPEG becomes 1024px)
+    reduced = store.keep(image((1024, 512)), draft_size=512)
+    assert store.get(reduced, draft_size=512) is not None
+    assert store.get(reduced, draft_size=256) is not None
+    assert store.get(reduced, draft_size=2048) is None
+    assert store.get(reduced) is None
+    # Smaller than its draft size, so it was never reduced: good for anything
+    small = store.keep(image((300, 200)), draft_size=512)
+    assert store.get(small, draft_size=2048) is not None
+    full = store.keep(image((100, 100), color=(5, 5, 5)), draft_size=None)
+    assert store.get(full, draft_size=2048) is not None
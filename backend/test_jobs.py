@@ -0,0 +1,165 @@
+"""
+Tests for the enhancement job queue
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.jobs import (
+    CANCELLED, DONE, FAILED, JobQueue, JobTimeoutError, QueueFullError,
+)
+from app.services.run_control import RunCancelled
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_run_returns_the_work_result_and_reports_progress():
+    async def main():
+        queue = JobQueue()
+
+        def work(job, value):
+            job.report(0.5, "denoise")
+            return value * 2
+
+        job = queue.submit(work, 21)
+        assert await job.wait() == 42
+        await queue.stop()
+        return job
+
+    job = run(main())
+    assert (job.status, job.progress, job.stage) == (DONE, 1.0, "denoise")
+    assert job.to_dict()["error"] is None
+
+
+def test_progress_never_goes_backwards():
+    async def main():
+        queue = JobQueue()
+
+        def work(job):
+            job.report(0.6)
+            job.report(0.4)
+            return job.progress
+
+        progress = await queue.run(work)
+        await queue.stop()
+        return progress
+
+    assert run(main()) == 0.6
+
+
+def test_errors_reach_the_waiter():
+    async def main():
+        queue = JobQueue()
+
+        def work(job):
+            raise ValueError("bad input")
+
+        job = queue.submit(work)
+        with pytest.raises(ValueError):
+            await job.wait()
+        await queue.stop()
+        return job
+
+    job = run(main())
+    assert job.status == FAILED and job.to_dict()["error"] == "bad input"
+
+
+def test_full_queue_rejects_new_jobs():
+    async def main():
+        queue = JobQueue(workers=1, max_queued=1)
+        release = threading.Event()
+        running = queue.submit(lambda job: release.wait(5))
+        while not queue.running:
+            await asyncio.sleep(0.01)
+        waiting = queue.submit(lambda job: None)
+        with pytest.raises(QueueFullError):
+            queue.submit(lambda job: None)
+        assert queue.depth == 1
+        release.set()
+        await running.wait()
+        await waiting.wait()
+        await queue.stop()
+
+    run(main())
+
+
+def test_job_cancelled_while_queued_never_runs():
+    async def main():
+        queue = JobQueue(workers=1)
+        release = threading.Event()
+        calls = []
+        first = queue.submit(lambda job: release.wait(5))
+        second = queue.submit(lambda job: calls.append(1))
+        second.cancel("client disconnected")
+        release.set()
+        await first.wait()
+        with pytest.raises(RunCancelled):
+            await second.wait()
+        await queue.stop()
+        return second, calls
+
+    job, calls = run(main())
+    assert job.status == CANCELLED and calls == []
+
+
+def test_running_job_stops_at_its_next_check():
+    async def main():
+        queue = JobQueue()
+        started = threading.Event()
+
+        def work(job):
+            started.set()
+            while True:
+                job.control.check()
+                time.sleep(0.01)
+
+        job = queue.submit(work)
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        job.cancel()
+        with pytest.raises(RunCancelled):
+            await job.wait()
+        await queue.stop()
+        return job
+
+    assert run(main()).status == CANCELLED
+
+
+def test_timed_out_job_fails_and_is_asked_to_stop():
+    async def main():
+        queue = JobQueue()
+
+        def work(job):
+            while not job.cancelled:
+                time.sleep(0.01)
+            return "stopped"
+
+        job = queue.submit(work, timeout=0.05)
+        with pytest.raises(JobTimeoutError):
+            await job.wait()
+        # The worker slot is held until the thread actually returns
+        while queue.running:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return job
+
+    job = run(main())
+    assert job.status == FAILED and job.control.cancel_reason == "timed out"
+
+
+def test_finished_jobs_are_forgotten_after_their_ttl():
+    async def main():
+        queue = JobQueue(result_ttl=0)
+        job = queue.submit(lambda job: None)
+        await job.wait()
+        assert queue.get(job.id) is job
+        job.finished_at -= 1
+        queue.submit(lambda job: None)
+        assert queue.get(job.id) is None
+        await queue.stop()
+
+    run(main())
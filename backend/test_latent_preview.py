@@ -0,0 +1,36 @@
+"""
+Tests for approximate previews from SD 1.5 latents
+"""
+
+import base64
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from app.utils.latent_preview import SD15_LATENT_RGB_FACTORS, latents_to_preview, preview_to_base64
+
+
+@pytest.mark.parametrize("shape", [(1, 4, 64, 32), (4, 64, 32)])
+def test_preview_keeps_the_aspect_ratio_at_the_requested_size(shape):
+    preview = latents_to_preview(np.zeros(shape, dtype=np.float32), size=128)
+    assert preview.mode == 'RGB'
+    assert preview.size == (64, 128)
+
+
+def test_preview_projects_each_channel_to_its_colour():
+    latents = np.zeros((4, 8, 8), dtype=np.float32)
+    latents[0] = 1.0
+    expected = np.clip((SD15_LATENT_RGB_FACTORS[0] + 1.0) * 127.5, 0, 255).astype(np.uint8)
+    assert latents_to_preview(latents, size=8).getpixel((4, 4)) == tuple(expected)
+
+
+def test_preview_base64_is_a_small_jpeg():
+    encoded = preview_to_base64(Image.new('RGB', (128, 128), (200, 100, 50)))
+    decoded = Image.open(io.BytesIO(base64.b64decode(encoded)))
+    assert decoded.format == 'JPEG' and decoded.size == (128, 128)
+    assert len(encoded) < 8 * 1024
@@ -0,0 +1,190 @@
+"""
+Tests for the LLM response cache
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.services.llm_cache import CachedLLMService, normalize_description
+from app.services.ollama import OllamaError
+
+
+class FakeLLM:
+    """Blocking LLM service that records its calls"""
+
+    model = "fake-model"
+
+    def __init__(self):
+        self.calls = []
+
+    def enhance_prompt(self, description):
+        self.calls.append(("enhance_prompt", description))
+        return f"{description}, detailed"
+
+    def generate_hints(self, description, num_hints=3):
+        self.calls.append(("generate_hints", description))
+        return [f"hint {i}" for i in range(num_hints)]
+
+    def understand_description(self, description):
+        self.calls.append(("understand_description", description))
+        return {"subject": description}
+
+    def health(self):
+        return "ok"
+
+
+def test_normalize_description_ignores_case_and_spacing():
+    assert normalize_description("  A   Dinosaur\n") == normalize_description("a dinosaur") == "a dinosaur"
+
+
+def test_repeated_descriptions_are_answered_from_cache():
+    llm = FakeLLM()
+    cached = CachedLLMService(llm, backend="ollama")
+    assert cached.enhance_prompt("A dinosaur") == "A dinosaur, detailed"
+    assert cached.enhance_prompt("a  dinosaur ") == "A dinosaur, detailed"
+    assert cached.generate_hints("a dinosaur", 2) == ["hint 0", "hint 1"]
+    assert cached.generate_hints("a dinosaur", 2) == ["hint 0", "hint 1"]
+    assert llm.calls == [("enhance_prompt", "A dinosaur"), ("generate_hints", "a dinosaur")]
+    assert cached.stats()["hits"] == 2
+
+
+def test_keys_separate_methods_hint_counts_and_models():
+    cached = CachedLLMService(FakeLLM(), backend="ollama")
+    keys = {
+        cached._key("enhance_prompt", "x", ()),
+        cached._key("generate_hints", "x", (3,)),
+        cached._key("generate_hints", "x", (5,)),
+        CachedLLMService(type("Other", (FakeLLM,), {"model": "other"})(), backend="ollama")._key(
+            "enhance_prompt", "x", ()
+        ),
+    }
+    assert len(keys) == 4
+
+
+def test_other_attributes_pass_through():
+    assert CachedLLMService(FakeLLM(), backend="ollama").health() == "ok"
+
+
+def test_async_calls_use_the_blocking_service_on_a_worker_thread():
+    llm = FakeLLM()
+    cached = CachedLLMService(llm, backend="ollama")
+
+    async def main():
+        return await asyncio.gather(cached.agenerate_hints("cloud", 1), cached.aenhance_prompt("cloud"))
+
+    assert asyncio.run(main()) == [["hint 0"], "cloud, detailed"]
+    assert cached.enhance_prompt("cloud") == "cloud, detailed"
+    assert len(llm.calls) == 2
+
+
+def test_cache_is_kept_across_restarts(tmp_path):
+    path = tmp_path / "llm_cache.json"
+    cached = CachedLLMService(FakeLLM(), backend="ollama", persist_path=str(path), save_delay=60)
+    cached.enhance_prompt("a dragon")
+    cached.close()
+    assert len(json.loads(path.read_text())) == 1
+
+    llm = FakeLLM()
+    restarted = CachedLLMService(llm, backend="ollama", persist_path=str(path))
+    assert restarted.enhance_prompt("a dragon") == "a dragon, detailed"
+    assert llm.calls == []
+
+
+def test_expired_entries_are_not_loaded(tmp_path):
+    path = tmp_path / "llm_cache.json"
+    key = CachedLLMService(FakeLLM(), backend="ollama")._key("enhance_prompt", "a dragon", ())
+    path.write_text(json.dumps([[key, "stale", time.time() - 120]]))
+    llm = FakeLLM()
+    restarted = CachedLLMService(llm, backend="ollama", ttl=60, persist_path=str(path))
+    assert restarted.enhance_prompt("a dragon") == "a dragon, detailed"
+    assert len(llm.calls) == 1
+
+
+def test_unreadable_cache_file_starts_empty(tmp_path):
+    path = tmp_path / "llm_cache.json"
+    path.write_text("{not json")
+    assert len(CachedLLMService(FakeLLM(), backend="ollama", persist_path=str(path)).cache) == 0
+
+
+class FlakyLLM(FakeLLM):
+    """Fails prompt enhancement the first time, like an unreachable Ollama"""
+
+    def enhance_prompt(self, description):
+        if not self.calls:
+            self.calls.append(("failed", description))
+            raise OllamaError("Ollama request failed")
+        return super().enhance_prompt(description)
+
+    async def aenhance_prompt(self, description):
+        return self.enhance_prompt(description)
+
+
+def test_failed_enhancement_falls_back_uncached(tmp_path):
+    path = tmp_path / "llm_cache.json"
+    cached = CachedLLMService(FlakyLLM(), backend="ollama", persist_path=str(path), save_delay=60)
+    assert cached.enhance_prompt("a dragon") == "a dragon"
+    assert len(cached.cache) == 0
+    cached.close()
+    assert not path.exists()
+    assert cached.enhance_prompt("a dragon") == "a dragon, detailed"
+
+
+def test_failed_async_enhancement_falls_back_uncached():
+    cached = CachedLLMService(FlakyLLM(), backend="ollama")
+    assert asyncio.run(cached.aenhance_prompt("a dragon")) == "a dragon"
+    assert len(cached.cache) == 0
+    assert asyncio.run(cached.aenhance_prompt("a dragon")) == "a dragon, detailed"
+
+
+def test_other_failures_still_raise():
+    class BrokenLLM(FakeLLM):
+        def generate_hints(self, description, num_hints=3):
+            raise OllamaError("Ollama request failed")
+
+    with pytest.raises(OllamaError):
+        CachedLLMService(BrokenLLM(), backend="ollama").generate_hints("a dragon")
+
+
+class SlowAsyncLLM(FakeLLM):
+    """Async LLM whose answers take a moment, so identical calls overlap"""
+
+    async def aenhance_prompt(self, description):
+        self.calls.append(("enhance_prompt", description))
+        await asyncio.sleep(0.05)
+        return f"{description}, detailed"
+
+    async def stream_hints(self, description, num_hints=3):
+        self.calls.append(("stream_hints", description))
+        for i in range(num_hints):
+            await asyncio.sleep(0.01)
+            yield f"hint {i}"
+
+
+def test_identical_async_calls_share_one_llm_call():
+    llm = SlowAsyncLLM()
+    cached = CachedLLMService(llm, backend="ollama")
+
+    async def main():
+        return await asyncio.gather(*(cached.aenhance_prompt(text) for text in ["a cat", "A cat", "a  cat"]))
+
+    assert asyncio.run(main()) == ["a cat, detailed"] * 3
+    assert len(llm.calls) == 1
+    assert cached.stats()["coalesced"] == 2
+
+
+def test_concurrent_hint_streams_share_one_stream_and_fill_the_cache():
+    llm = SlowAsyncLLM()
+    cached = CachedLLMService(llm, backend="ollama")
+
+    async def read():
+        return [hint async for hint in cached.stream_hints("cloud", 3)]
+
+    async def main():
+        return await asyncio.gather(read(), read())
+
+    assert asyncio.run(main()) == [["hint 0", "hint 1", "hint 2"]] * 2
+    assert cached.generate_hints("cloud", 3) == ["hint 0", "hint 1", "hint 2"]
+    assert llm.calls == [("stream_hints", "cloud")]
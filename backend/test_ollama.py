@@ -0,0 +1,152 @@
+"""
+Tests for the pooled Ollama client against a mocked HTTP transport
+"""
+
+import asyncio
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from app.services.ollama import OllamaClient, OllamaError, OllamaLLMService, clean_line
+
+
+def ollama(responses):
+    """Mock transport answering /api/generate with `responses` in turn; records request payloads"""
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        response = responses[min(len(requests), len(responses)) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    return httpx.MockTransport(handler), requests
+
+
+def generated(text):
+    return httpx.Response(200, json={"response": text, "done": True})
+
+
+def streamed(*chunks):
+    lines = [json.dumps({"response": chunk, "done": False}) for chunk in chunks]
+    lines.append(json.dumps({"response": "", "done": True}))
+    return httpx.Response(200, content="\n".join(lines).encode())
+
+
+def client(responses, **options):
+    transport, requests = ollama(responses)
+    return OllamaClient("http://ollama", "mistral", transport=transport, backoff=0, **options), requests
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("1. A red dragon", "A red dragon"),
+    ("- misty forest", "misty forest"),
+    ('"a whale"', "a whale"),
+    ("   ", ""),
+])
+def test_clean_line(line, expected):
+    assert clean_line(line) == expected
+
+
+def test_generate_sends_model_system_and_format():
+    ollama_client, requests = client([generated("{}")])
+    assert asyncio.run(ollama_client.generate("a cat", system="be brief", json_format=True)) == "{}"
+    assert requests == [{"model": "mistral", "prompt": "a cat", "stream": False, "system": "be brief", "format": "json"}]
+
+
+def test_generate_retries_retryable_statuses_and_connection_errors():
+    ollama_client, requests = client([
+        httpx.Response(503), httpx.ConnectError("refused"), generated("a cat, fluffy"),
+    ])
+    assert asyncio.run(ollama_client.generate("a cat")) == "a cat, fluffy"
+    assert ollama_client.stats() == {"requests": 1, "retried": 2, "failed": 0}
+
+
+def test_generate_gives_up_on_other_statuses():
+    ollama_client, requests = client([httpx.Response(400), generated("unused")])
+    with pytest.raises(OllamaError):
+        asyncio.run(ollama_client.generate("a cat"))
+    assert len(requests) == 1
+    assert ollama_client.stats()["failed"] == 1
+
+
+def test_generate_gives_up_after_the_last_retry():
+    ollama_client, requests = client([httpx.ConnectError("refused")], retries=2)
+    with pytest.raises(OllamaError):
+        asyncio.run(ollama_client.generate("a cat"))
+    assert len(requests) == 3
+
+
+def test_stream_yields_chunks_until_done():
+    ollama_client, _ = client([streamed("a ", "cat")])
+
+    async def read():
+        return [chunk async for chunk in ollama_client.stream("a cat")]
+
+    assert asyncio.run(read()) == ["a ", "cat"]
+
+
+def test_stream_raises_errors_reported_mid_stream():
+    error = json.dumps({"error": "model unloaded"}).encode()
+    ollama_client, _ = client([httpx.Response(200, content=error)])
+
+    async def read():
+        return [chunk async for chunk in ollama_client.stream("a cat")]
+
+    with pytest.raises(OllamaError):
+        asyncio.run(read())
+
+
+@pytest.fixture
+def service():
+    services = []
+
+    def make(responses):
+        transport, requests = ollama(responses)
+        llm = OllamaLLMService("http://ollama", "mistral", transport=transport, backoff=0, retries=0)
+        services.append(llm)
+        return llm, requests
+
+    yield make
+    for llm in services:
+        llm.close()
+
+
+def test_enhance_prompt_keeps_the_first_clean_line(service):
+    llm, requests = service([generated("\n1. a red dragon, scales\nsecond line")])
+    assert llm.enhance_prompt("dragon") == "a red dragon, scales"
+    assert requests[0]["system"]
+
+
+def test_enhance_prompt_raises_when_ollama_fails(service):
+    llm, _ = service([httpx.Response(500)])
+    with pytest.raises(OllamaError):
+        llm.enhance_prompt("dragon")
+
+
+def test_hints_stop_at_the_requested_count(service):
+    llm, _ = service([streamed("1. a dra", "gon\n2. a whale\n", "3. a ship\n4. a tree")])
+    assert llm.generate_hints("cloud", 2) == ["a dragon", "a whale"]
+
+
+def test_hints_keep_the_last_unterminated_line(service):
+    llm, _ = service([streamed("- a dragon\n- a wh", "ale")])
+    assert llm.generate_hints("cloud", 3) == ["a dragon", "a whale"]
+
+
+def test_stream_hints_on_the_callers_loop(service):
+    llm, _ = service([streamed("a dragon\na whale\n")])
+
+    async def read():
+        return [hint async for hint in llm.stream_hints("cloud", 2)]
+
+    assert asyncio.run(read()) == ["a dragon", "a whale"]
+
+
+def test_understand_description_falls_back_to_the_subject(service):
+    llm, _ = service([generated('{"subject": "dragon", "mood": "calm"}'), generated("not json")])
+    assert llm.understand_description("a calm dragon") == {"subject": "dragon", "mood": "calm"}
+    assert llm.understand_description("a whale") == {"subject": "a whale"}
@@ -0,0 +1,94 @@
+"""
+Tests for result cache keys and request coalescing
+"""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from app.services.result_cache import ResultCache, hash_image, result_key
+from app.services.run_control import RunCancelled, RunControl
+
+KEY_ARGS = dict(
+    original_hash="o", drawing_hash="d", description="a dinosaur", enhancement_strength=0.15,
+    num_inference_steps=30, guidance_scale=7.5, seed=1,
+)
+
+
+def test_result_key_ignores_surrounding_whitespace():
+    assert result_key(**KEY_ARGS) == result_key(**dict(KEY_ARGS, description="  a dinosaur "))
+
+
+@pytest.mark.parametrize("field, value", [
+    ("original_hash", "o2"),
+    ("drawing_hash", "d2"),
+    ("description", "a dragon"),
+    ("enhancement_strength", 0.2),
+    ("num_inference_steps", 20),
+    ("guidance_scale", 8.0),
+    ("seed", None),
+    ("scheduler", "dpm++"),
+    ("resolution", 384),
+    ("mode", "roi"),
+    ("variant", "inpaint"),
+])
+def test_result_key_changes_with_every_input(field, value):
+    assert result_key(**KEY_ARGS) != result_key(**dict(KEY_ARGS, **{field: value}))
+
+
+def test_hash_image_depends_on_pixels_not_encoding():
+    image = Image.new('RGB', (8, 8), (10, 20, 30))
+    assert hash_image(image) == hash_image(image.copy())
+    assert hash_image(image) != hash_image(Image.new('RGB', (8, 8), (10, 20, 31)))
+    assert hash_image(image) != hash_image(Image.new('RGB', (4, 16), (10, 20, 30)))
+
+
+def test_get_or_compute_caches_results(tmp_path):
+    cache = ResultCache(memory_bytes=1024 * 1024, disk_dir=str(tmp_path))
+    calls = []
+
+    def compute(control):
+        calls.append(control)
+        return Image.new('RGB', (4, 4))
+
+    cache.get_or_compute("k", compute)
+    cache.get_or_compute("k", compute)
+    assert calls == [None]
+    assert ResultCache(disk_dir=str(tmp_path)).get("k").size == (4, 4)
+
+
+def test_coalesced_request_survives_the_leader_cancelling():
+    cache = ResultCache(memory_bytes=1024 * 1024)
+    started = threading.Event()
+
+    def compute(control):
+        started.set()
+        for _ in range(50):
+            control.check()
+            time.sleep(0.01)
+        return Image.new('RGB', (4, 4))
+
+    leader_control, follower_control = RunControl(), RunControl()
+    results = {}
+
+    def request(name, control):
+        try:
+            results[name] = cache.get_or_compute("k", compute, control=control)
+        except RunCancelled as e:
+            results[name] = e
+
+    leader = threading.Thread(target=request, args=("leader", leader_control))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=request, args=("follower", follower_control))
+    follower.start()
+    time.sleep(0.05)
+    leader_control.cancel()
+    leader.join(5)
+    follower.join(5)
+    assert results["follower"].size == (4, 4)
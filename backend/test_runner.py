@@ -0,0 +1,97 @@
+"""
+Tests for pipeline calls and step callbacks in the runner
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from PIL import Image
+
+from app.services.pipeline_registry import IMG2IMG, PLAIN
+from app.services.run_control import RunCancelled, RunControl
+from app.services.runner import EnhanceInputs, _run_groups, _step_callback
+
+
+class Img2ImgPipeline:
+    """Keyword arguments of diffusers' StableDiffusionImg2ImgPipeline: no width, height or control_image"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompt=None, image=None, strength=0.8, num_inference_steps=50, guidance_scale=7.5,
+                 negative_prompt=None, num_images_per_prompt=1, eta=0.0, generator=None, prompt_embeds=None,
+                 negative_prompt_embeds=None, output_type="pil", return_dict=True, callback=None, callback_steps=1,
+                 cross_attention_kwargs=None):
+        self.calls.append(dict(image=image))
+        return SimpleNamespace(images=[img.copy() for img in image])
+
+
+class ControlNetPipeline:
+    """Accepts anything and records it, like a ControlNet img2img call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, image, **kwargs):
+        self.calls.append(dict(kwargs, image=image))
+        return SimpleNamespace(images=[img.copy() for img in image])
+
+
+class Enhancer:
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def get_pipeline(self, variant):
+        return self.pipeline
+
+
+def run(pipeline, variant, size):
+    image = Image.new('RGB', size, (50, 100, 150))
+    item = EnhanceInputs(image, Image.new('RGB', size), "a dinosaur", 0.15)
+    return _run_groups(
+        Enhancer(pipeline), [item], ["a dinosaur"], [(image, image, None)],
+        num_inference_steps=30, guidance_scale=7.5, strength=0.15, scheduler="default", variant=variant,
+    )
+
+
+@pytest.mark.parametrize("size", [(512, 512), (384, 256)])
+def test_plain_runs_never_pass_controlnet_arguments(size):
+    pipeline = Img2ImgPipeline()
+    outputs = run(pipeline, PLAIN, size)
+    assert outputs[0].size == size
+    assert len(pipeline.calls) == 1
+
+
+def test_controlnet_runs_pass_non_default_sizes():
+    pipeline = ControlNetPipeline()
+    run(pipeline, IMG2IMG, (384, 256))
+    call = pipeline.calls[0]
+    assert (call["width"], call["height"]) == (384, 256)
+    assert "control_image" in call
+
+
+def test_step_callback_hands_each_request_its_latents():
+    seen = []
+    controls = [RunControl(), RunControl()]
+    for index, control in enumerate(controls):
+        control.add_listener(lambda step, total, latents, index=index: seen.append((index, step, total, latents)))
+    items = [EnhanceInputs(None, None, "", 0.15, control=control) for control in controls]
+    callback = _step_callback(items, 4, [])
+    callback(0, 999, ["first", "second"])
+    assert seen == [(0, 0, 4, ["first"]), (1, 0, 4, ["second"])]
+    assert [control.steps_done for control in controls] == [1, 1]
+
+
+def test_step_callback_aborts_only_once_every_request_cancelled():
+    controls = [RunControl(), RunControl()]
+    callback = _step_callback([EnhanceInputs(None, None, "", 0.15, control=control) for control in controls], 4, [])
+    controls[0].cancel("client disconnected")
+    callback(0, 999, None)
+    controls[1].cancel()
+    with pytest.raises(RunCancelled) as info:
+        callback(1, 999, None)
+    assert info.value.reason == "client disconnected"
@@ -0,0 +1,84 @@
+"""
+Tests for step planning: quality tiers, latency budgets and the cost model
+"""
+
+import pytest
+
+from app.config import TARGET_SIZE
+from app.services.step_planner import (
+    BUDGET_LADDER, DEFAULT_SCHEDULER, TIERS, InvalidPlanError, StepCostModel, plan_steps, steps_for,
+)
+
+
+def costs():
+    # 100ms per 512px step plus 200ms fixed
+    return StepCostModel(step_seconds=0.1, overhead_seconds=0.2)
+
+
+@pytest.mark.parametrize("denoising, strength", [(1, 0.15), (2, 0.15), (4, 0.3), (8, 0.5), (3, 1.0)])
+def test_steps_for_runs_exactly_the_requested_denoising_steps(denoising, strength):
+    steps = steps_for(denoising, strength)
+    assert int(steps * strength) >= denoising
+    assert int((steps - 1) * strength) < denoising or steps == denoising
+
+
+@pytest.mark.parametrize("tier", list(TIERS))
+def test_quality_tiers(tier):
+    scheduler, denoising, resolution = TIERS[tier]
+    plan = plan_steps(0.15, quality=tier, costs=costs())
+    assert (plan.tier, plan.scheduler, plan.resolution) == (tier, scheduler, resolution)
+    assert plan.denoising_steps == denoising
+
+
+def test_budget_picks_the_best_plan_that_fits():
+    model = costs()
+    plan = plan_steps(0.15, budget_ms=700, costs=model)
+    assert plan.tier == "budget"
+    assert plan.estimated_ms <= 700
+    index = BUDGET_LADDER.index((plan.scheduler, plan.denoising_steps, plan.resolution))
+    assert all(model.estimate(steps, resolution) * 1000 > 700 for _, steps, resolution in BUDGET_LADDER[:index])
+
+
+def test_budget_too_small_gets_the_cheapest_plan():
+    plan = plan_steps(0.15, budget_ms=1, costs=costs())
+    assert (plan.scheduler, plan.denoising_steps, plan.resolution) == BUDGET_LADDER[-1]
+
+
+def test_no_quality_or_budget_keeps_the_requested_schedule():
+    plan = plan_steps(0.15, num_inference_steps=30, costs=costs())
+    assert (plan.tier, plan.scheduler) == ("custom", DEFAULT_SCHEDULER)
+    assert plan.num_inference_steps == 30 and plan.denoising_steps == 4
+    assert plan.resolution == TARGET_SIZE
+
+
+def test_quality_wins_over_budget():
+    assert plan_steps(0.15, quality="best", budget_ms=1, costs=costs()).tier == "best"
+
+
+@pytest.mark.parametrize("kwargs", [dict(quality="ultra"), dict(budget_ms=0), dict(budget_ms=-5)])
+def test_invalid_plans_are_rejected(kwargs):
+    with pytest.raises(InvalidPlanError):
+        plan_steps(0.15, costs=costs(), **kwargs)
+
+
+def test_cost_model_scales_with_pixels_and_batch():
+    model = costs()
+    assert model.estimate(4, 512) == pytest.approx(0.6)
+    assert model.estimate(4, 256) == pytest.approx(0.15)
+    assert model.estimate(4, 512, batch_size=2) == pytest.approx(1.2)
+
+
+def test_cost_model_first_observation_replaces_the_prior():
+    model = costs()
+    model.observe(1.0, steps=4, resolution=512, step_seconds=0.2)
+    assert model.step_seconds == pytest.approx(0.2)
+    assert model.overhead_seconds == pytest.approx(0.2)
+    model.observe(1.0, steps=4, resolution=512, step_seconds=0.2)
+    assert model.runs == 2
+
+
+def test_cost_model_total_only_keeps_the_overhead():
+    model = costs()
+    model.observe(1.0, steps=4, resolution=512)
+    assert model.overhead_seconds == pytest.approx(0.2)
+    assert model.step_seconds == pytest.approx(0.2)
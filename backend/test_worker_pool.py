@@ -0,0 +1,77 @@
+"""
+Tests for the fork-after-load worker process pool, with stub pipelines
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+if not hasattr(os, "fork"):
+    pytest.skip("worker pool needs fork", allow_module_level=True)
+
+from PIL import Image
+
+from app.services.run_control import RunCancelled, RunControl
+from app.services.runner import FULL_MODE, EnhanceInputs
+from app.services.worker_pool import CANCEL_REASONS, WorkerPool, _cancel_flag
+from benchmarks.stubs import StubEnhancer
+
+
+def key(num_inference_steps=20, strength=0.15):
+    return (num_inference_steps, 7.5, strength, "default", 512, FULL_MODE, None)
+
+
+def item(description="a dinosaur", control=None):
+    return EnhanceInputs(Image.new('RGB', (64, 64)), Image.new('RGB', (64, 64)), description, 0.15, control=control)
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = WorkerPool(StubEnhancer, processes=1, threads=1)
+    pool.start()
+    yield pool
+    pool.close()
+
+
+def test_run_before_start_raises():
+    with pytest.raises(RuntimeError):
+        WorkerPool(StubEnhancer, processes=1).run_batch(key(), [item()], prompt_fn=str)
+
+
+def test_batch_runs_in_a_worker_with_prompts_from_the_parent(pool):
+    prompts = []
+
+    def prompt_fn(description):
+        prompts.append(description)
+        return description
+
+    results = pool.run_batch(key(), [item("a cat"), item("a cat"), item("a dog")], prompt_fn=prompt_fn)
+    assert [result.size for result in results] == [(512, 512)] * 3
+    assert set(prompts) == {"a cat", "a dog"}
+
+
+def test_worker_steps_reach_the_requests_listeners(pool):
+    control = RunControl()
+    steps = []
+    control.add_listener(lambda step, total, latents: steps.append((step, total)))
+    pool.run_batch(key(num_inference_steps=20, strength=0.15), [item(control=control)], prompt_fn=str)
+    assert steps == [(step, 3) for step in range(3)]
+    assert control.steps_done == 3
+
+
+def test_cancelling_in_the_parent_stops_the_worker(pool):
+    control = RunControl()
+    control.add_listener(lambda step, total, latents: control.cancel("client disconnected"))
+    results = pool.run_batch(key(num_inference_steps=1000, strength=0.15), [item(control=control)], prompt_fn=str)
+    assert isinstance(results[0], RunCancelled)
+    assert results[0].reason == "client disconnected"
+    assert control.steps_done < 150
+
+
+def test_cancel_reasons_survive_the_process_boundary():
+    for reason in CANCEL_REASONS:
+        assert CANCEL_REASONS[_cancel_flag(reason) - 1] == reason
+    assert CANCEL_REASONS[_cancel_flag("something else") - 1] == "cancelled"
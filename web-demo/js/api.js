@@ -2,6 +2,60 @@
 
 const API_BASE_URL = 'http://localhost:8000'; // Change this when deploying
 
+// SHA-256 of a blob's bytes as hex, to recognise images already uploaded
+// (null where Web Crypto is unavailable: pages not served from https or localhost)
+async function hashBlob(blob) {
+    if (!window.crypto || !crypto.subtle) {
+        return null;
+    }
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+// Upload a data URL to the image store once per session, returning its id
+async function storeImage(dataUrl, refresh = false) {
+    const blob = await (await fetch(dataUrl)).blob();
+    const hash = await hashBlob(blob);
+    const cacheKey = hash && `imageId:${hash}`;
+    const cached = cacheKey && sessionStorage.getItem(cacheKey);
+    if (cached && !refresh) {
+        return cached;
+    }
+    
+    const formData = new FormData();
+    formData.append('image', blob, 'image.png');
+    const response = await fetch(`${API_BASE_URL}/images`, {
+        method: 'POST',
+        body: formData
+    });
+    if (!response.ok) {
+        throw new Error(`Upload failed: ${response.status}`);
+    }
+    const data = await response.json();
+    if (cacheKey) {
+        sessionStorage.setItem(cacheKey, data.image_id);
+    }
+    return data.image_id;
+}
+
+async function requestEnhancement(originalImage, userDrawing, description, refresh = false) {
+    // Images go up once; retries and new descriptions only send their ids
+    const requestData = {
+        image_id: await storeImage(originalImage, refresh),
+        drawing_id: await storeImage(userDrawing, refresh),
+        description: description,
+        enhancement_strength: 0.3
+    };
+    
+    return fetch(`${API_BASE_URL}/enhance`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(requestData)
+    });
+}
+
 async function enhanceImage() {
     const loadingSection = document.getElementById('loadingSection');
     const resultSection = document.getElementById('resultSection');
@@ -19,21 +73,11 @@ async function enhanceImage() {
     }
     
     try {
-        // Convert images to base64 if needed (they should already be)
-        const requestData = {
-            original_image: originalImage.split(',')[1], // Remove data:image/png;base64, prefix
-            user_drawing: userDrawing.split(',')[1],
-            description: description,
-            enhancement_strength: 0.3
-        };
-        
-        const response = await fetch(`${API_BASE_URL}/enhance`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(requestData)
-        });
+        let response = await requestEnhancement(originalImage, userDrawing, description);
+        if (response.status === 404) {
+            // Stored images expired on the server: upload them again
+            response = await requestEnhancement(originalImage, userDrawing, description, true);
+        }
         
         if (!response.ok) {
             throw new Error(`Server error: ${response.status}`);
@@ -42,7 +86,7 @@ async function enhanceImage() {
         const data = await response.json();
         
         // Display result
-        resultImage.src = `data:image/png;base64,${data.enhanced_image}`;
+        resultImage.src = `data:${data.media_type || 'image/png'};base64,${data.enhanced_image}`;
         loadingSection.classList.add('hidden');
         resultSection.classList.remove('hidden');
         